@@ -0,0 +1,112 @@
+"""
+Storage used by successive versions of a document with and without delta
+storage, and the cost of staging and reading deltas. Run from the project root:
+
+    python benchmarks/delta_storage.py --size 16 --versions 20
+
+Each version edits a few lines of the previous one. Blobs are stored
+uncompressed in a temporary local store, so only deltas account for the
+difference.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import settings
+from documents import files
+from documents.blobs import BlobStore
+from documents.files import StagedFile
+from models import Blob
+from storage.backends import LocalStorageBackend
+
+MIB = 1024 * 1024
+
+
+def make_versions(size: int, count: int, edits: int) -> list[bytes]:
+    rnd = random.Random(0)
+    lines = []
+    while sum(map(len, lines)) < size:
+        lines.append(
+            f"{len(lines)};{rnd.random()};{rnd.randbytes(24).hex()}\n".encode()
+        )
+    versions = [b"".join(lines)]
+    for _ in range(count - 1):
+        for _ in range(edits):
+            position = rnd.randrange(len(lines))
+            lines.insert(position, b"edited " + lines[position])
+        versions.append(b"".join(lines))
+    return versions
+
+
+def stage(data: bytes) -> StagedFile:
+    checksum = hashlib.sha256(data).hexdigest()
+    path = os.path.join(settings.UPLOAD_TMP_DIR, checksum)
+    with open(path, "wb") as f:
+        f.write(data)
+    return StagedFile(path=path, extension="", size=len(data), checksum=checksum)
+
+
+def blob_of(staged: StagedFile) -> Blob:
+    return Blob(key=staged.checksum, size=staged.size)
+
+
+async def read_all(store: BlobStore, chain: list[Blob], size: int) -> bytes:
+    chunks = store.read(chain[0], 0, size, chain[1:])
+    return b"".join([chunk async for chunk in chunks])
+
+
+async def main(args: argparse.Namespace):
+    versions = make_versions(args.size * MIB, args.versions, args.edits)
+    store = BlobStore(LocalStorageBackend(settings.BLOB_DIR))
+    os.makedirs(settings.UPLOAD_TMP_DIR)
+    # Delta chain of the current version, keyframe first
+    chain: list[Blob] = []
+    stored = staging = 0.0
+    for previous, data in zip([b"", *versions], versions):
+        staged = stage(data)
+        delta = None
+        if chain and len(chain) <= settings.DELTA_MAX_CHAIN:
+            started = time.monotonic()
+            delta = await store.stage_delta(chain, len(previous), staged)
+            staging += time.monotonic() - started
+        blob = delta or staged
+        chain = [*chain, blob_of(delta)] if delta else [blob_of(staged)]
+        stored += blob.size
+        await store.store(blob)
+        await files.discard_all(staged, delta)
+
+    full = sum(map(len, versions))
+    print(f"versions      {len(versions)} of ~{len(versions[-1]) / MIB:.1f} MiB")
+    print(f"full copies   {full / MIB:10.1f} MiB")
+    print(f"with deltas   {stored / MIB:10.1f} MiB ({stored / full:.1%})")
+    print(f"delta chain   {len(chain) - 1} deltas on the last keyframe")
+    print(
+        f"staging       {staging / max(len(versions) - 1, 1) * 1000:10.1f} ms/version"
+    )
+
+    started = time.monotonic()
+    assert await read_all(store, chain, len(versions[-1])) == versions[-1]
+    elapsed = time.monotonic() - started
+    print(f"read latest   {len(versions[-1]) / MIB / elapsed:10.1f} MiB/s")
+    started = time.monotonic()
+    await read_all(store, chain[:1], chain[0].size)
+    elapsed = time.monotonic() - started
+    print(f"read keyframe {chain[0].size / MIB / elapsed:10.1f} MiB/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=16, help="file size in MiB")
+    parser.add_argument("--versions", type=int, default=20)
+    parser.add_argument("--edits", type=int, default=10, help="edits per version")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        asyncio.run(main(args))
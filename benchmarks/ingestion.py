@@ -0,0 +1,83 @@
+"""
+Throughput of bulk ingestion by batch size. Documents are created in the
+application database (DATABASE_URL), owned by an existing user. Run from the
+project root:
+
+    python benchmarks/ingestion.py --user admin@example.com --documents 2000
+
+Each document has a small file of its own. Files and blobs are written to a
+temporary directory.
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import settings
+from auth.services import AuthService
+from containers import Container
+from documents import files
+from utils.utils import io_bound_task
+
+
+def write_documents(path: str, count: int, category_id: int):
+    with open(path, "w") as f:
+        for i in range(count):
+            name = f"benchmark-{time.time_ns()}-{i}.txt"
+            with open(name, "w") as document:
+                document.write(f"content of document {i}\n" * 32)
+            row = {"name": name, "category_id": category_id, "file": name}
+            f.write(json.dumps(row) + "\n")
+
+
+async def stage_file(name: str) -> files.StagedFile:
+    return await files.stage_parts([name], name)
+
+
+async def main(args: argparse.Namespace):
+    container = Container()
+    user = await container.user_service().get_user_by_email(args.user)
+    if not user:
+        sys.exit(f"Unknown user {args.user}")
+    os.makedirs(settings.UPLOAD_TMP_DIR, exist_ok=True)
+    document_service = container.document_service()
+    try:
+        for batch_size in args.batch_sizes:
+            write_documents("documents.ndjson", args.documents, args.category)
+            settings.BULK_INGEST_BATCH_SIZE = batch_size
+            started = time.monotonic()
+            with open("documents.ndjson", "rb") as f:
+                response = await document_service.ingest_documents(
+                    AuthService.user_payload(user),
+                    files.iter_lines(functools.partial(io_bound_task, f.read)),
+                    stage_file,
+                )
+            elapsed = time.monotonic() - started
+            print(
+                f"batch {batch_size:5}  {response.created} documents "
+                f"{len(response.errors)} errors  "
+                f"{response.created / elapsed:10.1f} documents/s"
+            )
+    finally:
+        container.preview_service().shutdown()
+        container.content_extraction_service().shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user", required=True, help="email of the owner")
+    parser.add_argument("--category", type=int, default=1, help="category id")
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument(
+        "--batch-sizes", type=int, nargs="+", default=[1, 50, 500], metavar="SIZE"
+    )
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        asyncio.run(main(args))
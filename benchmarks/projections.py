@@ -0,0 +1,65 @@
+"""
+Rows per second read and serialized for a page of documents, loaded as ORM
+entities then validated and encoded the way FastAPI does, versus selected as
+column projections and serialized by utils.projections. Reads the application
+database (DATABASE_URL), which needs at least --size documents. Run from the
+project root:
+
+    python benchmarks/projections.py --size 1000 --repeat 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.orm import noload
+
+from containers import default_session_factory
+from documents.schemas import DocumentResponse
+from models import Document
+from utils import projections
+
+
+async def read_entities(size: int) -> bytes:
+    async with default_session_factory() as session:
+        documents = await session.scalars(
+            select(Document).options(noload("*")).order_by(Document.id).limit(size)
+        )
+        page = [DocumentResponse.model_validate(d) for d in documents]
+    return json.dumps(jsonable_encoder(page)).encode()
+
+
+async def read_projections(size: int) -> bytes:
+    async with default_session_factory() as session:
+        result = await session.execute(
+            select(*projections.columns(DocumentResponse, Document))
+            .order_by(Document.id)
+            .limit(size)
+        )
+        rows = result.all()
+    return bytes(projections.json_response(list[DocumentResponse], rows).body)
+
+
+async def main(args: argparse.Namespace):
+    for label, read in (("orm", read_entities), ("projection", read_projections)):
+        # Warm up the connection pool and the validators
+        assert len(json.loads(await read(args.size))) == args.size
+        started = time.monotonic()
+        for _ in range(args.repeat):
+            await read(args.size)
+        elapsed = time.monotonic() - started
+        print(f"{label:<12} {args.size * args.repeat / elapsed:10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1000, help="rows per page")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,78 @@
+"""
+Write and read throughput of the configured storage backend
+(settings.STORAGE_BACKEND), run from the project root:
+
+    python benchmarks/storage_throughput.py --size 64 --count 16
+
+Writes `count` files of `size` MiB, `concurrency` at a time, reads them back
+whole and in ranges, then deletes them.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from containers import Container
+
+MIB = 1024 * 1024
+
+
+def report(label: str, total: int, elapsed: float):
+    print(f"{label:<12} {total / MIB / elapsed:10.1f} MiB/s  ({elapsed:.2f}s)")
+
+
+async def timed(label: str, total: int, tasks):
+    started = time.monotonic()
+    await asyncio.gather(*tasks)
+    report(label, total, time.monotonic() - started)
+
+
+async def main(args: argparse.Namespace):
+    backend = Container().storage_backend()
+    size = args.size * MIB
+    keys = [f"benchmark-{uuid.uuid4().hex}" for _ in range(args.count)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    data = os.urandom(size)
+
+    async def put(key: str, directory: str):
+        path = os.path.join(directory, key)
+        with open(path, "wb") as f:
+            f.write(data)
+        async with semaphore:
+            await backend.put_file(key, path)
+
+    async def read(key: str, start: int = 0, end=None):
+        async with semaphore:
+            async for _ in backend.read(key, start, end):
+                pass
+
+    async def delete(key: str):
+        async with semaphore:
+            await backend.delete(key)
+
+    total = size * args.count
+    range_size = min(size, MIB)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            await timed("write", total, [put(key, directory) for key in keys])
+        await timed("read", total, [read(key) for key in keys])
+        await timed(
+            "read 1 MiB",
+            range_size * args.count,
+            [read(key, size // 2, size // 2 + range_size) for key in keys],
+        )
+    finally:
+        await asyncio.gather(*[delete(key) for key in keys])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=64, help="file size in MiB")
+    parser.add_argument("--count", type=int, default=16, help="number of files")
+    parser.add_argument("--concurrency", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
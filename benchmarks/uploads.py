@@ -0,0 +1,89 @@
+"""
+Peak memory (RSS) and latency of concurrent large uploads, staged the way
+uploads used to be (read whole into memory, written on the event loop) and
+streamed by documents.files.stage_upload. Run from the project root:
+
+    python benchmarks/uploads.py --size 256 --concurrency 8 --count 32
+
+Each mode runs in a process of its own, so that peak RSS is measured
+separately. Uploads are read from a file on disk, as FastAPI spools them.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from fastapi import UploadFile
+
+import settings
+from documents import files
+
+MIB = 1024 * 1024
+
+
+async def stage_in_memory(upload: UploadFile) -> files.StagedFile:
+    data = await upload.read()
+    os.makedirs(settings.UPLOAD_TMP_DIR, exist_ok=True)
+    path = os.path.join(settings.UPLOAD_TMP_DIR, uuid.uuid4().hex)
+    with open(path, "wb") as f:
+        f.write(data)
+    return files.StagedFile(path=path, extension="", size=len(data), checksum="")
+
+
+STAGES = {"before": stage_in_memory, "after": files.stage_upload}
+
+
+async def upload(stage, source: str, semaphore: asyncio.Semaphore) -> float:
+    async with semaphore:
+        started = time.monotonic()
+        with open(source, "rb") as f:
+            staged = await stage(UploadFile(f, filename="upload.bin"))
+        elapsed = time.monotonic() - started
+        await files.discard(staged)
+        return elapsed
+
+
+async def run_uploads(mode: str, source: str, args: argparse.Namespace) -> list:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    return await asyncio.gather(
+        *(upload(STAGES[mode], source, semaphore) for _ in range(args.count))
+    )
+
+
+def run_mode(mode: str, directory: str, args: argparse.Namespace) -> tuple:
+    os.chdir(directory)
+    latencies = sorted(asyncio.run(run_uploads(mode, "source.bin", args)))
+    # ru_maxrss is in KiB on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return peak_rss, latencies
+
+
+def main(args: argparse.Namespace):
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "source.bin"), "wb") as f:
+            for _ in range(args.size):
+                f.write(os.urandom(MIB))
+        with multiprocessing.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+            for mode in STAGES:
+                peak_rss, latencies = pool.apply(run_mode, (mode, directory, args))
+                p99 = statistics.quantiles(latencies, n=100)[98]
+                print(
+                    f"{mode:<7} peak RSS {peak_rss / MIB:8.0f} MiB  "
+                    f"p50 {statistics.median(latencies):6.2f}s  p99 {p99:6.2f}s"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=256, help="upload size in MiB")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--count", type=int, default=32, help="uploads per mode")
+    main(parser.parse_args())
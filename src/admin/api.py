@@ -0,0 +1,49 @@
+from typing import Annotated
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import APIRouter, Depends, Query
+from starlette.responses import StreamingResponse
+
+import metrics
+from auth.schemas import TokenUserPayload
+from auth.security import get_admin
+from documents.schemas import DocumentHistoryExportParams
+from documents.services import ExportService
+
+admin_router = APIRouter(prefix="/admin", tags=["admin"])
+
+HISTORY_EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+@admin_router.get("/metrics")
+async def get_metrics(current_user: TokenUserPayload = Depends(get_admin)):
+    """
+    Throughput of the background pipelines and state of the database
+    connection pools of this process.
+    """
+    return metrics.snapshot()
+
+
+@admin_router.get("/history/export")
+@inject
+async def export_document_history(
+    params: Annotated[DocumentHistoryExportParams, Query()],
+    current_user: TokenUserPayload = Depends(get_admin),
+    export_service: ExportService = Depends(Provide["export_service"]),
+):
+    """
+    Stream the document history (audit log), oldest entries first. The export
+    is read through a database cursor and sent as the client consumes it.
+    """
+    return StreamingResponse(
+        export_service.export_history(params),
+        media_type=HISTORY_EXPORT_MEDIA_TYPES[params.format],
+        headers={
+            "content-disposition": (
+                f'attachment; filename="document-history.{params.format}"'
+            )
+        },
+    )
@@ -0,0 +1,73 @@
+"""document contents
+
+Revision ID: 0e5b7f3a9c62
+Revises: f2a6c3d81e40
+Create Date: 2025-05-19 09:47:12.553086
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0e5b7f3a9c62"
+down_revision: Union[str, None] = "f2a6c3d81e40"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "document_contents",
+        sa.Column("document_id", sa.Integer(), nullable=False),
+        sa.Column("version_id", sa.Integer(), nullable=False),
+        sa.Column("checksum", sa.String(length=64), nullable=False),
+        sa.Column("text", sa.Text(), nullable=False),
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "setweight(to_tsvector('english', coalesce(text, '')), 'D')",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False
+        ),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["document_id"], ["documents.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["version_id"], ["version_histories.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("document_id"),
+    )
+    op.create_index(
+        op.f("ix_document_contents_id"), "document_contents", ["id"], unique=False
+    )
+    op.create_index(
+        op.f("ix_document_contents_checksum"),
+        "document_contents",
+        ["checksum"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_document_contents_search_vector",
+        "document_contents",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_document_contents_search_vector", table_name="document_contents")
+    op.drop_index(op.f("ix_document_contents_checksum"), table_name="document_contents")
+    op.drop_index(op.f("ix_document_contents_id"), table_name="document_contents")
+    op.drop_table("document_contents")
@@ -0,0 +1,78 @@
+"""indexes of document queries
+
+Revision ID: 6b0d3e8f15a7
+Revises: a4d9e2b7c815
+Create Date: 2025-05-23 09:47:12.518304
+
+"""
+
+from typing import Any, Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "6b0d3e8f15a7"
+down_revision: Union[str, None] = "a4d9e2b7c815"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# name, table, columns and options of each index
+INDEXES: tuple[tuple[str, str, list[str], dict[str, Any]], ...] = (
+    (
+        "ix_documents_user_id_created_at_id",
+        "documents",
+        ["user_id", "created_at", "id"],
+        {},
+    ),
+    ("ix_documents_sub_category_id", "documents", ["sub_category_id"], {}),
+    (
+        "ix_version_histories_document_id_created_at",
+        "version_histories",
+        ["document_id", "created_at"],
+        {},
+    ),
+    (
+        "ix_version_histories_document_id_current",
+        "version_histories",
+        ["document_id"],
+        {"postgresql_where": sa.text("current_version")},
+    ),
+    (
+        "ix_document_histories_action_by_created_at_id",
+        "document_histories",
+        ["action_by", "created_at", "id"],
+        {},
+    ),
+    ("ix_document_histories_document_id", "document_histories", ["document_id"], {}),
+    (
+        "ix_document_comments_document_id_created_at_id",
+        "document_comments",
+        ["document_id", "created_at", "id"],
+        {},
+    ),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Build the indexes without locking writes on the tables. A build that
+    # failed leaves an invalid index behind, drop it before running again.
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                postgresql_concurrently=True,
+                **options,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
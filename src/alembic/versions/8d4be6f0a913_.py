@@ -0,0 +1,48 @@
+"""delta storage of versions
+
+Revision ID: 8d4be6f0a913
+Revises: 5e2a8d0c4f17
+Create Date: 2025-05-12 11:03:27.640815
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8d4be6f0a913"
+down_revision: Union[str, None] = "5e2a8d0c4f17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "version_histories", sa.Column("delta_base_id", sa.Integer(), nullable=True)
+    )
+    op.add_column(
+        "version_histories",
+        sa.Column("delta_depth", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.create_foreign_key(
+        "version_histories_delta_base_id_fkey",
+        "version_histories",
+        "version_histories",
+        ["delta_base_id"],
+        ["id"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint(
+        "version_histories_delta_base_id_fkey",
+        "version_histories",
+        type_="foreignkey",
+    )
+    op.drop_column("version_histories", "delta_depth")
+    op.drop_column("version_histories", "delta_base_id")
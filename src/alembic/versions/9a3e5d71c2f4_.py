@@ -0,0 +1,58 @@
+"""references of blobs by versions of deleted documents
+
+Revision ID: 9a3e5d71c2f4
+Revises: c4f19e7a2b58
+Create Date: 2025-06-05 16:22:09.310482
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9a3e5d71c2f4"
+down_revision: Union[str, None] = "c4f19e7a2b58"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Built without locking writes on the table. A build that failed leaves an
+    # invalid index behind, drop it before running again.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_version_histories_blob_key",
+            "version_histories",
+            ["blob_key"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+    # Versions of documents deleted so far kept the references to their blobs.
+    # Deleting a document now releases them, while keeping its versions: count
+    # the references of the versions of existing documents only.
+    op.execute("""
+        UPDATE blobs SET ref_count = referenced.count
+        FROM (
+            SELECT blobs.id, count(version_histories.id) AS count
+            FROM blobs
+            LEFT JOIN version_histories
+                ON version_histories.blob_key = blobs.key
+                AND version_histories.document_id IS NOT NULL
+            GROUP BY blobs.id
+        ) AS referenced
+        WHERE blobs.id = referenced.id AND blobs.ref_count <> referenced.count
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Reference counts are left as they are
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_version_histories_blob_key",
+            table_name="version_histories",
+            postgresql_concurrently=True,
+        )
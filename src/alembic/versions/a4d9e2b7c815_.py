@@ -0,0 +1,142 @@
+"""document tags
+
+Revision ID: a4d9e2b7c815
+Revises: 0e5b7f3a9c62
+Create Date: 2025-05-21 14:08:36.271940
+
+"""
+
+import datetime
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a4d9e2b7c815"
+down_revision: Union[str, None] = "0e5b7f3a9c62"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+# Documents of a batch, and documents created or changed since a point in time
+_BATCH = "documents.id >= :start AND documents.id < :end"
+_CHANGED = "(documents.created_at >= :since OR documents.updated_at >= :since)"
+
+
+def _insert_tags(where: str) -> sa.TextClause:
+    return sa.text(f"""
+        INSERT INTO tags (title)
+        SELECT DISTINCT btrim(tag)
+        FROM documents
+        CROSS JOIN LATERAL unnest(string_to_array(documents.tags, ',')) AS tag
+        WHERE {where} AND btrim(tag) <> ''
+        ON CONFLICT (title) DO NOTHING
+        """)
+
+
+def _insert_document_tags(where: str) -> sa.TextClause:
+    return sa.text(f"""
+        INSERT INTO document_tags (document_id, tag_id)
+        SELECT DISTINCT documents.id, tags.id
+        FROM documents
+        CROSS JOIN LATERAL unnest(string_to_array(documents.tags, ',')) AS tag
+        JOIN tags ON tags.title = btrim(tag)
+        WHERE {where}
+        ON CONFLICT DO NOTHING
+        """)
+
+
+def _started(connection: sa.Connection) -> datetime.datetime:
+    """
+    Time from which documents may change unseen by the backfill: now, or the
+    start of the oldest transaction running, whose changes are not visible yet.
+    """
+    return connection.execute(sa.text("""
+        SELECT least(LOCALTIMESTAMP, min(xact_start)::timestamp)
+        FROM pg_stat_activity
+        WHERE datname = current_database()
+        """)).scalar_one()
+
+
+def _backfill(connection: sa.Connection):
+    """
+    Backfill document_tags from documents.tags, one batch of documents per
+    transaction so that documents are never locked for long.
+    """
+    last_id = connection.execute(sa.text("SELECT max(id) FROM documents")).scalar()
+    if last_id is None:
+        return
+    for batch_start in range(0, last_id + 1, BACKFILL_BATCH_SIZE):
+        params = {"start": batch_start, "end": batch_start + BACKFILL_BATCH_SIZE}
+        connection.execute(_insert_tags(_BATCH), params)
+        connection.execute(_insert_document_tags(_BATCH), params)
+
+
+def _resync(connection: sa.Connection, since: datetime.datetime):
+    """
+    Replace the tags of the documents created or changed since `since`, which
+    their batch may have missed.
+    """
+    params = {"since": since}
+    connection.execute(_insert_tags(_CHANGED), params)
+    connection.execute(
+        sa.text(f"""
+            DELETE FROM document_tags USING documents
+            WHERE document_tags.document_id = documents.id AND {_CHANGED}
+            """),
+        params,
+    )
+    connection.execute(_insert_document_tags(_CHANGED), params)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "document_tags",
+        sa.Column("document_id", sa.Integer(), nullable=False),
+        sa.Column("tag_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["document_id"], ["documents.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["tag_id"], ["tags.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("document_id", "tag_id"),
+    )
+    op.create_index(
+        "ix_document_tags_tag_id_document_id",
+        "document_tags",
+        ["tag_id", "document_id"],
+        unique=False,
+    )
+    # Tags are now looked up by title, keep the oldest of duplicated titles
+    op.execute("""
+        DELETE FROM tags USING tags AS kept
+        WHERE tags.title = kept.title AND tags.id > kept.id
+        """)
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f("ix_tags_title"),
+            "tags",
+            ["title"],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        connection = op.get_bind()
+        since = _started(connection)
+        _backfill(connection)
+        # Catch up with the documents created or changed during the backfill
+        resynced = _started(connection)
+        _resync(connection, since)
+
+    # Writes are only blocked while the documents created or changed during
+    # the catch-up are resynced
+    op.execute("LOCK TABLE documents IN SHARE MODE")
+    _resync(op.get_bind(), resynced)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_tags_title"), table_name="tags")
+    op.drop_index("ix_document_tags_tag_id_document_id", table_name="document_tags")
+    op.drop_table("document_tags")
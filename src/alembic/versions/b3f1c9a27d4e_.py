@@ -0,0 +1,70 @@
+"""content addressed blob store
+
+Revision ID: b3f1c9a27d4e
+Revises: 7638bd5d57e4
+Create Date: 2025-05-02 09:12:41.318204
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b3f1c9a27d4e"
+down_revision: Union[str, None] = "7638bd5d57e4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "blobs",
+        sa.Column("key", sa.String(length=64), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("key"),
+    )
+    op.create_index(op.f("ix_blobs_id"), "blobs", ["id"], unique=False)
+    op.add_column(
+        "version_histories",
+        sa.Column("blob_key", sa.String(length=64), nullable=True),
+    )
+    op.add_column(
+        "version_histories", sa.Column("size", sa.BigInteger(), nullable=True)
+    )
+    op.add_column(
+        "version_histories",
+        sa.Column("checksum", sa.String(length=64), nullable=True),
+    )
+    op.create_foreign_key(
+        "version_histories_blob_key_fkey",
+        "version_histories",
+        "blobs",
+        ["blob_key"],
+        ["key"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint(
+        "version_histories_blob_key_fkey", "version_histories", type_="foreignkey"
+    )
+    op.drop_column("version_histories", "checksum")
+    op.drop_column("version_histories", "size")
+    op.drop_column("version_histories", "blob_key")
+    op.drop_index(op.f("ix_blobs_id"), table_name="blobs")
+    op.drop_table("blobs")
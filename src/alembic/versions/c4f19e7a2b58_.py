@@ -0,0 +1,187 @@
+"""monthly partitions of document histories
+
+Revision ID: c4f19e7a2b58
+Revises: e8a41c6d90b3
+Create Date: 2025-06-02 10:14:38.905127
+
+"""
+
+import datetime
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c4f19e7a2b58"
+down_revision: Union[str, None] = "e8a41c6d90b3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COPY_BATCH_SIZE = 50000
+# Months of partitions created ahead, as settings.HISTORY_PARTITIONS_AHEAD
+# when this revision was written
+PARTITIONS_AHEAD = 3
+
+INDEXES = (
+    ("ix_document_histories_id", ["id"]),
+    (
+        "ix_document_histories_action_by_created_at_id",
+        ["action_by", "created_at", "id"],
+    ),
+    ("ix_document_histories_document_id", ["document_id"]),
+    ("ix_document_histories_created_at_id", ["created_at", "id"]),
+)
+
+COLUMNS = "id, document_id, action, action_by, description, created_at, updated_at"
+
+_COPY_ROWS = sa.text(f"""
+    INSERT INTO document_histories_new ({COLUMNS})
+    SELECT {COLUMNS} FROM document_histories
+    WHERE id >= :start AND id < :end
+    ON CONFLICT DO NOTHING
+    """)
+# Entries committed after their id range was copied
+_COPY_MISSING_ROWS = sa.text(f"""
+    INSERT INTO document_histories_new ({COLUMNS})
+    SELECT {COLUMNS} FROM document_histories
+    WHERE NOT EXISTS (
+        SELECT FROM document_histories_new
+        WHERE document_histories_new.id = document_histories.id
+    )
+    """)
+
+
+def _add_months(month: datetime.date, months: int) -> datetime.date:
+    month_index = month.year * 12 + month.month - 1 + months
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _create_table(partitioned: bool):
+    """
+    Create the new table, document_histories_new, next to the current one. Its
+    indexes are named after those of the current table, with a _new suffix.
+    """
+    op.execute(f"""
+        CREATE TABLE document_histories_new (
+            id integer NOT NULL DEFAULT nextval('document_histories_id_seq'),
+            document_id integer,
+            action varchar,
+            action_by integer NOT NULL,
+            description varchar,
+            created_at timestamp without time zone NOT NULL DEFAULT now(),
+            updated_at timestamp without time zone,
+            CONSTRAINT document_histories_new_pkey
+                PRIMARY KEY ({"id, created_at" if partitioned else "id"}),
+            CONSTRAINT document_histories_document_id_fkey FOREIGN KEY (document_id)
+                REFERENCES documents (id) ON DELETE SET NULL,
+            CONSTRAINT document_histories_action_by_fkey FOREIGN KEY (action_by)
+                REFERENCES users (id)
+        ) {"PARTITION BY RANGE (created_at)" if partitioned else ""}
+        """)
+    for name, columns in INDEXES:
+        op.create_index(f"{name}_new", "document_histories_new", columns, unique=False)
+
+
+def _create_partitions():
+    """
+    Create monthly partitions from the first entry up to PARTITIONS_AHEAD
+    months ahead, later ones are created by HistoryPartitionService.
+    """
+    first = op.get_bind().scalar(
+        sa.text("SELECT min(created_at) FROM document_histories")
+    )
+    today = datetime.date.today()
+    month = (first.date() if first else today).replace(day=1)
+    last = _add_months(today.replace(day=1), PARTITIONS_AHEAD)
+    while month <= last:
+        end = _add_months(month, 1)
+        op.execute(f"""
+            CREATE TABLE document_histories_p{month:%Y%m}
+            PARTITION OF document_histories_new
+            FOR VALUES FROM ('{month}') TO ('{end}')
+            """)
+        month = end
+    # Entries outside of the partitions (late or retained) are not rejected
+    op.execute(
+        "CREATE TABLE document_histories_default "
+        "PARTITION OF document_histories_new DEFAULT"
+    )
+
+
+def _copy_rows(connection: sa.Connection):
+    """
+    Copy entries to the new table, one batch per transaction so that the
+    current table stays available.
+    """
+    last_id = connection.execute(
+        sa.text("SELECT max(id) FROM document_histories")
+    ).scalar()
+    if last_id is None:
+        return
+    for batch_start in range(0, last_id + 1, COPY_BATCH_SIZE):
+        connection.execute(
+            _COPY_ROWS, {"start": batch_start, "end": batch_start + COPY_BATCH_SIZE}
+        )
+
+
+def _check_copied(connection: sa.Connection):
+    """
+    Check that the new table holds as many entries as the current one, before
+    the current one is dropped.
+    """
+    current, new = connection.execute(sa.text("""
+        SELECT
+            (SELECT count(*) FROM document_histories),
+            (SELECT count(*) FROM document_histories_new)
+        """)).one()
+    if current != new:
+        raise RuntimeError(
+            f"{new} entries copied to document_histories_new, "
+            f"document_histories holds {current}"
+        )
+
+
+def _copy_table(partitioned: bool):
+    """
+    Copy document_histories to a new table in batches, then swap the tables.
+    Writes are only blocked while the entries written during the copy are
+    caught up.
+    """
+    _create_table(partitioned)
+    if partitioned:
+        _create_partitions()
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        _copy_rows(connection)
+        # Catch up with the entries written during the first pass
+        connection.execute(_COPY_MISSING_ROWS)
+
+    op.execute("LOCK TABLE document_histories IN EXCLUSIVE MODE")
+    # All the entries left, whatever their id
+    connection = op.get_bind()
+    connection.execute(_COPY_MISSING_ROWS)
+    _check_copied(connection)
+    op.execute("ALTER SEQUENCE document_histories_id_seq OWNED BY NONE")
+    op.drop_table("document_histories")
+    op.rename_table("document_histories_new", "document_histories")
+    op.execute(
+        "ALTER TABLE document_histories "
+        "RENAME CONSTRAINT document_histories_new_pkey TO document_histories_pkey"
+    )
+    for name, _ in INDEXES:
+        op.execute(f"ALTER INDEX {name}_new RENAME TO {name}")
+    op.execute(
+        "ALTER SEQUENCE document_histories_id_seq OWNED BY document_histories.id"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _copy_table(partitioned=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _copy_table(partitioned=False)
@@ -0,0 +1,33 @@
+"""blob compression
+
+Revision ID: c71e09a4d2b5
+Revises: 8d4be6f0a913
+Create Date: 2025-05-14 16:42:08.318502
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c71e09a4d2b5"
+down_revision: Union[str, None] = "8d4be6f0a913"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("blobs", sa.Column("encoding", sa.String(length=16), nullable=True))
+    op.add_column("blobs", sa.Column("block_size", sa.Integer(), nullable=True))
+    op.add_column("blobs", sa.Column("blocks", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("blobs", "blocks")
+    op.drop_column("blobs", "block_size")
+    op.drop_column("blobs", "encoding")
@@ -0,0 +1,146 @@
+"""version numbers and current version of documents
+
+Revision ID: d35c8a1f7e92
+Revises: 6b0d3e8f15a7
+Create Date: 2025-05-26 16:32:05.740218
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d35c8a1f7e92"
+down_revision: Union[str, None] = "6b0d3e8f15a7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "version_histories", sa.Column("version_number", sa.Integer(), nullable=True)
+    )
+    op.add_column(
+        "documents",
+        sa.Column("version_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "documents", sa.Column("current_version_id", sa.Integer(), nullable=True)
+    )
+    # Concurrent uploads could leave several current versions, keep the latest
+    op.execute("""
+        UPDATE version_histories SET current_version = false
+        WHERE current_version AND EXISTS (
+            SELECT 1 FROM version_histories AS newer
+            WHERE newer.document_id = version_histories.document_id
+            AND newer.current_version
+            AND (newer.created_at, newer.id)
+                > (version_histories.created_at, version_histories.id)
+        )
+        """)
+    op.execute("""
+        UPDATE version_histories SET version_number = numbered.version_number
+        FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY document_id ORDER BY created_at, id
+            ) AS version_number
+            FROM version_histories
+        ) AS numbered
+        WHERE version_histories.id = numbered.id
+        """)
+    op.execute("""
+        UPDATE documents
+        SET version_count = versions.version_count,
+            current_version_id = versions.current_version_id
+        FROM (
+            SELECT document_id,
+                max(version_number) AS version_count,
+                max(id) FILTER (WHERE current_version) AS current_version_id
+            FROM version_histories
+            WHERE document_id IS NOT NULL
+            GROUP BY document_id
+        ) AS versions
+        WHERE documents.id = versions.document_id
+        """)
+    op.alter_column("version_histories", "version_number", nullable=False)
+    op.create_foreign_key(
+        "documents_current_version_id_fkey",
+        "documents",
+        "version_histories",
+        ["current_version_id"],
+        ["id"],
+        ondelete="SET NULL",
+    )
+
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_version_histories_document_id_current",
+            table_name="version_histories",
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_version_histories_document_id_current",
+            "version_histories",
+            ["document_id"],
+            unique=True,
+            postgresql_where=sa.text("current_version"),
+            postgresql_concurrently=True,
+        )
+        # Versions are now listed by number
+        op.drop_index(
+            "ix_version_histories_document_id_created_at",
+            table_name="version_histories",
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "uq_version_histories_document_id_version_number",
+            "version_histories",
+            ["document_id", "version_number"],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+    op.execute("""
+        ALTER TABLE version_histories
+        ADD CONSTRAINT uq_version_histories_document_id_version_number
+        UNIQUE USING INDEX uq_version_histories_document_id_version_number
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint(
+        "uq_version_histories_document_id_version_number",
+        "version_histories",
+        type_="unique",
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_version_histories_document_id_created_at",
+            "version_histories",
+            ["document_id", "created_at"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_version_histories_document_id_current",
+            table_name="version_histories",
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_version_histories_document_id_current",
+            "version_histories",
+            ["document_id"],
+            unique=False,
+            postgresql_where=sa.text("current_version"),
+            postgresql_concurrently=True,
+        )
+    op.drop_constraint(
+        "documents_current_version_id_fkey", "documents", type_="foreignkey"
+    )
+    op.drop_column("documents", "current_version_id")
+    op.drop_column("documents", "version_count")
+    op.drop_column("version_histories", "version_number")
@@ -0,0 +1,39 @@
+"""document history exports index
+
+Revision ID: e8a41c6d90b3
+Revises: d35c8a1f7e92
+Create Date: 2025-05-28 11:05:47.392816
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e8a41c6d90b3"
+down_revision: Union[str, None] = "d35c8a1f7e92"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_document_histories_created_at_id",
+            "document_histories",
+            ["created_at", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_document_histories_created_at_id",
+            table_name="document_histories",
+            postgresql_concurrently=True,
+        )
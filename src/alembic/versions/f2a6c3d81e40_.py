@@ -0,0 +1,97 @@
+"""document full-text search
+
+Revision ID: f2a6c3d81e40
+Revises: c71e09a4d2b5
+Create Date: 2025-05-16 10:21:54.902117
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f2a6c3d81e40"
+down_revision: Union[str, None] = "c71e09a4d2b5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+# Weighted search document: name (A), tags (B), description (C)
+_SEARCH_VECTOR = """
+    setweight(to_tsvector('english', coalesce({row}name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}tags, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce({row}description, '')), 'C')
+"""
+_CREATE_FUNCTION = f"""
+    CREATE FUNCTION documents_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {_SEARCH_VECTOR.format(row="NEW.")};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+_CREATE_TRIGGER = """
+    CREATE TRIGGER documents_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, tags, description ON documents
+    FOR EACH ROW EXECUTE FUNCTION documents_search_vector_update()
+"""
+_BACKFILL = sa.text(f"""
+    UPDATE documents SET search_vector = {_SEARCH_VECTOR.format(row="")}
+    WHERE id >= :start AND id < :end
+    """)
+
+
+def _backfill(connection: sa.Connection):
+    """
+    Compute the search vector of existing documents, one batch per transaction
+    so that documents are never locked for long. Documents created or changed
+    meanwhile are handled by the trigger.
+    """
+    last_id = connection.execute(sa.text("SELECT max(id) FROM documents")).scalar()
+    if last_id is None:
+        return
+    for batch_start in range(0, last_id + 1, BACKFILL_BATCH_SIZE):
+        params = {"start": batch_start, "end": batch_start + BACKFILL_BATCH_SIZE}
+        connection.execute(_BACKFILL, params)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Unlike a stored generated column, a nullable column without default does
+    # not rewrite the table: it is maintained by a trigger and backfilled in
+    # batches instead.
+    op.add_column(
+        "documents",
+        sa.Column("search_vector", postgresql.TSVECTOR(), nullable=True),
+    )
+    op.execute(_CREATE_FUNCTION)
+    op.execute(_CREATE_TRIGGER)
+    with op.get_context().autocommit_block():
+        _backfill(op.get_bind())
+        # Build the index without locking writes on the table
+        op.create_index(
+            "ix_documents_search_vector",
+            "documents",
+            ["search_vector"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_documents_search_vector",
+            table_name="documents",
+            postgresql_concurrently=True,
+        )
+    op.execute("DROP TRIGGER documents_search_vector_update ON documents")
+    op.execute("DROP FUNCTION documents_search_vector_update()")
+    op.drop_column("documents", "search_vector")
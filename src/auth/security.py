@@ -70,6 +70,10 @@ def _check_and_extract_user(request: Request) -> TokenUserPayload:
     authorization_header = request.headers.get("Authorization")
     if not authorization_header:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    # Decoded already by ReadYourWritesMiddleware, when replicas are configured
+    token_user = getattr(request.state, "token_user", None)
+    if token_user is not None:
+        return token_user
     try:
         access_token = authorization_header.replace("Bearer ", "")
         token_user_payload = extract_user_from_token(access_token)
@@ -34,11 +34,17 @@ class AuthService:
 
     def _generate_jwt_access_token(self, user_data: LoggedInUser) -> str:
         iat = datetime.datetime.now(datetime.timezone.utc)
+        payload = dict(iat=iat, user=self.user_payload(user_data).model_dump())
+        enc_jwt = jwt.encode(payload=payload, key="secret", algorithm="HS256")
+        return enc_jwt
+
+    @staticmethod
+    def user_payload(user_data: LoggedInUser) -> TokenUserPayload:
         permissions = None
         if user_data.role and user_data.role.permissions:
             permissions = [permission.name for permission in user_data.role.permissions]
 
-        user_payload = TokenUserPayload(
+        return TokenUserPayload(
             id=user_data.id,
             email=user_data.email,
             is_active=user_data.is_active,
@@ -47,6 +53,3 @@ class AuthService:
             role=user_data.role.name if user_data.role else None,
             permissions=permissions,
         )
-        payload = dict(iat=iat, user=user_payload.model_dump())
-        enc_jwt = jwt.encode(payload=payload, key="secret", algorithm="HS256")
-        return enc_jwt
@@ -29,6 +29,7 @@ from users.permissions import (
     CAN_MANAGE_CATEGORY,
     CAN_MANAGE_SUB_CATEGORY,
 )
+from utils import projections
 from utils.schemas import PaginationParams
 
 categories_router = APIRouter(prefix="/categories", tags=["categories"])
@@ -42,15 +43,18 @@ async def get_categories(
     category_service: CategoryService = Depends(Provide["category_service"]),
 ):
     if helpers.is_authorized(current_user, CAN_MANAGE_CATEGORY):
-        categories = await category_service.get_categories(
+        page = await category_service.get_categories(
             pagination_params.page, pagination_params.size
         )
-        total = await category_service.count_categories()
-        return CategoryPaginationResponse(
-            total=total,
-            current=pagination_params.page,
-            size=pagination_params.size,
-            data=categories,
+        return projections.json_response(
+            CategoryPaginationResponse,
+            {
+                "total": page.total,
+                "total_exact": page.exact,
+                "current": pagination_params.page,
+                "size": pagination_params.size,
+                "data": page.rows,
+            },
         )
 
 
@@ -110,15 +114,18 @@ async def get_sub_categories(
     sub_category_service: SubCategoryService = Depends(Provide["sub_category_service"]),
 ):
     if helpers.is_authorized(current_user, CAN_MANAGE_SUB_CATEGORY):
-        sub_categories = await sub_category_service.get_sub_categories(
+        page = await sub_category_service.get_sub_categories(
             pagination_params.page, pagination_params.size
         )
-        total = await sub_category_service.count_sub_categories()
-        return SCPaginationResponse(
-            total=total,
-            current=pagination_params.page,
-            size=pagination_params.size,
-            data=sub_categories,
+        return projections.json_response(
+            SCPaginationResponse,
+            {
+                "total": page.total,
+                "total_exact": page.exact,
+                "current": pagination_params.page,
+                "size": pagination_params.size,
+                "data": page.rows,
+            },
         )
 
 
@@ -1,9 +1,11 @@
 from typing import Optional
 
-from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from categories.schemas import CategoryResponse, SubCategoryResponse
 from models import Category, SubCategory
+from utils import pagination, projections
 
 
 class CategoryRepository:
@@ -11,14 +13,16 @@ class CategoryRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def get_categories(self, page: int, size: int) -> list[Category]:
-        result = await self.session.scalars(
-            select(Category)
-            .offset((page - 1) * size)
-            .limit(size)
-            .order_by(Category.title)
+    async def get_categories(self, page: int, size: int) -> pagination.OffsetPage:
+        return await pagination.offset_page(
+            self.session,
+            select(*projections.columns(CategoryResponse, Category)).order_by(
+                Category.title
+            ),
+            Category.__tablename__,
+            page,
+            size,
         )
-        return list(result.all())
 
     async def create_category(self, data: dict) -> Optional[Category]:
         stmt = insert(Category).values(**data).returning(Category)
@@ -38,24 +42,22 @@ class CategoryRepository:
     async def delete_category(self, c_id: int):
         await self.session.execute(delete(Category).where(Category.id == c_id))
 
-    async def count_categories(self) -> int:
-        result = await self.session.execute(select(func.count()).select_from(Category))
-        return result.scalar_one()
-
 
 class SubCategoryRepository:
 
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def get_sub_categories(self, page: int, size: int) -> list[SubCategory]:
-        result = await self.session.scalars(
-            select(SubCategory)
-            .offset((page - 1) * size)
-            .limit(size)
-            .order_by(SubCategory.title)
+    async def get_sub_categories(self, page: int, size: int) -> pagination.OffsetPage:
+        return await pagination.offset_page(
+            self.session,
+            select(*projections.columns(SubCategoryResponse, SubCategory)).order_by(
+                SubCategory.title
+            ),
+            SubCategory.__tablename__,
+            page,
+            size,
         )
-        return list(result.all())
 
     async def create_sub_category(self, data: dict) -> Optional[SubCategory]:
         stmt = insert(SubCategory).values(**data).returning(SubCategory)
@@ -77,12 +79,6 @@ class SubCategoryRepository:
     async def delete_sub_category(self, sc_id: int):
         await self.session.execute(delete(SubCategory).where(SubCategory.id == sc_id))
 
-    async def count_sub_categories(self) -> int:
-        result = await self.session.execute(
-            select(func.count()).select_from(SubCategory)
-        )
-        return result.scalar_one()
-
     async def get_first_subcategory_by_category(
         self, c_id: int
     ) -> Optional[SubCategory]:
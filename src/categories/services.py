@@ -14,6 +14,8 @@ from categories.schemas import (
 from categories.uow import CategoryUnitOfWork, SubCategoryUnitOfWork
 from documents.services import DocumentService
 from models import Category, SubCategory
+from replicas import read_only
+from utils import pagination
 
 
 class CategoryService:
@@ -26,7 +28,8 @@ class CategoryService:
         self.uow = uow
         self.sc_service = sub_category_service
 
-    async def get_categories(self, page: int, size: int) -> list[Category]:
+    @read_only
+    async def get_categories(self, page: int, size: int) -> pagination.OffsetPage:
         async with self.uow:
             return await self.uow.repository.get_categories(page, size)
 
@@ -39,10 +42,6 @@ class CategoryService:
             await self.uow.commit()
             return category
 
-    async def count_categories(self) -> int:
-        async with self.uow:
-            return await self.uow.repository.count_categories()
-
     async def update_category(self, c_id: int, c_update: CategoryUpdate) -> Category:
         async with self.uow:
             data = {k: v for k, v in c_update.model_dump().items() if v is not None}
@@ -72,11 +71,8 @@ class SubCategoryService:
         self.uow = uow
         self.document_service = document_service
 
-    async def count_sub_categories(self) -> int:
-        async with self.uow:
-            return await self.uow.repository.count_sub_categories()
-
-    async def get_sub_categories(self, page: int, size: int) -> list[SubCategory]:
+    @read_only
+    async def get_sub_categories(self, page: int, size: int) -> pagination.OffsetPage:
         async with self.uow:
             return await self.uow.repository.get_sub_categories(page, size)
 
@@ -0,0 +1,134 @@
+"""
+Command line tools, run from the project root:
+
+    python src/cli.py ingest documents.ndjson --user admin@example.com
+"""
+
+import argparse
+import asyncio
+import functools
+import os
+import sys
+import time
+
+from auth.schemas import TokenUserPayload
+from auth.services import AuthService
+from containers import Container
+from documents import files
+from documents.schemas import DocumentIngestResponse
+from documents.services import DocumentService
+from utils.utils import io_bound_task
+
+
+async def ingest(args: argparse.Namespace):
+    """
+    Create documents in bulk from NDJSON metadata, see
+    DocumentService.ingest_documents. File names are relative to --files-dir.
+    """
+    container = Container()
+    user = await container.user_service().get_user_by_email(args.user)
+    if not user:
+        sys.exit(f"Unknown user {args.user}")
+    response, elapsed = await _run_ingestion(
+        container, AuthService.user_payload(user), args
+    )
+
+    for error in response.errors:
+        print(f"line {error.line}: {error.detail}", file=sys.stderr)
+    print(
+        f"{response.created} documents created, {len(response.errors)} errors "
+        f"in {elapsed:.1f}s ({response.created / elapsed:.1f} documents/s)"
+    )
+
+
+async def _run_ingestion(
+    container: Container, user: TokenUserPayload, args: argparse.Namespace
+) -> tuple[DocumentIngestResponse, float]:
+    """
+    Ingest the documents, then wait for their previews and text extraction.
+
+    :return: the ingestion response and the time the ingestion took
+    """
+    audit_writer = container.audit_writer()
+    if audit_writer:
+        audit_writer.start()
+    try:
+        started = time.monotonic()
+        response = await _ingest_file(container.document_service(), user, args)
+        elapsed = time.monotonic() - started
+        await container.preview_service().drain()
+        await container.content_extraction_service().drain()
+    finally:
+        if audit_writer:
+            await audit_writer.close()
+        container.preview_service().shutdown()
+        container.content_extraction_service().shutdown()
+    return response, elapsed
+
+
+async def _ingest_file(
+    document_service: DocumentService,
+    user: TokenUserPayload,
+    args: argparse.Namespace,
+) -> DocumentIngestResponse:
+    files_dir = args.files_dir or os.path.dirname(os.path.abspath(args.metadata))
+
+    async def stage_file(name: str) -> files.StagedFile:
+        return await files.stage_parts([os.path.join(files_dir, name)], name)
+
+    with open(args.metadata, "rb") as f:
+        lines = files.iter_lines(functools.partial(io_bound_task, f.read))
+        return await document_service.ingest_documents(user, lines, stage_file)
+
+
+async def history_partitions(_: argparse.Namespace):
+    """
+    Create upcoming partitions of document history and apply the retention
+    policy, see HistoryPartitionService.
+    """
+    container = Container()
+    created, expired = await container.history_partition_service().maintain_partitions()
+    print(f"created: {', '.join(created) or '-'}")
+    print(f"expired: {', '.join(expired) or '-'}")
+
+
+async def collect_blobs(_: argparse.Namespace):
+    """
+    Delete the blobs no version references anymore, see BlobCollectionService.
+    """
+    container = Container()
+    collected = await container.blob_collection_service().collect_blobs()
+    print(f"{collected} blobs collected")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="cli.py")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser("ingest", help="bulk ingest documents")
+    ingest_parser.add_argument("metadata", help="NDJSON file, a document per line")
+    ingest_parser.add_argument(
+        "--user", required=True, help="email of the user ingesting the documents"
+    )
+    ingest_parser.add_argument(
+        "--files-dir",
+        help="directory of the document files (default: that of the metadata)",
+    )
+    ingest_parser.set_defaults(func=ingest)
+
+    partitions_parser = commands.add_parser(
+        "history-partitions", help="maintain the partitions of document history"
+    )
+    partitions_parser.set_defaults(func=history_partitions)
+
+    collect_parser = commands.add_parser(
+        "collect-blobs", help="delete the blobs of deleted documents"
+    )
+    collect_parser.set_defaults(func=collect_blobs)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
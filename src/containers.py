@@ -1,18 +1,32 @@
 from dependency_injector import containers, providers
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
+import database
 import settings
 from auth.services import AuthService
 from categories.services import CategoryService, SubCategoryService
 from categories.uow import CategoryUnitOfWork, SubCategoryUnitOfWork
-from documents.services import DocumentService
+from documents.audit import AuditWriter
+from documents.blobs import BlobStore
+from documents.previews import PreviewCache
+from documents.services import (
+    BlobCollectionService,
+    ContentExtractionService,
+    DocumentService,
+    ExportService,
+    HistoryPartitionService,
+    PreviewService,
+)
 from documents.uow import DocumentUnitOfWork
+from storage.backends import LocalStorageBackend, S3StorageBackend
 from tags.services import TagService
 from tags.uow import TagUnitOfWork
+from uploads.services import UploadSessionService
+from uploads.uow import UploadSessionUnitOfWork
 from users.services import PermissionService, RoleService, UserService
 from users.uow import PermissionUnitOfWork, RoleUnitOfWork, UserUnitOfWork
 
-engine = create_async_engine(settings.DATABASE_URL)
+engine = database.create_engine(settings.DATABASE_URL, name="pool")
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
 
@@ -22,7 +36,15 @@ def default_session_factory():
 
 class Container(containers.DeclarativeContainer):
     wiring_config = containers.WiringConfiguration(
-        packages=["auth", "users", "categories", "tags", "documents"]
+        packages=[
+            "auth",
+            "users",
+            "categories",
+            "tags",
+            "documents",
+            "uploads",
+            "admin",
+        ]
     )
 
     DEFAULT_SESSION_FACTORY = default_session_factory
@@ -52,10 +74,75 @@ class Container(containers.DeclarativeContainer):
 
     auth_service = providers.Factory(AuthService, user_service=user_service)
 
-    document_uow = providers.Factory(
+    storage_backend = providers.Selector(
+        providers.Object(settings.STORAGE_BACKEND),
+        local=providers.Singleton(LocalStorageBackend, root=settings.BLOB_DIR),
+        s3=providers.Singleton(
+            S3StorageBackend,
+            bucket=settings.S3_BUCKET,
+            prefix=settings.S3_PREFIX,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region_name=settings.S3_REGION,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            part_size=settings.S3_PART_SIZE,
+            max_concurrency=settings.S3_MAX_CONCURRENCY,
+        ),
+    )
+    blob_store = providers.Singleton(BlobStore, storage=storage_backend)
+
+    # Units of work of the audit writer itself write history entries directly
+    audit_uow = providers.Factory(
         DocumentUnitOfWork, session_factory=DEFAULT_SESSION_FACTORY
     )
-    document_service = providers.Factory(DocumentService, uow=document_uow)
+    audit_writer = providers.Selector(
+        providers.Object(settings.AUDIT_WRITER),
+        transactional=providers.Object(None),
+        buffered=providers.Singleton(
+            AuditWriter,
+            uow_factory=audit_uow.provider,
+            flush_interval=settings.AUDIT_FLUSH_INTERVAL,
+            flush_size=settings.AUDIT_FLUSH_SIZE,
+            spool_path=settings.AUDIT_SPOOL_PATH,
+        ),
+    )
+    document_uow = providers.Factory(
+        DocumentUnitOfWork,
+        session_factory=DEFAULT_SESSION_FACTORY,
+        audit_writer=audit_writer,
+    )
+    preview_cache = providers.Singleton(
+        PreviewCache,
+        root=settings.PREVIEW_DIR,
+        max_size=settings.PREVIEW_CACHE_MAX_SIZE,
+    )
+    preview_service = providers.Singleton(
+        PreviewService,
+        uow_factory=document_uow.provider,
+        blob_store=blob_store,
+        cache=preview_cache,
+    )
+    content_extraction_service = providers.Singleton(
+        ContentExtractionService,
+        uow_factory=document_uow.provider,
+        blob_store=blob_store,
+    )
+    document_service = providers.Factory(
+        DocumentService,
+        uow=document_uow,
+        blob_store=blob_store,
+        preview_service=preview_service,
+        content_extraction_service=content_extraction_service,
+    )
+    export_service = providers.Factory(
+        ExportService, uow_factory=document_uow.provider, blob_store=blob_store
+    )
+    blob_collection_service = providers.Factory(
+        BlobCollectionService, uow_factory=document_uow.provider, blob_store=blob_store
+    )
+    history_partition_service = providers.Factory(
+        HistoryPartitionService, uow_factory=document_uow.provider
+    )
 
     category_uow = providers.Factory(
         CategoryUnitOfWork, session_factory=DEFAULT_SESSION_FACTORY
@@ -71,3 +158,12 @@ class Container(containers.DeclarativeContainer):
 
     tag_uow = providers.Factory(TagUnitOfWork, session_factory=DEFAULT_SESSION_FACTORY)
     tag_service = providers.Factory(TagService, uow=tag_uow)
+
+    upload_session_uow = providers.Factory(
+        UploadSessionUnitOfWork, session_factory=DEFAULT_SESSION_FACTORY
+    )
+    upload_session_service = providers.Factory(
+        UploadSessionService,
+        uow=upload_session_uow,
+        document_service=document_service,
+    )
@@ -0,0 +1,89 @@
+"""
+Engines of the database, configured by the DATABASE_* settings, with their
+connection pool instrumented: time waited for connections, timeouts, and
+connections in use or idle are reported by the metrics.
+"""
+
+import time
+import uuid
+from typing import cast
+
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import metrics
+import settings
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Queue pool recording how long checkouts wait for a connection, including
+    opening and pinging it, and checkouts timing out.
+    """
+
+    def __init__(self, creator, *, max_overflow: int = 10, **kwargs):
+        super().__init__(creator, max_overflow=max_overflow, **kwargs)
+        self.max_overflow = max_overflow
+        self.meter = metrics.PoolMeter()
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.meter.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.meter.record(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # Engine.dispose() replaces the pool, keep the values measured so far
+        pool = cast(InstrumentedPool, super().recreate())
+        pool.meter = self.meter
+        return pool
+
+
+def _connect_args() -> dict:
+    if settings.DATABASE_PGBOUNCER:
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            # Names of statements prepared on a server connection could clash
+            # with those of other clients of the same server connection
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return {
+        "statement_cache_size": settings.DATABASE_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DATABASE_STATEMENT_CACHE_SIZE,
+    }
+
+
+def _pool_snapshot(pool: InstrumentedPool) -> dict:
+    return {
+        "size": pool.size(),
+        "max_overflow": pool.max_overflow,
+        "in_use": pool.checkedout(),
+        "idle": pool.checkedin(),
+        **pool.meter.snapshot(),
+    }
+
+
+def create_engine(url: str, name: str) -> AsyncEngine:
+    """
+    Engine of the database at `url`, its pool reported as `name` by the
+    metrics.
+    """
+    engine = create_async_engine(
+        url,
+        poolclass=InstrumentedPool,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+        connect_args=_connect_args(),
+    )
+    # The pool of the engine, replaced by Engine.dispose()
+    metrics.register(name, lambda: _pool_snapshot(cast(InstrumentedPool, engine.pool)))
+    return engine
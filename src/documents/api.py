@@ -1,33 +1,69 @@
-from typing import Optional
+from typing import Annotated, Optional
 
 from dependency_injector.wiring import Provide, inject
-from fastapi import APIRouter, Depends, File, Form, UploadFile
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Form,
+    HTTPException,
+    Query,
+    UploadFile,
+)
+from starlette import status
+from starlette.requests import Request
+from starlette.responses import (
+    FileResponse,
+    JSONResponse,
+    Response,
+    StreamingResponse,
+)
 
+import settings
 from auth import helpers
 from auth.schemas import TokenUserPayload
 from auth.security import get_user
+from documents.files import UploadRoute, upload_limit
+from documents.previews import Preview
 from documents.schemas import (
     CommentCreate,
     CommentCreateRequest,
+    CommentPaginationResponse,
     DocumentCreate,
+    DocumentExpand,
+    DocumentHistoryPaginationResponse,
+    DocumentIngestResponse,
+    DocumentPaginationResponse,
+    DocumentSearchResponse,
     DocumentUpdate,
     VersionHistoryCreate,
 )
-from documents.services import DocumentService
+from documents.services import DocumentService, ExportService, PreviewService
+from models import VersionHistory
 from users.permissions import (
     CAN_CREATE_COMMENT,
     CAN_CREATE_DOCUMENT,
     CAN_CREATE_MY_DOCUMENT,
     CAN_CREATE_VERSION,
     CAN_DELETE_DOCUMENT,
+    CAN_DOWNLOAD_DOCUMENT,
     CAN_EDIT_DOCUMENT,
     CAN_MANAGE_COMMENT,
     CAN_MANAGE_DOCUMENT_HISTORY,
     CAN_MANAGE_MY_DOCUMENT,
     CAN_MANAGE_VERSION,
+    CAN_PREVIEW_DOCUMENT,
+    CAN_SHOW_DOCUMENT,
+    CAN_SHOW_MY_DOCUMENT,
 )
+from utils import http, projections
+from utils.schemas import CursorPaginationParams
 
 documents_router = APIRouter(prefix="/documents", tags=["documents"])
+# Routes receiving a file, which is limited in size before it is received
+documents_upload_router = APIRouter(
+    prefix="/documents", tags=["documents"], route_class=UploadRoute
+)
 
 
 @documents_router.put("/{document_id}")
@@ -45,7 +81,7 @@ async def update_document(
         )
 
 
-@documents_router.post("")
+@documents_upload_router.post("")
 @inject
 async def create_document(
     name: str = Form(...),
@@ -71,6 +107,49 @@ async def create_document(
         )
 
 
+@documents_upload_router.post("/bulk", response_model=DocumentIngestResponse)
+@upload_limit(settings.BULK_UPLOAD_MAX_SIZE)
+@inject
+async def ingest_documents(
+    metadata: UploadFile = File(...),
+    files: list[UploadFile] = File([]),
+    current_user: TokenUserPayload = Depends(get_user),
+    document_service: DocumentService = Depends(Provide["document_service"]),
+):
+    """
+    Create documents in bulk. `metadata` is NDJSON, one document per line, whose
+    `file` field names one of the `files` sent along. Lines that cannot be
+    ingested are listed in the errors of the response.
+    """
+    if helpers.is_authorized(current_user, CAN_CREATE_DOCUMENT):
+        return await document_service.ingest_uploaded_documents(
+            current_user, metadata, files
+        )
+
+
+@documents_router.get("/export.zip")
+@inject
+async def export_documents(
+    category_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    current_user: TokenUserPayload = Depends(get_user),
+    export_service: ExportService = Depends(Provide["export_service"]),
+):
+    """
+    ZIP archive of the current version of the documents of a category and/or a
+    user, streamed as it is built. Users who can only see their own documents
+    only export those.
+    """
+    if helpers.is_authorized(current_user, CAN_SHOW_DOCUMENT, CAN_SHOW_MY_DOCUMENT):
+        if not _can_show_all_documents(current_user):
+            user_id = current_user.id
+        return StreamingResponse(
+            export_service.export_zip(category_id, user_id),
+            media_type="application/zip",
+            headers={"content-disposition": 'attachment; filename="documents.zip"'},
+        )
+
+
 @documents_router.get("/{document_id}/versions")
 @inject
 async def get_document_versions(
@@ -82,7 +161,24 @@ async def get_document_versions(
         return await document_service.get_document_versions(document_id)
 
 
-@documents_router.post("/{document_id}/versions")
+@documents_router.get("/{document_id}/versions/number/{version_number}")
+@inject
+async def get_document_version_by_number(
+    document_id: int,
+    version_number: int,
+    current_user: TokenUserPayload = Depends(get_user),
+    document_service: DocumentService = Depends(Provide["document_service"]),
+):
+    if helpers.is_authorized(current_user, CAN_MANAGE_VERSION):
+        version = await document_service.get_document_version_by_number(
+            document_id, version_number
+        )
+        if not version:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        return version
+
+
+@documents_upload_router.post("/{document_id}/versions")
 @inject
 async def create_document_version(
     document_id: int,
@@ -92,19 +188,79 @@ async def create_document_version(
 ):
     if helpers.is_authorized(current_user, CAN_CREATE_VERSION):
         version_create = VersionHistoryCreate(
-            document_id=document_id, created_by=current_user.id, document_name="Unknown"
+            document_id=document_id, created_by=current_user.id
         )
         return await document_service.create_document_version(version_create, file)
 
 
-@documents_router.get("/history")
+@documents_router.get("/{document_id}/versions/{version_id}/content")
+@inject
+async def get_document_version_content(
+    document_id: int,
+    version_id: int,
+    request: Request,
+    current_user: TokenUserPayload = Depends(get_user),
+    document_service: DocumentService = Depends(Provide["document_service"]),
+):
+    """
+    Serve the file of a document version. Files available on the local
+    filesystem are handed over to FileResponse, which supports single and
+    multi-range requests (and If-Range) with zero-copy transfers where the
+    server allows it. Other backends are streamed, with single-range support.
+    Compressed files are sent as stored to clients accepting their encoding
+    (for full responses), and decompressed on the fly otherwise.
+    The ETag is the SHA-256 of the content.
+    """
+    if helpers.is_authorized(current_user, CAN_DOWNLOAD_DOCUMENT, CAN_PREVIEW_DOCUMENT):
+        version = await document_service.get_document_version(document_id, version_id)
+        return _version_content_response(request, version, document_service)
+
+
+@documents_router.get("/{document_id}/preview")
+@inject
+async def get_document_preview(
+    document_id: int,
+    current_user: TokenUserPayload = Depends(get_user),
+    preview_service: PreviewService = Depends(Provide["preview_service"]),
+):
+    """
+    Preview of the current version of a document: a PNG thumbnail, or the
+    first lines of text files. Answers 202 while the preview is rendered.
+    """
+    if helpers.is_authorized(current_user, CAN_PREVIEW_DOCUMENT):
+        return _preview_response(await preview_service.get_preview(document_id))
+
+
+def _preview_response(preview: Optional[Preview]):
+    if preview is None:
+        return JSONResponse(
+            {"detail": "Preview is being generated"},
+            status_code=status.HTTP_202_ACCEPTED,
+            headers={"retry-after": "2"},
+        )
+    if not preview.media_type:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No preview available for this document",
+        )
+    return FileResponse(
+        preview.path,
+        media_type=preview.media_type,
+        headers={"cache-control": "private, no-cache"},
+    )
+
+
+@documents_router.get("/history", response_model=DocumentHistoryPaginationResponse)
 @inject
 async def get_document_history(
+    pagination_params: Annotated[CursorPaginationParams, Query()],
     current_user: TokenUserPayload = Depends(get_user),
     document_service: DocumentService = Depends(Provide["document_service"]),
 ):
     if helpers.is_authorized(current_user, CAN_MANAGE_DOCUMENT_HISTORY):
-        return await document_service.get_document_history_by_user(current_user.id)
+        return await document_service.get_document_history_by_user(
+            current_user.id, pagination_params.size, pagination_params.cursor
+        )
 
 
 @documents_router.delete("/{document_id}")
@@ -118,25 +274,73 @@ async def delete_document(
         return await document_service.delete_document(current_user, document_id)
 
 
-@documents_router.get("/my")
+@documents_router.get("/search", response_model=DocumentSearchResponse)
+@inject
+async def search_documents(
+    pagination_params: Annotated[CursorPaginationParams, Query()],
+    q: str = Query(min_length=1, max_length=256),
+    tag: Optional[str] = None,
+    current_user: TokenUserPayload = Depends(get_user),
+    document_service: DocumentService = Depends(Provide["document_service"]),
+):
+    """
+    Search documents by name, tags and description (in that order of weight),
+    best matches first. Users who can only see their own documents only search
+    those.
+    """
+    if helpers.is_authorized(current_user, CAN_SHOW_DOCUMENT, CAN_SHOW_MY_DOCUMENT):
+        return await document_service.search_documents(
+            q,
+            pagination_params.size,
+            pagination_params.cursor,
+            user_id=(
+                None if _can_show_all_documents(current_user) else current_user.id
+            ),
+            tag=tag,
+        )
+
+
+@documents_router.get("/my", response_model=DocumentPaginationResponse)
 @inject
 async def get_my_documents(
+    pagination_params: Annotated[CursorPaginationParams, Query()],
+    tag: Optional[str] = None,
+    expand: Annotated[list[DocumentExpand], Query()] = [],
     current_user: TokenUserPayload = Depends(get_user),
     document_service: DocumentService = Depends(Provide["document_service"]),
 ):
+    """
+    Documents of the current user, most recent first. Relations listed in
+    `expand` (repeated, e.g. `expand=category&expand=user`) are embedded in each
+    document, loaded in the same query.
+    """
     if helpers.is_authorized(current_user, CAN_MANAGE_MY_DOCUMENT):
-        return await document_service.get_documents_by_user(current_user.id)
+        return projections.json_response(
+            DocumentPaginationResponse,
+            await document_service.get_documents_by_user(
+                current_user.id,
+                pagination_params.size,
+                pagination_params.cursor,
+                tag,
+                expand,
+            ),
+        )
 
 
-@documents_router.get("/{document_id}/comments")
+@documents_router.get(
+    "/{document_id}/comments", response_model=CommentPaginationResponse
+)
 @inject
 async def get_document_comments(
     document_id: int,
+    pagination_params: Annotated[CursorPaginationParams, Query()],
     current_user: TokenUserPayload = Depends(get_user),
     document_service: DocumentService = Depends(Provide["document_service"]),
 ):
     if helpers.is_authorized(current_user, CAN_MANAGE_COMMENT):
-        return await document_service.get_document_comments(document_id)
+        return await document_service.get_document_comments(
+            document_id, pagination_params.size, pagination_params.cursor
+        )
 
 
 @documents_router.post("/{document_id}/comments")
@@ -154,3 +358,110 @@ async def create_document_comment(
             user_id=current_user.id,
         )
         return await document_service.create_document_comment(comment_create)
+
+
+def _can_show_all_documents(current_user: TokenUserPayload) -> bool:
+    permissions = current_user.permissions or []
+    return any(
+        (
+            current_user.is_superuser,
+            current_user.is_admin,
+            CAN_SHOW_DOCUMENT in permissions,
+        )
+    )
+
+
+def _version_content_response(
+    request: Request, version: VersionHistory, document_service: DocumentService
+) -> Response:
+    encoding = document_service.get_version_encoding(version)
+    sent_encoding = _sent_encoding(request, encoding)
+    headers = _version_headers(version, encoding, sent_encoding)
+    if http.etag_matches(request.headers.get("if-none-match"), headers["etag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    headers["content-disposition"] = http.content_disposition(version.document_name)
+    if sent_encoding:
+        headers["content-encoding"] = sent_encoding
+        headers["content-length"] = str(version.blob.blocks[-1])
+        return StreamingResponse(
+            document_service.read_version_encoded_content(version),
+            headers=headers,
+            media_type="application/octet-stream",
+        )
+    file_path = document_service.get_version_file_path(version)
+    if file_path:
+        return FileResponse(file_path, headers=headers)
+    return _stream_version_content(request, version, headers, document_service)
+
+
+def _sent_encoding(request: Request, encoding: Optional[str]) -> Optional[str]:
+    """
+    Encoding to send a version in: as stored, to clients accepting its
+    encoding (for full responses). None to decompress it on the fly.
+    """
+    if not encoding or "range" in request.headers:
+        return None
+    accept_encoding = request.headers.get("accept-encoding")
+    return encoding if http.accepts_encoding(accept_encoding, encoding) else None
+
+
+def _version_headers(
+    version: VersionHistory, encoding: Optional[str], sent_encoding: Optional[str]
+) -> dict:
+    # Each representation has its own ETag
+    etag = (
+        f'"{version.checksum}-{sent_encoding}"'
+        if sent_encoding
+        else f'"{version.checksum}"'
+    )
+    headers = {"etag": etag, "cache-control": "private, no-cache"}
+    if encoding:
+        headers["vary"] = "accept-encoding"
+    return headers
+
+
+def _requested_range(request: Request, etag: str) -> Optional[str]:
+    """
+    Range header of a request, unless its If-Range no longer matches.
+    """
+    if_range = request.headers.get("if-range")
+    if if_range and if_range != etag:
+        return None
+    return request.headers.get("range")
+
+
+def _stream_version_content(
+    request: Request,
+    version: VersionHistory,
+    headers: dict,
+    document_service: DocumentService,
+) -> Response:
+    headers["accept-ranges"] = "bytes"
+    size = version.size or 0
+    try:
+        byte_range = http.parse_single_range(
+            _requested_range(request, headers["etag"]), size
+        )
+    except ValueError:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"content-range": f"bytes */{size}"},
+        )
+
+    if byte_range is None:
+        headers["content-length"] = str(size)
+        return StreamingResponse(
+            document_service.read_version_content(version),
+            headers=headers,
+            media_type="application/octet-stream",
+        )
+    start, end = byte_range
+    headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+    headers["content-length"] = str(end - start)
+    return StreamingResponse(
+        document_service.read_version_content(version, start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        headers=headers,
+        media_type="application/octet-stream",
+    )
@@ -0,0 +1,69 @@
+"""
+Streaming of ZIP archives.
+
+Archives are written to an in-memory buffer that is emptied after every write,
+so only the chunk being archived is held in memory and no temporary archive is
+written. Entries are stored as is: most documents are already compressed, and
+compressing would tie up the event loop. ZIP64 records are used as soon as
+sizes or offsets need them.
+"""
+
+import dataclasses
+import datetime
+import io
+import zipfile
+from typing import AsyncIterator, Callable
+
+# Oldest date a ZIP entry can hold
+_MIN_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+@dataclasses.dataclass
+class ArchiveEntry:
+    name: str
+    size: int
+    modified: datetime.datetime
+    read: Callable[[], AsyncIterator[bytes]]
+
+
+class _Buffer(io.RawIOBase):
+    """
+    Write-only, unseekable sink: ZipFile then writes sizes and checksums after
+    the data of entries instead of seeking back to their header.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.data += b
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = bytes(self.data)
+        self.data.clear()
+        return data
+
+
+async def stream_zip(entries: AsyncIterator[ArchiveEntry]) -> AsyncIterator[bytes]:
+    """
+    Stream a ZIP archive of entries, as they come.
+    """
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        async for entry in entries:
+            info = zipfile.ZipInfo(
+                entry.name, max(entry.modified.timetuple()[:6], _MIN_DATE_TIME)
+            )
+            # Known upfront, so that ZIP64 headers are written when needed
+            info.file_size = entry.size
+            with archive.open(info, "w") as f:
+                async for chunk in entry.read():
+                    f.write(chunk)
+                    if buffer.data:
+                        yield buffer.drain()
+            yield buffer.drain()
+    yield buffer.drain()
@@ -0,0 +1,211 @@
+"""
+Buffered writer of document history entries.
+
+Entries are queued in memory once the transaction that made the change is
+committed, and written in the background with multi-row inserts. Entries that
+cannot be written, because the database is unavailable or the application is
+shutting down, are appended to a local spool file. The spool is replayed after
+the next successful write, or on the next start.
+"""
+
+import asyncio
+import contextlib
+import datetime
+import json
+import logging
+import os
+from typing import IO, Callable, Optional
+
+import metrics
+from models import Document
+from utils.utils import io_bound_task
+
+logger = logging.getLogger(__name__)
+
+
+class AuditWriter:
+
+    def __init__(
+        self,
+        uow_factory: Callable,
+        flush_interval: float,
+        flush_size: int,
+        spool_path: str,
+    ):
+        self.uow_factory = uow_factory
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.spool_path = spool_path
+        self.replay_path = f"{spool_path}.replay"
+        self.queue: list[dict] = []
+        self.wakeup = asyncio.Event()
+        self.lock = asyncio.Lock()
+        self.closing = False
+        self.task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.spooled = 0
+        self.failed_writes = 0
+        metrics.register("audit", self.snapshot)
+
+    def enqueue(self, entries: list[dict]):
+        self.queue.extend(entries)
+        if len(self.queue) >= self.flush_size:
+            self.wakeup.set()
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def close(self):
+        """
+        Stop the writer once queued entries are written, or spooled.
+        """
+        self.closing = True
+        self.wakeup.set()
+        if self.task:
+            await self.task
+        await self.flush()
+
+    async def run(self):
+        """
+        Write queued entries every flush_interval seconds, or as soon as
+        flush_size entries are queued.
+        """
+        while not self.closing:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush document history entries")
+
+    async def flush(self):
+        async with self.lock:
+            if await self._write_queue() and await io_bound_task(self._has_spool):
+                await self._replay_spool()
+
+    def snapshot(self) -> dict:
+        return {
+            "queue_depth": len(self.queue),
+            "written": self.written,
+            "spooled": self.spooled,
+            "failed_writes": self.failed_writes,
+        }
+
+    async def _write_queue(self) -> bool:
+        """
+        Write queued entries in batches of flush_size. Once a batch fails, it is
+        spooled along with the rest of the queue.
+
+        :return: whether all entries were written
+        """
+        while self.queue:
+            batch = self.queue[: self.flush_size]
+            del self.queue[: self.flush_size]
+            if not await self._write(batch):
+                batch += self.queue
+                self.queue = []
+                await io_bound_task(self._append_spool, batch)
+                self.spooled += len(batch)
+                return False
+        return True
+
+    async def _write(self, entries: list[dict]) -> bool:
+        try:
+            uow = self.uow_factory()
+            async with uow:
+                existing = await uow.repository.get_existing_ids(
+                    Document,
+                    {
+                        entry["document_id"]
+                        for entry in entries
+                        if entry["document_id"] is not None
+                    },
+                )
+                # Documents deleted since, as ON DELETE SET NULL would have done
+                rows = [
+                    (
+                        entry
+                        if entry["document_id"] in existing
+                        else {**entry, "document_id": None}
+                    )
+                    for entry in entries
+                ]
+                await uow.document_history_repository.create_document_histories(rows)
+                await uow.commit()
+        except Exception:
+            logger.exception(
+                "Failed to write %s document history entries", len(entries)
+            )
+            self.failed_writes += 1
+            return False
+        self.written += len(entries)
+        return True
+
+    def _has_spool(self) -> bool:
+        return os.path.exists(self.replay_path) or os.path.exists(self.spool_path)
+
+    async def _replay_spool(self):
+        """
+        Write spooled entries. The spool is moved aside first, so that entries
+        failing again are spooled anew. A replay interrupted by a crash is
+        resumed from the start: entries are written at least once.
+        """
+        f = await io_bound_task(self._open_replay)
+        try:
+            replayed = await self._replay(f)
+        finally:
+            await io_bound_task(f.close)
+        if replayed is None:
+            # Still unavailable, keep the spool aside for next time
+            return
+        await io_bound_task(os.remove, self.replay_path)
+        logger.info("Replayed %s spooled document history entries", replayed)
+
+    async def _replay(self, f: IO[str]) -> Optional[int]:
+        """
+        :return: number of entries written, None if none could be
+        """
+        replayed = 0
+        while batch := await io_bound_task(self._read_spool, f, self.flush_size):
+            if not await self._write(batch):
+                return await self._respool(f, batch, replayed)
+            replayed += len(batch)
+        return replayed
+
+    async def _respool(
+        self, f: IO[str], batch: list[dict], replayed: int
+    ) -> Optional[int]:
+        """
+        Spool again the entries of a replay left to write.
+        """
+        if not replayed:
+            return None
+        rest = await io_bound_task(self._read_spool, f, None)
+        await io_bound_task(self._append_spool, batch + rest)
+        return replayed
+
+    def _open_replay(self) -> IO[str]:
+        if not os.path.exists(self.replay_path):
+            os.replace(self.spool_path, self.replay_path)
+        return open(self.replay_path, encoding="utf-8")
+
+    def _append_spool(self, entries: list[dict]):
+        os.makedirs(os.path.dirname(self.spool_path) or ".", exist_ok=True)
+        with open(self.spool_path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, default=datetime.datetime.isoformat) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        logger.warning("Spooled %s document history entries", len(entries))
+
+    @staticmethod
+    def _read_spool(f: IO[str], size: Optional[int]) -> list[dict]:
+        entries = []
+        for line in f:
+            entry = json.loads(line)
+            entry["created_at"] = datetime.datetime.fromisoformat(entry["created_at"])
+            entries.append(entry)
+            if len(entries) == size:
+                break
+        return entries
@@ -0,0 +1,239 @@
+import itertools
+import os
+import uuid
+from collections import deque
+from typing import AsyncIterator, Optional, Sequence
+
+import settings
+from documents import compression, deltas, files
+from documents.files import StagedFile
+from models import Blob
+from storage.backends import StorageBackend
+from utils.utils import cpu_bound_task, io_bound_task
+
+
+def _temp_file(staged: StagedFile) -> StagedFile:
+    return StagedFile(
+        path=os.path.join(settings.UPLOAD_TMP_DIR, uuid.uuid4().hex),
+        extension=staged.extension,
+        size=staged.size,
+        checksum=staged.checksum,
+    )
+
+
+def _read_sample(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(compression.SAMPLE_SIZE)
+
+
+async def _write_file(path: str, chunks: AsyncIterator[bytes]):
+    f = await io_bound_task(open, path, "wb")
+    try:
+        async for chunk in chunks:
+            await io_bound_task(f.write, chunk)
+    finally:
+        await io_bound_task(f.close)
+
+
+def _pop_blocks(buffer: bytearray, lengths: deque[int]) -> list[bytes]:
+    """
+    Take the complete blocks at the start of a buffer, whose upcoming blocks
+    have the given lengths.
+    """
+    blocks = []
+    while lengths and len(buffer) >= lengths[0]:
+        length = lengths.popleft()
+        blocks.append(bytes(buffer[:length]))
+        del buffer[:length]
+    return blocks
+
+
+async def _decompress_blocks(
+    encoding: str, chunks: AsyncIterator[bytes], offsets: list[int]
+) -> AsyncIterator[bytes]:
+    """
+    Decompress the blocks read in `chunks`, from offsets[0] to offsets[-1] of a
+    compressed blob, as soon as each of them is complete.
+    """
+    lengths = deque(end - start for start, end in itertools.pairwise(offsets))
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        for block in _pop_blocks(buffer, lengths):
+            yield await cpu_bound_task(compression.decompress_block, encoding, block)
+
+
+class BlobStore:
+    """
+    Content-addressed store for document files. Blobs are keyed by the SHA-256
+    of their content, so identical files are only stored once.
+    """
+
+    def __init__(self, storage: StorageBackend):
+        self.storage = storage
+
+    async def store(self, staged: StagedFile) -> str:
+        """
+        Move a staged file into the store. If a blob with the same content
+        already exists the staged copy is left untouched (and later discarded).
+
+        :param staged: staged upload, whose checksum is used as the blob key
+        :return: blob key
+        """
+        key = staged.checksum
+        await self.storage.put_file(key, staged.path)
+        return key
+
+    async def delete(self, key: str):
+        """
+        Delete a blob from storage, once no version references it (see
+        BlobCollectionService).
+        """
+        await self.storage.delete(key)
+
+    async def encode(self, staged: StagedFile) -> Optional[StagedFile]:
+        """
+        Compress a staged file with the configured codec.
+
+        :return: the compressed file (same key and size, with its encoding), or
+            None when compression is disabled, the file does not compress well
+            or the blob is already stored
+        """
+        codec = compression.resolve_codec(settings.BLOB_COMPRESSION)
+        if not codec or not await self._worth_compressing(staged):
+            return None
+        return await self._compress(codec, staged)
+
+    async def _worth_compressing(self, staged: StagedFile) -> bool:
+        """
+        Whether a sample of a staged file compresses well, unless its blob is
+        already stored.
+        """
+        if not staged.size or await self.storage.exists(staged.checksum):
+            return False
+        sample = await io_bound_task(_read_sample, staged.path)
+        return compression.is_compressible(sample, settings.BLOB_COMPRESSION_MIN_RATIO)
+
+    @staticmethod
+    async def _compress(codec: str, staged: StagedFile) -> Optional[StagedFile]:
+        encoded = _temp_file(staged)
+        try:
+            blocks = await cpu_bound_task(
+                compression.compress_file,
+                codec,
+                staged.path,
+                encoded.path,
+                settings.BLOB_COMPRESSION_BLOCK_SIZE,
+                settings.BLOB_COMPRESSION_LEVEL,
+            )
+        except BaseException:
+            await files.discard(encoded)
+            raise
+        if blocks[-1] >= staged.size * settings.BLOB_COMPRESSION_MIN_RATIO:
+            await files.discard(encoded)
+            return None
+        encoded.blocks = blocks
+        encoded.encoding = codec
+        encoded.block_size = settings.BLOB_COMPRESSION_BLOCK_SIZE
+        return encoded
+
+    async def read(
+        self,
+        blob: Blob,
+        start: int = 0,
+        end: Optional[int] = None,
+        delta_blobs: Sequence[Blob] = (),
+    ) -> AsyncIterator[bytes]:
+        """
+        Stream the content of a blob, decompressed. When `delta_blobs` is
+        given, `blob` is the keyframe the deltas (oldest first) are applied to,
+        and `end` is required.
+        """
+        if not delta_blobs:
+            async for chunk in self._read_blob(blob, start, end):
+                yield chunk
+            return
+
+        assert end is not None
+        blobs = {b.key: b for b in (blob, *delta_blobs)}
+
+        def read_blob(key: str, start_: int, end_: int) -> AsyncIterator[bytes]:
+            return self._read_blob(blobs[key], start_, end_)
+
+        layers = [await deltas.load_layer(read_blob, b.key) for b in delta_blobs]
+        async for chunk in deltas.read(read_blob, blob.key, layers, start, end):
+            yield chunk
+
+    def read_encoded(self, blob: Blob) -> AsyncIterator[bytes]:
+        """
+        Stream a blob as stored, e.g. to send compressed content to a client
+        accepting its encoding.
+        """
+        return self.storage.read(blob.key)
+
+    def _read_blob(
+        self, blob: Blob, start: int, end: Optional[int]
+    ) -> AsyncIterator[bytes]:
+        end = blob.size if end is None else min(end, blob.size)
+        if not blob.encoding:
+            return self.storage.read(blob.key, start, end)
+        return self._read_compressed_blob(blob, blob.encoding, start, end)
+
+    async def _read_compressed_blob(
+        self, blob: Blob, encoding: str, start: int, end: int
+    ) -> AsyncIterator[bytes]:
+        if start >= end:
+            return
+        # Set along with the encoding
+        block_size, blocks = blob.block_size, blob.blocks
+        assert block_size and blocks is not None
+        # Fetch the compressed blocks covering the range in a single read, and
+        # decompress them one by one as they come in.
+        first, stop = start // block_size, (end - 1) // block_size + 2
+        offsets = [0, *blocks][first:stop]
+        chunks = self.storage.read(blob.key, offsets[0], offsets[-1])
+        block_start = first * block_size
+        async for data in _decompress_blocks(encoding, chunks, offsets):
+            lower, upper = max(start - block_start, 0), end - block_start
+            yield data[lower:upper]
+            block_start += block_size
+
+    async def stage_delta(
+        self, base_blobs: Sequence[Blob], base_size: int, staged: StagedFile
+    ) -> Optional[StagedFile]:
+        """
+        Compute the delta between a stored version and a staged file.
+
+        :param base_blobs: blobs of the stored version, keyframe first
+        :return: the staged delta, or None when it would not be smaller than
+            DELTA_MAX_RATIO of the staged file
+        """
+        base = _temp_file(staged)
+        delta = _temp_file(staged)
+        try:
+            await _write_file(
+                base.path, self.read(base_blobs[0], 0, base_size, base_blobs[1:])
+            )
+            delta.size = await cpu_bound_task(
+                deltas.compute_delta, base.path, staged.path, delta.path
+            )
+            if delta.size >= staged.size * settings.DELTA_MAX_RATIO:
+                await files.discard(delta)
+                return None
+            delta.extension = ""
+            delta.checksum = await cpu_bound_task(files.file_checksum, delta.path)
+            return delta
+        except BaseException:
+            await files.discard(delta)
+            raise
+        finally:
+            await files.discard(base)
+
+    def local_path(self, blob: Blob) -> Optional[str]:
+        """
+        Path of a blob on the local filesystem, when it is stored there
+        uncompressed.
+        """
+        if blob.encoding:
+            return None
+        return self.storage.local_path(blob.key)
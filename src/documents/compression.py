@@ -0,0 +1,98 @@
+"""
+Block compression of stored blobs.
+
+A file is cut in blocks of a fixed size, each compressed on its own as a
+complete gzip member or zstd frame. Concatenated members (frames) are a valid
+gzip (zstd) stream, so a stored blob can be sent as is to clients accepting
+the encoding, while the offsets of the blocks let a byte range of the original
+content be rebuilt from the blocks it covers only.
+"""
+
+import gzip
+import zlib
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore[assignment]
+
+GZIP = "gzip"
+ZSTD = "zstd"
+
+SAMPLE_SIZE = 64 * 1024
+
+# Signatures of formats that are already compressed: archives (zip is also
+# docx, xlsx, odt, ...), compressed streams and common media.
+_COMPRESSED_SIGNATURES = (
+    b"PK\x03\x04",
+    b"\x1f\x8b",
+    b"\x28\xb5\x2f\xfd",
+    b"BZh",
+    b"\xfd7zXZ\x00",
+    b"7z\xbc\xaf\x27\x1c",
+    b"Rar!\x1a\x07",
+    b"\x89PNG",
+    b"\xff\xd8\xff",
+    b"GIF8",
+    b"RIFF",
+    b"OggS",
+    b"fLaC",
+    b"ID3",
+)
+
+
+def resolve_codec(codec: Optional[str]) -> Optional[str]:
+    """
+    Codec to use for a configured codec, falling back to gzip when zstd is not
+    installed.
+    """
+    if codec == ZSTD and zstandard is None:
+        return GZIP
+    if codec not in (None, GZIP, ZSTD):
+        raise ValueError(f"Unknown compression codec: {codec}")
+    return codec
+
+
+def is_compressible(sample: bytes, min_ratio: float) -> bool:
+    """
+    Guess whether a file is worth compressing from its first bytes.
+    """
+    if not sample or sample.startswith(_COMPRESSED_SIGNATURES):
+        return False
+    # ISO media (mp4, mov, heic, ...) carry their signature after the box size
+    if sample[4:8] == b"ftyp":
+        return False
+    return len(zlib.compress(sample, 1)) < len(sample) * min_ratio
+
+
+def compress_block(codec: str, data: bytes, level: Optional[int] = None) -> bytes:
+    if codec == ZSTD:
+        return zstandard.ZstdCompressor(level=level or 3).compress(data)
+    return gzip.compress(data, compresslevel=level or 6, mtime=0)
+
+
+def decompress_block(codec: str, data: bytes) -> bytes:
+    if codec == ZSTD:
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def compress_file(
+    codec: str,
+    source_path: str,
+    target_path: str,
+    block_size: int,
+    level: Optional[int] = None,
+) -> list[int]:
+    """
+    Compress a file block by block. Blocking, run it off the event loop.
+
+    :return: end offset of each compressed block in the target file
+    """
+    blocks = []
+    with open(source_path, "rb") as source, open(target_path, "wb") as target:
+        while data := source.read(block_size):
+            target.write(compress_block(codec, data, level))
+            blocks.append(target.tell())
+    return blocks
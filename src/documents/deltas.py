@@ -0,0 +1,251 @@
+"""
+Binary deltas between successive document versions.
+
+Files are split in content-defined chunks: a chunk ends after a newline byte
+whose preceding bytes hash to a given pattern, so boundaries only depend on
+the surrounding content and re-synchronise right after an insertion or a
+deletion. Text files are cut every few KB, binary files (where 0x0A is just
+another byte) every ~8 KB, and chunks never exceed MAX_CHUNK_SIZE.
+
+A delta lists, for each span of the new version, either a range of the base
+version to copy or literal bytes. It is laid out as a header, the op table and
+the literal data, so a range of a version can be rebuilt by reading only the
+op table and the spans it needs.
+"""
+
+import bisect
+import dataclasses
+import hashlib
+import re
+import shutil
+import struct
+import tempfile
+import zlib
+from typing import AsyncIterator, BinaryIO, Callable, Iterator, Sequence
+
+MIN_CHUNK_SIZE = 256
+MAX_CHUNK_SIZE = 64 * 1024
+_ANCHOR = re.compile(b"\n")
+_WINDOW = 32
+_MASK = 0x1F
+_READ_SIZE = 1024 * 1024
+
+MAGIC = b"DRMDELTA1"
+_HEADER = struct.Struct(">9sQ")
+_OP = struct.Struct(">BQQ")
+COPY = 0
+DATA = 1
+
+# Reads the bytes [start, end) of a blob: (key, start, end) -> chunks
+BlobReader = Callable[[str, int, int], AsyncIterator[bytes]]
+
+
+@dataclasses.dataclass
+class DeltaLayer:
+    key: str
+    data_start: int
+    # (target offset, kind, offset, length) sorted by target offset
+    ops: list[tuple[int, int, int, int]]
+    targets: list[int]
+
+
+def _cuts(buffer: bytes, start: int, end: int) -> list[int]:
+    """
+    Boundaries of the chunks from `start` to the newline ending at `end`: every
+    MAX_CHUNK_SIZE, then at the newline when the bytes before it match.
+    """
+    cuts = list(range(start + MAX_CHUNK_SIZE, end, MAX_CHUNK_SIZE))
+    last = cuts[-1] if cuts else start
+    window_start = end - _WINDOW
+    if end - last >= MIN_CHUNK_SIZE and not (
+        zlib.crc32(buffer[window_start:end]) & _MASK
+    ):
+        cuts.append(end)
+    return cuts
+
+
+def _boundaries(buffer: bytes, start: int) -> Iterator[int]:
+    for match in _ANCHOR.finditer(buffer, start + MIN_CHUNK_SIZE):
+        cuts = _cuts(buffer, start, match.end())
+        yield from cuts
+        start = cuts[-1] if cuts else start
+
+
+def _split(buffer: bytes) -> list[bytes]:
+    """
+    Split a buffer in chunks. The last one is the rest after the last boundary,
+    possibly empty, to be continued by the next buffer.
+    """
+    chunks = []
+    start = 0
+    for end in _boundaries(buffer, 0):
+        chunks.append(buffer[start:end])
+        start = end
+    rest = buffer[start:]
+    while len(rest) > MAX_CHUNK_SIZE:
+        chunks.append(rest[:MAX_CHUNK_SIZE])
+        rest = rest[MAX_CHUNK_SIZE:]
+    chunks.append(rest)
+    return chunks
+
+
+def iter_chunks(f: BinaryIO) -> Iterator[bytes]:
+    """
+    Split a file in content-defined chunks.
+    """
+    pending = b""
+    while data := f.read(_READ_SIZE):
+        *chunks, pending = _split(pending + data)
+        yield from chunks
+    if pending:
+        yield pending
+
+
+def _digest(chunk: bytes) -> bytes:
+    return hashlib.blake2b(chunk, digest_size=16).digest()
+
+
+def _index_chunks(path: str) -> dict[bytes, int]:
+    """
+    Offsets of the chunks of a file, by digest.
+    """
+    index: dict[bytes, int] = {}
+    offset = 0
+    with open(path, "rb") as f:
+        for chunk in iter_chunks(f):
+            index.setdefault(_digest(chunk), offset)
+            offset += len(chunk)
+    return index
+
+
+def _add_op(ops: list[list[int]], kind: int, position: int, length: int):
+    """
+    Append an op, merged into the previous one when they are contiguous.
+    """
+    if ops and ops[-1][0] == kind and ops[-1][1] + ops[-1][2] == position:
+        ops[-1][2] += length
+        return
+    ops.append([kind, position, length])
+
+
+def _diff(index: dict[bytes, int], target: BinaryIO, data: BinaryIO) -> list[list[int]]:
+    """
+    Ops rebuilding `target` from the indexed base, writing the chunks missing
+    from the base to `data`.
+    """
+    ops: list[list[int]] = []
+    data_size = 0
+    for chunk in iter_chunks(target):
+        position = index.get(_digest(chunk))
+        if position is not None:
+            _add_op(ops, COPY, position, len(chunk))
+            continue
+        _add_op(ops, DATA, data_size, len(chunk))
+        data.write(chunk)
+        data_size += len(chunk)
+    return ops
+
+
+def compute_delta(base_path: str, target_path: str, delta_path: str) -> int:
+    """
+    Write the delta turning the file at `base_path` into the file at
+    `target_path`. Blocking, run it off the event loop.
+
+    :return: size of the delta
+    """
+    index = _index_chunks(base_path)
+    with tempfile.TemporaryFile() as data, open(target_path, "rb") as target:
+        ops = _diff(index, target, data)
+        data.seek(0)
+        with open(delta_path, "wb") as delta:
+            delta.write(_HEADER.pack(MAGIC, len(ops)))
+            for op in ops:
+                delta.write(_OP.pack(*op))
+            shutil.copyfileobj(data, delta)
+            return delta.tell()
+
+
+async def _read_all(read_blob: BlobReader, key: str, start: int, end: int) -> bytes:
+    return b"".join([chunk async for chunk in read_blob(key, start, end)])
+
+
+async def load_layer(read_blob: BlobReader, key: str) -> DeltaLayer:
+    magic, count = _HEADER.unpack(await _read_all(read_blob, key, 0, _HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"Blob {key} is not a delta")
+    table = await _read_all(
+        read_blob, key, _HEADER.size, _HEADER.size + count * _OP.size
+    )
+    ops = []
+    target = 0
+    for kind, offset, length in _OP.iter_unpack(table):
+        ops.append((target, kind, offset, length))
+        target += length
+    return DeltaLayer(
+        key=key,
+        data_start=_HEADER.size + count * _OP.size,
+        ops=ops,
+        targets=[op[0] for op in ops],
+    )
+
+
+def read(
+    read_blob: BlobReader,
+    keyframe: str,
+    layers: Sequence[DeltaLayer],
+    start: int,
+    end: int,
+) -> AsyncIterator[bytes]:
+    """
+    Stream the bytes [start, end) of a version stored as `keyframe` followed by
+    the deltas `layers` (oldest first). Only the spans needed are read, so
+    memory stays bounded by the read size of the backend.
+    """
+    if not layers:
+        return read_blob(keyframe, start, end)
+    return _read_layers(read_blob, keyframe, layers, start, end)
+
+
+def _spans(layer: DeltaLayer, start: int, end: int) -> Iterator[tuple[int, int, int]]:
+    """
+    Spans of a delta covering the bytes [start, end) of its version, as (kind,
+    offset in the base version or in the literal data, length).
+    """
+    i = bisect.bisect_right(layer.targets, start) - 1
+    position = start
+    for target, kind, offset, length in layer.ops[i:]:
+        if position >= end:
+            break
+        skip = position - target
+        size = min(length - skip, end - position)
+        yield kind, offset + skip, size
+        position += size
+
+
+async def _read_layers(
+    read_blob: BlobReader,
+    keyframe: str,
+    layers: Sequence[DeltaLayer],
+    start: int,
+    end: int,
+) -> AsyncIterator[bytes]:
+    for kind, offset, length in _spans(layers[-1], start, end):
+        async for chunk in _read_span(
+            read_blob, keyframe, layers, kind, offset, length
+        ):
+            yield chunk
+
+
+def _read_span(
+    read_blob: BlobReader,
+    keyframe: str,
+    layers: Sequence[DeltaLayer],
+    kind: int,
+    offset: int,
+    length: int,
+) -> AsyncIterator[bytes]:
+    layer = layers[-1]
+    if kind == DATA:
+        begin = layer.data_start + offset
+        return read_blob(layer.key, begin, begin + length)
+    return read(read_blob, keyframe, layers[:-1], offset, offset + length)
@@ -0,0 +1,143 @@
+"""
+Plain text extraction from document files, to index their content.
+
+Extractors run in worker processes: they only take paths and plain values and
+must not touch the event loop or the database. Office files (OOXML and
+OpenDocument) are read with the standard library, PDFs need the optional
+`extraction` extra. Other files are indexed when they look like text.
+"""
+
+import re
+import time
+import zipfile
+from typing import Iterator, Optional
+from xml.etree import ElementTree
+
+_SAMPLE_SIZE = 8 * 1024
+
+# Members holding the text of office files, by format
+_OFFICE_MEMBERS = (
+    re.compile(r"word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml"),
+    re.compile(r"ppt/(slides|notesSlides)/(slide|notesSlide)\d+\.xml"),
+    re.compile(r"xl/sharedStrings\.xml"),
+    re.compile(r"content\.xml"),
+)
+# Local names of the elements holding text (OOXML) and closing a paragraph
+_TEXT_TAGS = {"t"}
+_PARAGRAPH_TAGS = {"p", "si", "h"}
+_ODF_TEXT_NS = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+
+
+def _local_name(tag: str) -> str:
+    return tag.rpartition("}")[2]
+
+
+def _member_key(name: str) -> list:
+    # Natural order, so slide10 comes after slide9
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+def _odf_text(element: ElementTree.Element) -> Optional[str]:
+    # Paragraphs and headings hold their text in nested spans, links, ...
+    if _local_name(element.tag) not in _PARAGRAPH_TAGS:
+        return None
+    text = "".join(element.itertext()) + "\n"
+    element.clear()
+    return text
+
+
+def _ooxml_text(element: ElementTree.Element) -> Optional[str]:
+    name = _local_name(element.tag)
+    if name in _TEXT_TAGS:
+        return element.text
+    if name in _PARAGRAPH_TAGS:
+        element.clear()
+        return "\n"
+    return None
+
+
+def _element_text(element: ElementTree.Element) -> Optional[str]:
+    if element.tag.startswith(_ODF_TEXT_NS):
+        return _odf_text(element)
+    return _ooxml_text(element)
+
+
+def _iter_xml_text(f) -> Iterator[str]:
+    for _, element in ElementTree.iterparse(f):
+        text = _element_text(element)
+        if text:
+            yield text
+
+
+def _iter_office_text(path: str) -> Iterator[str]:
+    with zipfile.ZipFile(path) as archive:
+        names = sorted(
+            (
+                name
+                for name in archive.namelist()
+                if any(pattern.fullmatch(name) for pattern in _OFFICE_MEMBERS)
+            ),
+            key=_member_key,
+        )
+        for name in names:
+            with archive.open(name) as f:
+                yield from _iter_xml_text(f)
+
+
+def _iter_pdf_text(path: str) -> Iterator[str]:
+    from pypdf import PdfReader
+
+    for page in PdfReader(path).pages:
+        yield page.extract_text() + "\n"
+
+
+def _iter_plain_text(path: str, max_chars: int) -> Iterator[str]:
+    with open(path, "rb") as f:
+        sample = f.read(_SAMPLE_SIZE)
+        if b"\x00" in sample:
+            return
+        # UTF-8 takes at most 4 bytes per character
+        data = sample + f.read(max_chars * 4 - len(sample))
+    yield data.decode("utf-8", errors="replace")
+
+
+def _iter_text(path: str, max_chars: int) -> Iterator[str]:
+    with open(path, "rb") as f:
+        signature = f.read(5)
+    if signature.startswith(b"%PDF"):
+        return _iter_pdf_text(path)
+    if signature.startswith(b"PK\x03\x04"):
+        return _iter_office_text(path)
+    return _iter_plain_text(path, max_chars)
+
+
+def _collect_text(texts: Iterator[str], max_chars: int, parts: list[str]):
+    """
+    Append texts to `parts` until they add up to `max_chars` characters. Parts
+    collected before an error are kept.
+    """
+    length = 0
+    for text in texts:
+        parts.append(text)
+        length += len(text)
+        if length >= max_chars:
+            break
+
+
+def extract_text(path: str, max_chars: int) -> tuple[str, float]:
+    """
+    Extract the text of a file, up to `max_chars` characters. Blocking and CPU
+    heavy, run it in a worker process.
+
+    :return: extracted text (empty when the format is not supported) and the
+        CPU time spent on it, in seconds
+    """
+    started = time.process_time()
+    parts: list[str] = []
+    try:
+        _collect_text(_iter_text(path, max_chars), max_chars, parts)
+    except Exception:  # unsupported format, corrupted file or missing extra
+        pass
+    # PostgreSQL text cannot hold NUL characters
+    text = "".join(parts)[:max_chars].replace("\x00", "")
+    return text, time.process_time() - started
@@ -0,0 +1,222 @@
+import dataclasses
+import hashlib
+import os
+import pathlib
+import uuid
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.routing import APIRoute
+from starlette import status
+from starlette.requests import Request
+from starlette.types import Receive
+
+import settings
+from utils.utils import io_bound_task
+
+
+@dataclasses.dataclass
+class StagedFile:
+    path: str
+    extension: str
+    size: int
+    checksum: str
+    # Set when the file is compressed, see documents.compression
+    encoding: Optional[str] = None
+    block_size: Optional[int] = None
+    blocks: Optional[list[int]] = None
+
+
+# Room for the other fields of an upload form and the multipart framing
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+
+def _file_too_large(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File exceeds the maximum upload size of {max_size} bytes",
+    )
+
+
+def _limit_body(receive: Receive, limit: int, max_size: int) -> Receive:
+    received = 0
+
+    async def limited_receive():
+        nonlocal received
+        message = await receive()
+        received += len(message.get("body", b""))
+        if received > limit:
+            raise _file_too_large(max_size)
+        return message
+
+    return limited_receive
+
+
+def _content_length(request: Request) -> int:
+    try:
+        return int(request.headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Content-Length"
+        )
+
+
+def upload_limit(max_size: int) -> Callable:
+    """
+    Set the maximum upload size of an UploadRoute endpoint, UPLOAD_MAX_SIZE by
+    default. Applied under the route decorator.
+    """
+
+    def decorator(endpoint: Callable) -> Callable:
+        endpoint.upload_max_size = max_size  # type: ignore[attr-defined]
+        return endpoint
+
+    return decorator
+
+
+class UploadRoute(APIRoute):
+    """
+    Route receiving a file in a form. The form is parsed (and the file spooled)
+    before the endpoint runs, so forms larger than the maximum upload size
+    (see upload_limit) are rejected here: by their Content-Length before any of
+    the body is received, or as soon as a body streamed without one goes over.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        max_size = getattr(self.endpoint, "upload_max_size", settings.UPLOAD_MAX_SIZE)
+        limit = max_size + UPLOAD_FORM_OVERHEAD
+
+        async def upload_handler(request: Request):
+            if _content_length(request) > limit:
+                raise _file_too_large(max_size)
+            return await handler(
+                Request(request.scope, _limit_body(request.receive, limit, max_size))
+            )
+
+        return upload_handler
+
+
+def _write_chunk(f: BinaryIO, digest, chunk: bytes):
+    digest.update(chunk)
+    f.write(chunk)
+
+
+def _make_tmp_dir():
+    os.makedirs(settings.UPLOAD_TMP_DIR, exist_ok=True)
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(settings.UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def _copy_upload(file: UploadFile, f: BinaryIO, digest) -> int:
+    size = 0
+    while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > settings.UPLOAD_MAX_SIZE:
+            raise _file_too_large(settings.UPLOAD_MAX_SIZE)
+        await io_bound_task(_write_chunk, f, digest, chunk)
+    return size
+
+
+async def stage_upload(file: UploadFile) -> StagedFile:
+    """
+    Stream an uploaded file into a temporary file, chunk by chunk, hashing it in
+    the same pass. Writes are done off the event loop. Oversized forms are
+    rejected by UploadRoute before they are received, the size of the file
+    itself is checked here.
+
+    :param file: uploaded file
+    :return: staged file, to be promoted once the transaction is committed
+    """
+    await io_bound_task(_make_tmp_dir)
+    path = os.path.join(settings.UPLOAD_TMP_DIR, uuid.uuid4().hex)
+
+    digest = hashlib.sha256()
+    f = await io_bound_task(open, path, "wb")
+    try:
+        size = await _copy_upload(file, f, digest)
+    except BaseException:
+        await io_bound_task(f.close)
+        await io_bound_task(os.remove, path)
+        raise
+    await io_bound_task(f.close)
+
+    return StagedFile(
+        path=path,
+        extension=pathlib.Path(file.filename or "").suffix,
+        size=size,
+        checksum=digest.hexdigest(),
+    )
+
+
+async def iter_lines(read: Callable[[int], Awaitable[bytes]]) -> AsyncIterator[bytes]:
+    """
+    Lines of a file read chunk by chunk with `read` (e.g. UploadFile.read),
+    without holding the whole file in memory. Line ends are not included.
+    """
+    pending = b""
+    while chunk := await read(settings.UPLOAD_CHUNK_SIZE):
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            yield line
+    yield pending
+
+
+def _concat(paths: list[str], path: str) -> tuple[int, str]:
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "wb") as out:
+        for part in paths:
+            with open(part, "rb") as f:
+                while chunk := f.read(settings.UPLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    _write_chunk(out, digest, chunk)
+    return size, digest.hexdigest()
+
+
+async def stage_parts(paths: list[str], filename: str) -> StagedFile:
+    """
+    Concatenate the parts of a chunked upload into a staged file, hashing the
+    content in the same pass.
+
+    :param paths: part files, in order
+    :param filename: original file name
+    :return: staged file, to be promoted once the transaction is committed
+    """
+    await io_bound_task(_make_tmp_dir)
+    path = os.path.join(settings.UPLOAD_TMP_DIR, uuid.uuid4().hex)
+    try:
+        size, checksum = await io_bound_task(_concat, paths, path)
+    except BaseException:
+        if await io_bound_task(os.path.exists, path):
+            await io_bound_task(os.remove, path)
+        raise
+    return StagedFile(
+        path=path,
+        extension=pathlib.Path(filename).suffix,
+        size=size,
+        checksum=checksum,
+    )
+
+
+async def discard(staged: StagedFile):
+    """
+    Remove a staged file that was not promoted (e.g. the transaction failed).
+    """
+    if await io_bound_task(os.path.exists, staged.path):
+        await io_bound_task(os.remove, staged.path)
+
+
+async def discard_all(*staged_files: Optional[StagedFile]):
+    """
+    Discard the staged files given, skipping None.
+    """
+    for staged in staged_files:
+        if staged:
+            await discard(staged)
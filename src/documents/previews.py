@@ -0,0 +1,182 @@
+"""
+Preview rendering and caching.
+
+Renderers run in worker processes: they only take paths and plain values and
+must not touch the event loop or the database. Images are thumbnailed and PDFs
+rendered from their first page (both need the optional `previews` extra), text
+files are previewed by their first lines.
+"""
+
+import dataclasses
+import os
+import threading
+from typing import Optional
+
+PNG = ".png"
+TEXT = ".txt"
+# Marks content no preview can be made of
+UNAVAILABLE = ".none"
+
+MEDIA_TYPES = {PNG: "image/png", TEXT: "text/plain; charset=utf-8"}
+
+_SAMPLE_SIZE = 64 * 1024
+_MAX_LINE_LENGTH = 200
+
+
+@dataclasses.dataclass
+class Preview:
+    path: str
+    media_type: Optional[str]
+
+
+def _render_image(source_path: str, target_path: str, size: int) -> str:
+    from PIL import Image
+
+    with Image.open(source_path) as image:
+        image.thumbnail((size, size))
+        image.save(target_path, "PNG")
+    return PNG
+
+
+def _render_pdf(source_path: str, target_path: str, size: int) -> str:
+    import pypdfium2
+
+    pdf = pypdfium2.PdfDocument(source_path)
+    try:
+        page = pdf[0]
+        scale = size / max(page.get_size())
+        image = page.render(scale=scale).to_pil()
+        image.save(target_path, "PNG")
+    finally:
+        pdf.close()
+    return PNG
+
+
+def _decode_sample(sample: bytes) -> Optional[str]:
+    try:
+        return sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # The sample may end in the middle of a multi-byte character
+        if e.start < len(sample) - 3:
+            return None
+        return sample[: e.start].decode("utf-8")
+
+
+def _render_text(sample: bytes, target_path: str, lines: int) -> Optional[str]:
+    text = None if b"\x00" in sample else _decode_sample(sample)
+    if text is None:
+        return None
+    preview = "\n".join(line[:_MAX_LINE_LENGTH] for line in text.splitlines()[:lines])
+    with open(target_path, "w", encoding="utf-8") as f:
+        f.write(preview)
+    return TEXT
+
+
+def render_preview(
+    source_path: str, target_path: str, size: int, lines: int
+) -> Optional[str]:
+    """
+    Render the preview of a file. Blocking and CPU heavy, run it in a worker
+    process.
+
+    :param size: maximum width and height of image previews, in pixels
+    :param lines: number of lines of text previews
+    :return: kind of the preview written to `target_path` (PNG or TEXT), or
+        None when no preview can be made
+    """
+    with open(source_path, "rb") as f:
+        sample = f.read(_SAMPLE_SIZE)
+    try:
+        if sample.startswith(b"%PDF"):
+            return _render_pdf(source_path, target_path, size)
+        text = _render_text(sample, target_path, lines)
+        if text:
+            return text
+        return _render_image(source_path, target_path, size)
+    except Exception:  # unsupported format, corrupted file or missing extra
+        return None
+
+
+class PreviewCache:
+    """
+    On-disk cache of previews, keyed by the checksum of the content they were
+    rendered from. The least recently used previews are evicted once the cache
+    exceeds `max_size` bytes (access times are tracked with the file mtime).
+    Methods are blocking, run them off the event loop.
+    """
+
+    def __init__(self, root: str, max_size: int):
+        self.root = root
+        self.max_size = max_size
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str, kind: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}{kind}")
+
+    def get(self, key: str) -> Optional[Preview]:
+        for kind in (PNG, TEXT, UNAVAILABLE):
+            path = self._path(key, kind)
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                continue
+            return Preview(path=path, media_type=MEDIA_TYPES.get(kind))
+        return None
+
+    def put(self, key: str, path: Optional[str], kind: Optional[str]):
+        """
+        Move a rendered preview into the cache. Without a kind, the content is
+        recorded as having no preview.
+        """
+        target = self._path(key, kind or UNAVAILABLE)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        self._place(path if kind else None, target)
+        with self._lock:
+            self._grow(os.path.getsize(target))
+
+    @staticmethod
+    def _place(path: Optional[str], target: str):
+        if path is None:
+            open(target, "wb").close()
+        else:
+            os.replace(path, target)
+
+    def _grow(self, size: int):
+        # The size is scanned on the first put, and then kept up to date
+        self._size = self._scan_size() if self._size is None else self._size + size
+        if self._size > self.max_size:
+            self._evict()
+
+    def _entries(self) -> list[os.DirEntry[str]]:
+        if not os.path.isdir(self.root):
+            return []
+        shards = (shard.path for shard in os.scandir(self.root) if shard.is_dir())
+        return [
+            entry for path in shards for entry in os.scandir(path) if entry.is_file()
+        ]
+
+    def _scan_size(self) -> int:
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def _evict(self):
+        # Rescan, other processes may share the cache directory
+        entries = sorted(
+            (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+            for entry in self._entries()
+        )
+        size = sum(entry[1] for entry in entries)
+        # Evict down to 90% of the maximum size, to not evict on every put
+        for _, entry_size, path in entries:
+            if size <= self.max_size * 0.9:
+                break
+            self._remove(path)
+            size -= entry_size
+        self._size = size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
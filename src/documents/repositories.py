@@ -1,9 +1,65 @@
-from typing import Optional
+import operator
+from collections import Counter
+from datetime import date, datetime
+from typing import AsyncIterator, Collection, Optional, Sequence
 
-from sqlalchemy import delete, desc, insert, select, update
+from sqlalchemy import (
+    ColumnElement,
+    Integer,
+    Row,
+    Select,
+    String,
+    cast,
+    column,
+    delete,
+    desc,
+    exists,
+    func,
+    insert,
+    literal,
+    select,
+    text,
+    true,
+    tuple_,
+    union,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import REGCONFIG, TSVECTOR
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, noload
 
-from models import Document, DocumentComment, DocumentHistory, VersionHistory
+import settings
+from documents.schemas import DocumentHistoryExportParams, DocumentResponse
+from errors import ASYNCPG_EXCEPTIONS_UNIQUE_VIOLATION, ErrorType
+from models import (
+    DOCUMENT_SEARCH_CONFIG,
+    BaseEntity,
+    Blob,
+    Document,
+    DocumentComment,
+    DocumentContent,
+    DocumentHistory,
+    Tag,
+    VersionHistory,
+    document_tag,
+)
+from utils import pagination, projections
+
+# Relations of documents that listings can embed, see DocumentExpand. All are
+# many-to-one, so joining them does not multiply rows.
+DOCUMENT_EXPANSIONS = {
+    "category": Document.category,
+    "sub_category": Document.sub_category,
+    "user": Document.user,
+    "current_version": Document.current_version,
+}
+
+
+def _expansion_option(relation, expanded: bool):
+    return joinedload(relation) if expanded else noload(relation)
 
 
 class DocumentRepository:
@@ -16,22 +72,178 @@ class DocumentRepository:
         )
         return result.first()
 
-    async def create_document(self, data: dict) -> Optional[Document]:
+    async def create_document(self, data: dict) -> Document:
         stmt = insert(Document).values(**data).returning(Document)
         result = await self.session.execute(stmt)
-        return result.scalar_one_or_none()
+        return result.scalar_one()
 
-    async def delete_document(self, document_id: int):
-        await self.session.execute(delete(Document).where(Document.id == document_id))
+    async def create_documents(self, rows: list[dict]) -> list[int]:
+        """
+        Insert documents with multi-row INSERT statements.
 
-    async def get_documents_by_user(self, user_id: int) -> list[Document]:
+        :return: ids of the documents, in the order of `rows`
+        """
         result = await self.session.scalars(
-            select(Document)
-            .where(Document.user_id == user_id)
-            .order_by(desc(Document.created_at))
+            insert(Document).returning(Document.id, sort_by_parameter_order=True), rows
         )
         return list(result.all())
 
+    async def set_current_versions(self, versions: dict[int, int]):
+        """
+        Point documents to their current version, by document id.
+        """
+        await self.session.execute(
+            update(Document),
+            [
+                {"id": document_id, "current_version_id": version_id}
+                for document_id, version_id in versions.items()
+            ],
+        )
+
+    async def get_existing_ids(
+        self, entity: type[BaseEntity], ids: set[int]
+    ) -> set[int]:
+        if not ids:
+            return set()
+        result = await self.session.scalars(select(entity.id).where(entity.id.in_(ids)))
+        return set(result.all())
+
+    async def stream_current_versions(
+        self, category_id: Optional[int] = None, user_id: Optional[int] = None
+    ) -> AsyncIterator[Row]:
+        """
+        Documents (id) with their current version and its blob, through a
+        server-side cursor.
+        """
+        stmt = (
+            select(Document.id, VersionHistory, Blob)
+            .join(VersionHistory, Document.current_version_id == VersionHistory.id)
+            .join(Blob, Blob.key == VersionHistory.blob_key)
+            .order_by(Document.id)
+            .execution_options(yield_per=settings.EXPORT_FETCH_SIZE)
+        )
+        if category_id is not None:
+            stmt = stmt.where(Document.category_id == category_id)
+        if user_id is not None:
+            stmt = stmt.where(Document.user_id == user_id)
+        result = await self.session.stream(stmt)
+        async for row in result:
+            yield row
+
+    async def delete_document(self, document_id: int) -> list[str]:
+        """
+        Delete a document. Its versions are kept, detached from it, but no
+        longer hold references to their blobs.
+
+        :return: blob keys of the versions, once per version, for their
+            references to be released
+        """
+        # Locked first, so that no version is added to the document meanwhile
+        await self.session.execute(
+            select(Document.id).where(Document.id == document_id).with_for_update()
+        )
+        blob_keys = await self.session.scalars(
+            select(VersionHistory.blob_key).where(
+                VersionHistory.document_id == document_id
+            )
+        )
+        keys = [key for key in blob_keys if key is not None]
+        await self.session.execute(delete(Document).where(Document.id == document_id))
+        return keys
+
+    async def get_documents_by_user(
+        self,
+        user_id: int,
+        size: int,
+        after: Optional[tuple[datetime, int]] = None,
+        tag: Optional[str] = None,
+        expand: Collection[str] = (),
+    ) -> list[Document | Row]:
+        """
+        Documents of a user, most recent first, following the (created_at, id)
+        key `after`. The `expand` relations are joined in the same query, the
+        others are left unset. Without relations to expand, only the columns of
+        DocumentResponse are read, as rows.
+        """
+        stmt = self._select_documents(expand).where(Document.user_id == user_id)
+        if tag is not None:
+            stmt = stmt.where(Document.id.in_(self._tagged_document_ids(tag)))
+        result = await self.session.execute(
+            pagination.keyset(stmt, (Document.created_at, Document.id), after, size)
+        )
+        return list(result.scalars() if expand else result)
+
+    @staticmethod
+    def _select_documents(expand: Collection[str]) -> Select:
+        if not expand:
+            return select(*projections.columns(DocumentResponse, Document))
+        return select(Document).options(
+            *(
+                _expansion_option(relation, name in expand)
+                for name, relation in DOCUMENT_EXPANSIONS.items()
+            )
+        )
+
+    async def set_document_tags(self, document_id: int, titles: list[str]):
+        """
+        Replace the tags of a document, creating missing tags.
+        """
+        tag_ids = select(Tag.id).where(Tag.title.in_(titles))
+        if titles:
+            await self.session.execute(
+                pg_insert(Tag)
+                .values([{"title": title} for title in titles])
+                .on_conflict_do_nothing(index_elements=[Tag.title])
+            )
+            await self.session.execute(
+                pg_insert(document_tag)
+                .from_select(
+                    ["document_id", "tag_id"],
+                    select(literal(document_id), Tag.id).where(Tag.title.in_(titles)),
+                )
+                .on_conflict_do_nothing()
+            )
+        await self.session.execute(
+            delete(document_tag).where(
+                document_tag.c.document_id == document_id,
+                document_tag.c.tag_id.not_in(tag_ids),
+            )
+        )
+
+    async def add_documents_tags(self, tags: dict[int, list[str]]):
+        """
+        Tag new documents, by document id, creating missing tags.
+        """
+        # Sorted so that concurrent ingestions lock new tags in the same order
+        titles = sorted({title for titles in tags.values() for title in titles})
+        if not titles:
+            return
+        await self.session.execute(
+            pg_insert(Tag)
+            .values([{"title": title} for title in titles])
+            .on_conflict_do_nothing(index_elements=[Tag.title])
+        )
+        result = await self.session.execute(
+            select(Tag.title, Tag.id).where(Tag.title.in_(titles))
+        )
+        tag_ids = dict(result.tuples().all())
+        await self.session.execute(
+            insert(document_tag),
+            [
+                {"document_id": document_id, "tag_id": tag_ids[title]}
+                for document_id, titles in tags.items()
+                for title in titles
+            ],
+        )
+
+    @staticmethod
+    def _tagged_document_ids(tag: str):
+        return (
+            select(document_tag.c.document_id)
+            .join(Tag, Tag.id == document_tag.c.tag_id)
+            .where(Tag.title == tag)
+        )
+
     async def update_document(self, document_id: int, data: dict) -> Optional[Document]:
         stmt = (
             update(Document)
@@ -44,6 +256,85 @@ class DocumentRepository:
         await self.session.flush()
         return result.scalar_one_or_none()
 
+    async def search_documents(
+        self,
+        query: str,
+        size: int,
+        user_id: Optional[int] = None,
+        tag: Optional[str] = None,
+        after: Optional[tuple[float, int]] = None,
+    ) -> list[Row]:
+        """
+        Full-text search on the metadata and the content of documents, best
+        matches first.
+
+        :param query: web search syntax ("quoted phrases", OR, -excluded)
+        :param user_id: restrict the search to the documents of a user
+        :param tag: restrict the search to the documents with a tag
+        :param after: (rank, id) of the last result of the previous page
+        """
+        config = cast(DOCUMENT_SEARCH_CONFIG, REGCONFIG)
+        ts_query = func.websearch_to_tsquery(config, query)
+        search_vector = Document.search_vector.op("||")(
+            func.coalesce(DocumentContent.search_vector, cast("", TSVECTOR))
+        )
+        rank = func.ts_rank_cd(search_vector, ts_query)
+
+        # Documents matching on their metadata or their content, each looked up
+        # on its own index. Only the most recent SEARCH_MAX_CANDIDATES of them
+        # are ranked, broad queries would otherwise rank most of the table.
+        matching_ids = union(
+            select(Document.id).where(Document.search_vector.bool_op("@@")(ts_query)),
+            select(DocumentContent.document_id).where(
+                DocumentContent.search_vector.bool_op("@@")(ts_query)
+            ),
+        )
+        candidates = select(Document.id).where(Document.id.in_(matching_ids))
+        if user_id is not None:
+            candidates = candidates.where(Document.user_id == user_id)
+        if tag is not None:
+            candidates = candidates.where(
+                Document.id.in_(self._tagged_document_ids(tag))
+            )
+        candidate_ids = (
+            candidates.order_by(desc(Document.id))
+            .limit(settings.SEARCH_MAX_CANDIDATES)
+            .subquery()
+        )
+        # Rank and paginate first, then highlight the page only
+        matches = (
+            select(Document.id, rank.label("rank"))
+            .join(candidate_ids, candidate_ids.c.id == Document.id)
+            .outerjoin(DocumentContent, DocumentContent.document_id == Document.id)
+        )
+        page = pagination.keyset(matches, (rank, Document.id), after, size).subquery()
+
+        result = await self.session.execute(
+            select(
+                Document.id,
+                Document.name,
+                Document.description,
+                Document.tags,
+                Document.category_id,
+                Document.sub_category_id,
+                Document.user_id,
+                Document.created_at,
+                page.c.rank,
+                func.ts_headline(config, Document.name, ts_query).label(
+                    "name_highlight"
+                ),
+                func.ts_headline(
+                    config,
+                    func.coalesce(Document.description, ""),
+                    ts_query,
+                    "MaxFragments=2, MinWords=5, MaxWords=20",
+                ).label("description_highlight"),
+            )
+            .join(page, page.c.id == Document.id)
+            .order_by(desc(page.c.rank), desc(Document.id))
+        )
+        return list(result.all())
+
     async def get_first_document_by_subcategory(self, sc_id: int) -> Optional[Document]:
         result = await self.session.scalars(
             select(Document).where(Document.sub_category_id == sc_id)
@@ -55,16 +346,166 @@ class VersionHistoryRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def create_version_history(self, data: dict) -> Optional[VersionHistory]:
-        stmt = insert(VersionHistory).values(**data).returning(VersionHistory)
-        result = await self.session.execute(stmt)
-        return result.scalar_one_or_none()
+    async def bump_version(self, data: dict) -> VersionHistory | ErrorType:
+        """
+        Create the next version of a document and make it current, in a single
+        statement: the document row is updated first (which serializes
+        concurrent bumps of a document), then the previous current version is
+        unset and the new one inserted with the id the document points to.
+
+        A concurrent bump committed after the statement started is not seen by
+        it, and makes the insert fail on the unique current version index: the
+        transaction must be rolled back and retried.
+
+        :param data: fields of the version, other than its number and name
+        :return: the new version, ErrorType.ENTITY_NOT_FOUND if the document
+            does not exist or ErrorType.UNIQUE_VIOLATION on a concurrent bump
+        """
+        try:
+            return await self._insert_next_version(data)
+        except IntegrityError as e:
+            if ASYNCPG_EXCEPTIONS_UNIQUE_VIOLATION in str(e.orig):
+                return ErrorType.UNIQUE_VIOLATION
+            raise
+
+    async def _insert_next_version(self, data: dict) -> VersionHistory | ErrorType:
+        document = (
+            update(Document)
+            .where(Document.id == data["document_id"])
+            .values(
+                version_count=Document.version_count + 1,
+                current_version_id=func.nextval(
+                    func.pg_get_serial_sequence(VersionHistory.__tablename__, "id")
+                ),
+            )
+            .returning(
+                Document.id,
+                Document.name,
+                Document.version_count,
+                Document.current_version_id,
+            )
+            .cte("document")
+        )
+        previous = (
+            update(VersionHistory)
+            .where(
+                VersionHistory.document_id == document.c.id,
+                VersionHistory.current_version,
+            )
+            .values(current_version=False)
+            .returning(VersionHistory.id)
+            .cte("previous")
+        )
+        columns = VersionHistory.__table__.c
+        values = {k: v for k, v in data.items() if k != "document_id"}
+        stmt = (
+            insert(VersionHistory)
+            .from_select(
+                [
+                    "id",
+                    "document_id",
+                    "document_name",
+                    "version_number",
+                    "current_version",
+                    *values,
+                ],
+                # Joined to `previous` so that it runs before the insert
+                select(
+                    document.c.current_version_id,
+                    document.c.id,
+                    document.c.name,
+                    document.c.version_count,
+                    true(),
+                    *(literal(v, columns[k].type) for k, v in values.items()),
+                ).select_from(document.outerjoin(previous, true())),
+            )
+            .returning(VersionHistory)
+        )
+        result = await self.session.scalars(select(VersionHistory).from_statement(stmt))
+        return result.one_or_none() or ErrorType.ENTITY_NOT_FOUND
+
+    async def create_versions(self, rows: list[dict]) -> list[VersionHistory]:
+        """
+        Insert versions of new documents with multi-row INSERT statements.
+
+        :return: the versions, in the order of `rows`
+        """
+        result = await self.session.scalars(
+            insert(VersionHistory).returning(
+                VersionHistory, sort_by_parameter_order=True
+            ),
+            rows,
+        )
+        return list(result.all())
 
     async def get_versions_by_document(self, document_id: int) -> list[VersionHistory]:
         result = await self.session.scalars(
             select(VersionHistory)
             .where(VersionHistory.document_id == document_id)
-            .order_by(desc(VersionHistory.created_at))
+            .order_by(desc(VersionHistory.version_number))
+        )
+        return list(result.all())
+
+    async def get_version_by_number(
+        self, document_id: int, version_number: int
+    ) -> Optional[VersionHistory]:
+        result = await self.session.scalars(
+            select(VersionHistory)
+            .where(
+                VersionHistory.document_id == document_id,
+                VersionHistory.version_number == version_number,
+            )
+            .options(joinedload(VersionHistory.blob))
+        )
+        return result.first()
+
+    async def get_version(
+        self, document_id: int, version_id: int
+    ) -> Optional[VersionHistory]:
+        result = await self.session.scalars(
+            select(VersionHistory)
+            .where(
+                VersionHistory.id == version_id,
+                VersionHistory.document_id == document_id,
+            )
+            .options(joinedload(VersionHistory.blob))
+        )
+        return result.first()
+
+    async def get_content_blobs(self, version: VersionHistory) -> list[Blob]:
+        """
+        Blobs holding the content of a version (loaded with its blob): the
+        blob itself, or the delta chain for versions stored as deltas.
+        """
+        if version.delta_base_id:
+            return await self.get_delta_chain_blobs(version.id)
+        return [version.blob]
+
+    async def get_delta_chain_blobs(self, version_id: int) -> list[Blob]:
+        """
+        Blobs needed to rebuild a version stored as a delta: the keyframe
+        first, then every delta up to the version itself.
+        """
+        chain = (
+            select(
+                VersionHistory.blob_key,
+                VersionHistory.delta_base_id,
+                literal(0).label("depth"),
+            )
+            .where(VersionHistory.id == version_id)
+            .cte("chain", recursive=True)
+        )
+        chain = chain.union_all(
+            select(
+                VersionHistory.blob_key,
+                VersionHistory.delta_base_id,
+                chain.c.depth + 1,
+            ).join(chain, VersionHistory.id == chain.c.delta_base_id)
+        )
+        result = await self.session.scalars(
+            select(Blob)
+            .join(chain, Blob.key == chain.c.blob_key)
+            .order_by(desc(chain.c.depth))
         )
         return list(result.all())
 
@@ -72,44 +513,288 @@ class VersionHistoryRepository:
         self, document_id: int
     ) -> Optional[VersionHistory]:
         result = await self.session.scalars(
-            select(VersionHistory).where(
-                VersionHistory.document_id == document_id,
-                VersionHistory.current_version == True,
+            select(VersionHistory)
+            .join(Document, Document.current_version_id == VersionHistory.id)
+            .where(Document.id == document_id)
+        )
+        return result.first()
+
+
+class BlobRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def blob_exists(self, key: str) -> bool:
+        result = await self.session.scalars(select(Blob.id).where(Blob.key == key))
+        return result.first() is not None
+
+    async def add_blob_reference(self, data: dict) -> int:
+        """
+        Register a new reference to a blob, creating it if needed. The other
+        fields of an existing blob are left untouched.
+
+        :return: reference count of the blob after the update
+        """
+        stmt = (
+            pg_insert(Blob)
+            .values(**data, ref_count=1)
+            .on_conflict_do_update(
+                index_elements=[Blob.key],
+                set_={"ref_count": Blob.ref_count + 1},
+            )
+            .returning(Blob.ref_count)
+        )
+        result = await self.session.execute(stmt)
+        return result.scalar_one()
+
+    async def add_blob_references(self, rows: list[dict]):
+        """
+        Register references to blobs in a single statement, creating missing
+        blobs. Each row holds the fields of a blob and its number of new
+        references as `ref_count`, keys must be unique.
+        """
+        # Sorted so that concurrent ingestions lock blobs in the same order
+        stmt = pg_insert(Blob).values(sorted(rows, key=lambda row: row["key"]))
+        await self.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[Blob.key],
+                set_={"ref_count": Blob.ref_count + stmt.excluded.ref_count},
+            )
+        )
+
+    async def release_blob_references(self, keys: list[str]):
+        """
+        Release references to blobs in a single statement, one per occurrence
+        of their key. Blobs left without references are deleted later on, see
+        `delete_unreferenced_blobs`.
+        """
+        if not keys:
+            return
+        # Sorted so that concurrent deletions lock blobs in the same order
+        released = values(
+            column("key", String), column("count", Integer), name="released"
+        ).data(sorted(Counter(keys).items()))
+        await self.session.execute(
+            update(Blob)
+            .where(Blob.key == released.c.key)
+            .values(ref_count=Blob.ref_count - released.c.count, updated_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+
+    async def delete_unreferenced_blobs(self, limit: int) -> list[str]:
+        """
+        Delete up to `limit` blobs no version references, skipping the ones
+        locked by concurrent transactions. New references to a deleted blob
+        wait for the transaction to end, and then create the blob again.
+
+        Versions of deleted documents hold no reference, they are kept
+        without their blob.
+
+        :return: keys of the deleted blobs
+        """
+        unreferenced = await self.session.scalars(
+            select(Blob.key)
+            .where(
+                Blob.ref_count <= 0,
+                ~exists().where(
+                    VersionHistory.blob_key == Blob.key,
+                    VersionHistory.document_id.is_not(None),
+                ),
             )
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        keys = list(unreferenced)
+        if not keys:
+            return []
+        await self.session.execute(
+            update(VersionHistory)
+            .where(
+                VersionHistory.blob_key.in_(keys),
+                VersionHistory.document_id.is_(None),
+            )
+            .values(blob_key=None)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(
+            delete(Blob)
+            .where(Blob.key.in_(keys))
+            .execution_options(synchronize_session=False)
+        )
+        return keys
+
+
+class DocumentContentRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_content_by_checksum(self, checksum: str) -> Optional[DocumentContent]:
+        result = await self.session.scalars(
+            select(DocumentContent).where(DocumentContent.checksum == checksum).limit(1)
         )
         return result.first()
 
+    async def save_document_content(self, data: dict):
+        """
+        Store the content of a document, unless content of a more recent
+        version is already stored.
+        """
+        stmt = pg_insert(DocumentContent).values(**data)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DocumentContent.document_id],
+            set_={
+                "version_id": stmt.excluded.version_id,
+                "checksum": stmt.excluded.checksum,
+                "text": stmt.excluded.text,
+                "updated_at": func.now(),
+            },
+            where=DocumentContent.version_id < stmt.excluded.version_id,
+        )
+        await self.session.execute(stmt)
+
 
 class DocumentHistoryRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def create_document_history(self, data: dict) -> Optional[DocumentHistory]:
-        stmt = insert(DocumentHistory).values(**data).returning(DocumentHistory)
-        result = await self.session.execute(stmt)
-        return result.scalar_one_or_none()
+    async def get_transaction_time(self) -> datetime:
+        """
+        Start time of the transaction, the default of DocumentHistory.created_at
+        """
+        result = await self.session.execute(select(func.localtimestamp()))
+        return result.scalar_one()
+
+    async def create_document_histories(self, rows: list[dict]):
+        # A single multi-row INSERT, entries are not read back
+        await self.session.execute(insert(DocumentHistory).values(rows))
 
-    async def get_document_history_by_user(self, user_id: int) -> list[DocumentHistory]:
+    async def stream_document_histories(
+        self,
+        params: DocumentHistoryExportParams,
+        after: Optional[tuple[datetime, int]] = None,
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        History entries, oldest first, through a server-side cursor, in batches
+        of EXPORT_FETCH_SIZE entries.
+        """
+        stmt = select(
+            DocumentHistory.id,
+            DocumentHistory.created_at,
+            DocumentHistory.document_id,
+            DocumentHistory.action,
+            DocumentHistory.action_by,
+            DocumentHistory.description,
+        )
+        stmt = stmt.where(*self._history_export_filters(params))
+        if after is not None:
+            stmt = stmt.where(
+                tuple_(DocumentHistory.created_at, DocumentHistory.id) > tuple_(*after),
+                # Row comparisons do not prune partitions
+                DocumentHistory.created_at >= after[0],
+            )
+        result = await self.session.stream(
+            stmt.order_by(
+                DocumentHistory.created_at, DocumentHistory.id
+            ).execution_options(yield_per=settings.EXPORT_FETCH_SIZE)
+        )
+        async for partition in result.partitions():
+            yield partition
+
+    @staticmethod
+    def _history_export_filters(
+        params: DocumentHistoryExportParams,
+    ) -> list[ColumnElement[bool]]:
+        filters = [
+            (DocumentHistory.created_at, operator.ge, params.start),
+            (DocumentHistory.created_at, operator.lt, params.end),
+            (DocumentHistory.action_by, operator.eq, params.user_id),
+            (DocumentHistory.document_id, operator.eq, params.document_id),
+            (DocumentHistory.action, operator.eq, params.action),
+        ]
+        return [op(column, value) for column, op, value in filters if value is not None]
+
+    async def get_document_history_by_user(
+        self,
+        user_id: int,
+        size: int,
+        after: Optional[tuple[datetime, int]] = None,
+    ) -> list[DocumentHistory]:
+        stmt = select(DocumentHistory).where(DocumentHistory.action_by == user_id)
         result = await self.session.scalars(
-            select(DocumentHistory)
-            .where(
-                DocumentHistory.action_by == user_id,
+            pagination.keyset(
+                stmt, (DocumentHistory.created_at, DocumentHistory.id), after, size
             )
-            .order_by(desc(DocumentHistory.created_at))
         )
         return list(result.all())
 
+    async def lock_partitions(self) -> bool:
+        """
+        Take the lock of partition maintenance until the end of the transaction,
+        unless it is already taken.
+        """
+        result = await self.session.execute(
+            select(func.pg_try_advisory_xact_lock(func.hashtext("document_histories")))
+        )
+        return result.scalar_one()
+
+    async def get_partitions(self) -> list[str]:
+        result = await self.session.scalars(text("""
+                SELECT child.relname FROM pg_inherits
+                JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+                WHERE pg_inherits.inhparent = 'document_histories'::regclass
+                """))
+        return list(result.all())
+
+    async def create_partition(self, name: str, start: date, end: date):
+        await self.session.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {name} PARTITION OF document_histories
+                FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')
+                """))
+
+    async def detach_partition(self, name: str):
+        await self.session.execute(
+            text(f"ALTER TABLE document_histories DETACH PARTITION {name}")
+        )
+
+    async def drop_partition(self, name: str):
+        await self.session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+
+    async def stream_partition(self, name: str) -> AsyncIterator[Sequence[Row]]:
+        """
+        Entries of a partition, oldest first, in batches of EXPORT_FETCH_SIZE
+        entries.
+        """
+        result = await self.session.stream(text(f"""
+                SELECT id, created_at, document_id, action, action_by, description
+                FROM {name} ORDER BY created_at, id
+                """).execution_options(yield_per=settings.EXPORT_FETCH_SIZE))
+        async for partition in result.partitions():
+            yield partition
+
 
 class DocumentCommentRepository:
 
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def get_document_comments(self, document_id: int) -> list[DocumentComment]:
+    async def get_document_comments(
+        self,
+        document_id: int,
+        size: int,
+        after: Optional[tuple[datetime, int]] = None,
+    ) -> list[DocumentComment]:
+        """
+        Comments of a document, oldest first.
+        """
+        stmt = select(DocumentComment).where(DocumentComment.document_id == document_id)
         result = await self.session.scalars(
-            select(DocumentComment)
-            .where(DocumentComment.document_id == document_id)
-            .order_by(DocumentComment.created_at)
+            pagination.keyset(
+                stmt,
+                (DocumentComment.created_at, DocumentComment.id),
+                after,
+                size,
+                descending=False,
+            )
         )
         return list(result.all())
 
@@ -1,6 +1,9 @@
-from typing import Optional
+from datetime import datetime
+from typing import Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
+
+from utils.schemas import CursorPaginationResponse
 
 
 class DocumentCreate(BaseModel):
@@ -23,8 +26,9 @@ class DocumentUpdate(BaseModel):
 class VersionHistoryCreate(BaseModel):
     document_id: int
     created_by: int
-    current_version: bool = True
-    document_name: str
+    blob_key: Optional[str] = None
+    size: Optional[int] = None
+    checksum: Optional[str] = None
 
 
 class DocumentHistoryCreate(BaseModel):
@@ -42,3 +46,154 @@ class CommentCreate(BaseModel):
     document_id: int
     user_id: int
     comment: str
+
+
+class DocumentSearchResult(BaseModel):
+    id: int
+    name: Optional[str]
+    description: Optional[str]
+    tags: Optional[str]
+    category_id: int
+    sub_category_id: Optional[int]
+    user_id: Optional[int]
+    created_at: datetime
+    rank: float
+    name_highlight: str
+    description_highlight: str
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DocumentSearchResponse(CursorPaginationResponse):
+    data: list[DocumentSearchResult]
+
+
+# Relations that document listings can embed, with `expand=`
+DocumentExpand = Literal["category", "sub_category", "user", "current_version"]
+
+
+class DocumentCategoryResponse(BaseModel):
+    id: int
+    title: str
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DocumentOwnerResponse(BaseModel):
+    id: int
+    first_name: Optional[str]
+    last_name: Optional[str]
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DocumentVersionResponse(BaseModel):
+    id: int
+    version_number: int
+    size: Optional[int]
+    checksum: Optional[str]
+    created_by: int
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DocumentResponse(BaseModel):
+    id: int
+    name: Optional[str]
+    user_id: Optional[int]
+    category_id: int
+    sub_category_id: Optional[int]
+    description: Optional[str]
+    tags: Optional[str]
+    created_at: datetime
+    updated_at: Optional[datetime]
+    # Set when expanded
+    category: Optional[DocumentCategoryResponse] = None
+    sub_category: Optional[DocumentCategoryResponse] = None
+    user: Optional[DocumentOwnerResponse] = None
+    current_version: Optional[DocumentVersionResponse] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DocumentPaginationResponse(CursorPaginationResponse):
+    data: list[DocumentResponse]
+
+
+class DocumentHistoryResponse(BaseModel):
+    id: int
+    document_id: Optional[int]
+    action: Optional[str]
+    action_by: int
+    description: Optional[str]
+    created_at: datetime
+    updated_at: Optional[datetime]
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DocumentHistoryPaginationResponse(CursorPaginationResponse):
+    data: list[DocumentHistoryResponse]
+
+
+class CommentResponse(BaseModel):
+    id: int
+    document_id: Optional[int]
+    user_id: int
+    comment: Optional[str]
+    created_at: datetime
+    updated_at: Optional[datetime]
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class CommentPaginationResponse(CursorPaginationResponse):
+    data: list[CommentResponse]
+
+
+class DocumentIngestRow(BaseModel):
+    """
+    Line of the NDJSON metadata of a bulk ingestion. `file` names one of the
+    files sent along, `user_id` defaults to the ingesting user.
+    """
+
+    name: str = Field(max_length=255)
+    category_id: int
+    sub_category_id: Optional[int] = None
+    description: Optional[str] = None
+    tags: Optional[list[str]] = None
+    user_id: Optional[int] = None
+    file: Optional[str] = None
+
+
+class DocumentIngestResult(BaseModel):
+    line: int
+    document_id: int
+
+
+class DocumentIngestError(BaseModel):
+    line: int
+    detail: str
+
+
+class DocumentIngestResponse(BaseModel):
+    created: int = 0
+    documents: list[DocumentIngestResult] = []
+    errors: list[DocumentIngestError] = []
+
+
+class DocumentHistoryExportParams(BaseModel):
+    """
+    Filters of an export of the document history. `start` is inclusive, `end`
+    exclusive. An interrupted export resumes from the `cursor` of the last
+    entry received.
+    """
+
+    format: Literal["ndjson", "csv"] = "ndjson"
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    user_id: Optional[int] = None
+    document_id: Optional[int] = None
+    action: Optional[str] = None
+    cursor: Optional[str] = None
@@ -1,27 +1,440 @@
+import asyncio
+import csv
+import datetime
+import functools
+import gzip
+import io
+import itertools
+import json
+import logging
+import multiprocessing
 import os
-import pathlib
+import re
 import time
-from typing import Optional
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Collection,
+    Hashable,
+    Iterable,
+    Optional,
+)
 
-from dependency_injector.wiring import Provide
-from fastapi import UploadFile
+from dependency_injector.wiring import Provide, Provider
+from fastapi import HTTPException, UploadFile
+from pydantic import ValidationError
+from sqlalchemy.exc import DBAPIError
+from starlette import status
 
+import metrics
+import settings
 from auth.schemas import TokenUserPayload
+from documents import archives, extraction, files, previews
+from documents.blobs import BlobStore
+from documents.previews import Preview, PreviewCache
+from documents.repositories import DocumentHistoryRepository
 from documents.schemas import (
     CommentCreate,
+    CommentPaginationResponse,
+    CommentResponse,
     DocumentCreate,
+    DocumentExpand,
     DocumentHistoryCreate,
+    DocumentHistoryExportParams,
+    DocumentHistoryPaginationResponse,
+    DocumentHistoryResponse,
+    DocumentIngestError,
+    DocumentIngestResponse,
+    DocumentIngestResult,
+    DocumentIngestRow,
+    DocumentPaginationResponse,
+    DocumentResponse,
+    DocumentSearchResponse,
+    DocumentSearchResult,
     DocumentUpdate,
     VersionHistoryCreate,
 )
 from documents.uow import DocumentUnitOfWork
-from models import Document, DocumentComment
+from errors import ErrorType
+from models import (
+    Blob,
+    Category,
+    Document,
+    SubCategory,
+    User,
+    VersionHistory,
+)
+from replicas import read_only
+from utils import pagination
+from utils.utils import add_months, io_bound_task
+
+logger = logging.getLogger(__name__)
+
+# Columns of document history exports, in the order of
+# DocumentHistoryRepository.stream_document_histories
+HISTORY_EXPORT_FIELDS = (
+    "id",
+    "created_at",
+    "document_id",
+    "action",
+    "action_by",
+    "description",
+)
+
+# Monthly partitions of document_histories, named after their first month
+HISTORY_PARTITION_NAME = re.compile(r"document_histories_p(\d{4})(\d{2})")
+
+# A batch of ingested lines, with their line number
+IngestBatch = list[tuple[int, DocumentIngestRow]]
+# Staged file of an ingested line and its compressed copy, by line number
+IngestFiles = dict[int, tuple[files.StagedFile, Optional[files.StagedFile]]]
+
+
+def _validation_detail(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(map(str, e['loc']))}: {e['msg']}" if e["loc"] else e["msg"]
+        for e in error.errors()
+    )
+
+
+def _staging_error_detail(error: HTTPException | OSError) -> str:
+    return str(error.detail if isinstance(error, HTTPException) else error)
+
+
+def _present(ids: set[Optional[int]]) -> set[int]:
+    return {id_ for id_ in ids if id_ is not None}
+
+
+def _is_missing(id_: Optional[int], existing: set[int]) -> bool:
+    return id_ is not None and id_ not in existing
+
+
+def _ingest_row(
+    number: int, line: bytes, response: DocumentIngestResponse
+) -> Optional[DocumentIngestRow]:
+    """
+    Parse a line of NDJSON metadata. Invalid lines are reported as errors,
+    blank lines are skipped.
+    """
+    if not line.strip():
+        return None
+    try:
+        return DocumentIngestRow.model_validate_json(line)
+    except ValidationError as e:
+        response.errors.append(
+            DocumentIngestError(line=number, detail=_validation_detail(e))
+        )
+        return None
+
+
+async def _ingest_rows(
+    lines: AsyncIterator[bytes], response: DocumentIngestResponse
+) -> AsyncIterator[tuple[int, DocumentIngestRow]]:
+    number = 0
+    async for line in lines:
+        number += 1
+        row = _ingest_row(number, line, response)
+        if row:
+            yield number, row
+
+
+async def _take(items: AsyncIterator, count: int) -> list:
+    """
+    Up to `count` next items of an iterator.
+    """
+    taken = []
+    async for item in items:
+        taken.append(item)
+        if len(taken) == count:
+            break
+    return taken
+
+
+async def _batched(items: AsyncIterator, size: int) -> AsyncIterator[list]:
+    while batch := await _take(items, size):
+        yield batch
+
+
+async def _gather_limited(limit: int, aws: Iterable[Awaitable]) -> list:
+    """
+    Like asyncio.gather (returning exceptions), running at most `limit`
+    awaitables at a time.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(aw: Awaitable):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*(run(aw) for aw in aws), return_exceptions=True)
+
+
+class BackgroundVersionService:
+    """
+    Base of the services processing the files of versions in the background.
+    Jobs run at most `workers` at a time, CPU heavy work in a pool of worker
+    processes. They are deduplicated by key, and dropped when `max_pending`
+    jobs are already queued.
+    """
+
+    def __init__(
+        self,
+        uow_factory: Callable[[], DocumentUnitOfWork],
+        blob_store: BlobStore,
+        workers: int,
+        max_pending: int,
+    ):
+        self.uow_factory = uow_factory
+        self.blob_store = blob_store
+        self.max_pending = max_pending
+        # Workers are spawned rather than forked, the app process runs threads
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self.semaphore = asyncio.Semaphore(workers)
+        self.pending: dict[Hashable, asyncio.Task] = {}
+
+    def shutdown(self):
+        for task in self.pending.values():
+            task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def drain(self):
+        """
+        Wait for the queued jobs to complete.
+        """
+        while self.pending:
+            await asyncio.gather(*self.pending.values(), return_exceptions=True)
+
+    def _schedule(
+        self, key: Hashable, job: Callable[..., Awaitable[None]], *args
+    ) -> bool:
+        if key in self.pending or len(self.pending) >= self.max_pending:
+            return False
+        task = asyncio.create_task(self._run(key, job, *args))
+        self.pending[key] = task
+        task.add_done_callback(lambda _: self.pending.pop(key, None))
+        return True
+
+    async def _run(self, key: Hashable, job: Callable[..., Awaitable[None]], *args):
+        async with self.semaphore:
+            try:
+                await job(*args)
+            except Exception:
+                logger.exception("Background job %s failed", key)
+
+    async def _run_in_worker(self, func: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, func, *args
+        )
+
+    async def _materialize(
+        self, document_id: int, version_id: int, path: str, max_size: int
+    ) -> Optional[VersionHistory]:
+        """
+        Write the file of a version to a local path, truncated to `max_size`.
+
+        :return: the version, or None if it does not exist (anymore)
+        """
+        uow = self.uow_factory()
+        async with uow:
+            version = await uow.version_history_repository.get_version(
+                document_id, version_id
+            )
+            if not version or not version.blob:
+                return None
+            blobs = await uow.version_history_repository.get_content_blobs(version)
+        await io_bound_task(
+            functools.partial(os.makedirs, exist_ok=True), settings.UPLOAD_TMP_DIR
+        )
+        f = await io_bound_task(open, path, "wb")
+        try:
+            async for chunk in self.blob_store.read(
+                blobs[0], 0, min(version.size or 0, max_size), blobs[1:]
+            ):
+                await io_bound_task(f.write, chunk)
+        finally:
+            await io_bound_task(f.close)
+        return version
+
+    @staticmethod
+    def _temp_path() -> str:
+        return os.path.join(settings.UPLOAD_TMP_DIR, uuid.uuid4().hex)
+
+    @staticmethod
+    async def _remove(*paths: str):
+        for path in paths:
+            try:
+                await io_bound_task(os.remove, path)
+            except FileNotFoundError:
+                pass
+
+
+class PreviewService(BackgroundVersionService):
+    """
+    Renders previews in the background and serves them from the preview cache.
+    """
+
+    def __init__(
+        self,
+        uow_factory: Callable[[], DocumentUnitOfWork] = Provider["document_uow"],
+        blob_store: BlobStore = Provide["blob_store"],
+        cache: PreviewCache = Provide["preview_cache"],
+    ):
+        super().__init__(
+            uow_factory,
+            blob_store,
+            settings.PREVIEW_WORKERS,
+            settings.PREVIEW_MAX_PENDING,
+        )
+        self.cache = cache
+
+    def enqueue(self, document_id: int, version_id: int, checksum: str):
+        """
+        Schedule the rendering of the preview of a version. Versions with the
+        same content share their preview, and jobs dropped when the queue is
+        full are scheduled again on request.
+        """
+        self._schedule(checksum, self._render, document_id, version_id, checksum)
+
+    async def get_preview(self, document_id: int) -> Optional[Preview]:
+        """
+        Preview of the current version of a document.
+
+        :return: the cached preview (with no media type if the document has no
+            preview), or None if it is being rendered
+        """
+        uow = self.uow_factory()
+        async with uow:
+            version = (
+                await uow.version_history_repository.get_current_version_by_document(
+                    document_id
+                )
+            )
+        # Versions stored in a blob always have a checksum
+        if not version or not version.blob_key or not version.checksum:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        preview = await io_bound_task(self.cache.get, version.checksum)
+        if not preview:
+            self.enqueue(document_id, version.id, version.checksum)
+        return preview
+
+    async def _render(self, document_id: int, version_id: int, checksum: str):
+        source, target = self._temp_path(), self._temp_path()
+        try:
+            # Truncated sources are enough for text previews of larger files
+            if not await self._materialize(
+                document_id, version_id, source, settings.PREVIEW_MAX_SOURCE_SIZE
+            ):
+                return
+            kind = await self._run_in_worker(
+                previews.render_preview,
+                source,
+                target,
+                settings.PREVIEW_SIZE,
+                settings.PREVIEW_LINES,
+            )
+            await io_bound_task(self.cache.put, checksum, target, kind)
+        finally:
+            await self._remove(source, target)
+
+
+class ContentExtractionService(BackgroundVersionService):
+    """
+    Extracts the text of the current version of documents in the background,
+    to index their content for search.
+    """
+
+    def __init__(
+        self,
+        uow_factory: Callable[[], DocumentUnitOfWork] = Provider["document_uow"],
+        blob_store: BlobStore = Provide["blob_store"],
+    ):
+        super().__init__(
+            uow_factory,
+            blob_store,
+            settings.EXTRACTION_WORKERS,
+            settings.EXTRACTION_MAX_PENDING,
+        )
+        self.meter = metrics.meter("content_extraction")
+
+    def enqueue(self, document_id: int, version_id: int, checksum: str):
+        if not self._schedule(
+            version_id, self._extract, document_id, version_id, checksum
+        ):
+            logger.warning("Content extraction of version %s dropped", version_id)
+
+    async def _extract(self, document_id: int, version_id: int, checksum: str):
+        text = await self._get_extracted_text(checksum)
+        if text is None:
+            text = await self._extract_text(document_id, version_id)
+        if text is None:
+            return
+        uow = self.uow_factory()
+        async with uow:
+            await uow.document_content_repository.save_document_content(
+                {
+                    "document_id": document_id,
+                    "version_id": version_id,
+                    "checksum": checksum,
+                    "text": text,
+                }
+            )
+            await uow.commit()
+
+    async def _get_extracted_text(self, checksum: str) -> Optional[str]:
+        """
+        Text already extracted from another version or document with the same
+        content.
+        """
+        uow = self.uow_factory()
+        async with uow:
+            content = await uow.document_content_repository.get_content_by_checksum(
+                checksum
+            )
+        return content.text if content else None
+
+    async def _extract_text(self, document_id: int, version_id: int) -> Optional[str]:
+        """
+        :return: the text of the version, or None if it is not current anymore
+        """
+        path = self._temp_path()
+        try:
+            started = time.monotonic()
+            version = await self._materialize(
+                document_id, version_id, path, settings.EXTRACTION_MAX_SOURCE_SIZE
+            )
+            if not version or not version.current_version:
+                return None
+            text, cpu_seconds = await self._run_in_worker(
+                extraction.extract_text, path, settings.EXTRACTION_MAX_CHARS
+            )
+            self.meter.record(
+                version.size or 0, cpu_seconds, time.monotonic() - started
+            )
+            return text
+        finally:
+            await self._remove(path)
 
 
 class DocumentService:
 
-    def __init__(self, uow: DocumentUnitOfWork = Provide["document_uow"]):
+    def __init__(
+        self,
+        uow: DocumentUnitOfWork = Provide["document_uow"],
+        blob_store: BlobStore = Provide["blob_store"],
+        preview_service: PreviewService = Provide["preview_service"],
+        content_extraction_service: ContentExtractionService = Provide[
+            "content_extraction_service"
+        ],
+    ):
         self.uow = uow
+        self.blob_store = blob_store
+        self.preview_service = preview_service
+        self.content_extraction_service = content_extraction_service
 
     async def create_document(
         self,
@@ -29,45 +442,423 @@ class DocumentService:
         document_create: DocumentCreate,
         file: UploadFile,
     ):
-        data = document_create.model_dump()
-        data["tags"] = ",".join(data["tags"]) if data["tags"] else ""
+        staged = await files.stage_upload(file) if file else None
+        return await self.create_document_from_staged_file(
+            current_user, document_create, staged
+        )
+
+    async def create_document_from_staged_file(
+        self,
+        current_user: TokenUserPayload,
+        document_create: DocumentCreate,
+        staged: Optional[files.StagedFile],
+    ) -> Document:
+        if not staged:
+            async with self.uow:
+                document = await self._add_document(current_user, document_create)
+                await self.uow.commit()
+            return document
+        encoded = None
+        try:
+            encoded = await self.blob_store.encode(staged)
+            return await self._create_document_with_file(
+                current_user, document_create, staged, encoded
+            )
+        finally:
+            await files.discard_all(staged, encoded)
+
+    async def _create_document_with_file(
+        self,
+        current_user: TokenUserPayload,
+        document_create: DocumentCreate,
+        staged: files.StagedFile,
+        encoded: Optional[files.StagedFile],
+    ) -> Document:
+        blob = encoded or staged
         async with self.uow:
-            created_document = await self.uow.repository.create_document(data)
-            await self.uow.flush()
-            if file:
-                filename = file.filename
-                file_extension = pathlib.Path(filename).suffix
-                document_file_name = f"{int(time.time())}{file_extension}"
-
-                upload_dir = os.path.join("upload", "documents")
-                os.makedirs(upload_dir, exist_ok=True)
-
-                file_path = os.path.join(upload_dir, document_file_name)
-
-                with open(file_path, "wb") as f:
-                    content = await file.read()
-                    f.write(content)
-
-                version_create = VersionHistoryCreate(
-                    document_id=created_document.id,
-                    document_name=created_document.name,
-                    current_version=True,
-                    created_by=current_user.id,
+            document = await self._add_document(current_user, document_create)
+            await self.uow.blob_repository.add_blob_reference(self._blob_data(blob))
+            version_create = VersionHistoryCreate(
+                document_id=document.id,
+                created_by=current_user.id,
+                blob_key=staged.checksum,
+                size=staged.size,
+                checksum=staged.checksum,
+            )
+            # The document exists and is not visible to concurrent uploads yet
+            version = await self.uow.version_history_repository.bump_version(
+                version_create.model_dump()
+            )
+            assert isinstance(version, VersionHistory)
+            await self.uow.commit()
+        await self.blob_store.store(blob)
+        self._process_version(version)
+        return document
+
+    async def _add_document(
+        self, current_user: TokenUserPayload, document_create: DocumentCreate
+    ) -> Document:
+        data = document_create.model_dump()
+        tags = self._tag_titles(data["tags"])
+        data["tags"] = self._tags_column(tags)
+        document = await self.uow.repository.create_document(data)
+        await self.uow.flush()
+        await self.uow.repository.set_document_tags(document.id, tags)
+        await self.uow.add_document_histories(
+            [self._creation_history(current_user, document.id, document.name)]
+        )
+        return document
+
+    async def ingest_uploaded_documents(
+        self,
+        current_user: TokenUserPayload,
+        metadata: UploadFile,
+        uploads: list[UploadFile],
+    ) -> DocumentIngestResponse:
+        uploads_by_name = {upload.filename: upload for upload in uploads}
+
+        async def stage_file(name: str) -> files.StagedFile:
+            if name not in uploads_by_name:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"File {name} was not sent",
                 )
-                await self.uow.version_history_repository.create_version_history(
-                    version_create.model_dump()
+            return await files.stage_upload(uploads_by_name[name])
+
+        return await self.ingest_documents(
+            current_user, files.iter_lines(metadata.read), stage_file
+        )
+
+    async def ingest_documents(
+        self,
+        current_user: TokenUserPayload,
+        lines: AsyncIterator[bytes],
+        stage_file: Callable[[str], Awaitable[files.StagedFile]],
+    ) -> DocumentIngestResponse:
+        """
+        Create documents in bulk from NDJSON metadata, one document per line.
+        Lines are processed in batches of BULK_INGEST_BATCH_SIZE, each inserted
+        in a single transaction with multi-row statements. Lines that fail are
+        reported in the response and do not fail the others.
+
+        :param stage_file: stages the file a line refers to, by its name
+        """
+        response = DocumentIngestResponse()
+        rows = _ingest_rows(lines, response)
+        async for batch in _batched(rows, settings.BULK_INGEST_BATCH_SIZE):
+            await self._ingest_batch(current_user, batch, stage_file, response)
+        response.errors.sort(key=lambda error: error.line)
+        return response
+
+    async def _ingest_batch(
+        self,
+        current_user: TokenUserPayload,
+        batch: IngestBatch,
+        stage_file: Callable[[str], Awaitable[files.StagedFile]],
+        response: DocumentIngestResponse,
+    ):
+        started, started_cpu = time.monotonic(), time.process_time()
+        staged: IngestFiles = {}
+        try:
+            await self._stage_ingested_files(batch, stage_file, staged, response)
+            batch = [(n, row) for n, row in batch if n in staged or not row.file]
+            created = await self._save_ingested_batch(
+                current_user, batch, staged, response
+            )
+        finally:
+            await files.discard_all(*itertools.chain.from_iterable(staged.values()))
+
+        response.created += len(created)
+        response.documents.extend(created)
+        metrics.meter("ingestion").record(
+            sum(
+                staged[result.line][0].size
+                for result in created
+                if result.line in staged
+            ),
+            time.process_time() - started_cpu,
+            time.monotonic() - started,
+            documents=len(created),
+        )
+
+    async def _save_ingested_batch(
+        self,
+        current_user: TokenUserPayload,
+        batch: IngestBatch,
+        staged: IngestFiles,
+        response: DocumentIngestResponse,
+    ) -> list[DocumentIngestResult]:
+        """
+        Insert a batch in a single transaction, then store the files of its
+        documents. A batch the database rejects is reported as errors of all
+        its lines.
+
+        :return: the documents created
+        """
+        try:
+            async with self.uow:
+                batch = await self._check_ingested_references(batch, response)
+                document_ids, versions = await self._insert_ingested_batch(
+                    current_user, batch, staged
                 )
-            document_history_create = DocumentHistoryCreate(
-                document_id=created_document.id,
-                action="Document Create",
-                description=f"New document {created_document.name} created by {current_user.email}",
-                action_by=current_user.id,
+                await self.uow.commit()
+        except DBAPIError as e:
+            logger.exception("Bulk ingestion batch failed")
+            response.errors.extend(
+                DocumentIngestError(line=number, detail=str(e.orig))
+                for number, _ in batch
             )
-            await self.uow.document_history_repository.create_document_history(
-                document_history_create.model_dump()
+            return []
+
+        await self._store_ingested_files(
+            staged[number] for number, _ in batch if number in staged
+        )
+        for version in versions:
+            self._process_version(version)
+        return [
+            DocumentIngestResult(line=number, document_id=document_id)
+            for (number, _), document_id in zip(batch, document_ids)
+        ]
+
+    async def _store_ingested_files(
+        self, staged: Iterable[tuple[files.StagedFile, Optional[files.StagedFile]]]
+    ):
+        blobs = {
+            staged_file.checksum: encoded or staged_file
+            for staged_file, encoded in staged
+        }
+        results = await _gather_limited(
+            settings.BULK_INGEST_CONCURRENCY,
+            (self.blob_store.store(blob) for blob in blobs.values()),
+        )
+        failure = next((r for r in results if isinstance(r, BaseException)), None)
+        if failure:
+            raise failure
+
+    async def _stage_ingested_files(
+        self,
+        batch: IngestBatch,
+        stage_file: Callable[[str], Awaitable[files.StagedFile]],
+        staged: IngestFiles,
+        response: DocumentIngestResponse,
+    ):
+        """
+        Stage and compress the files of a batch concurrently, into `staged`.
+        Files that cannot be read are reported as errors of their line.
+        """
+        with_files = [(number, row.file) for number, row in batch if row.file]
+        results = await _gather_limited(
+            settings.BULK_INGEST_CONCURRENCY,
+            (self._stage_ingested_file(stage_file, name) for _, name in with_files),
+        )
+        failures = [
+            self._add_staged_file(number, result, staged, response)
+            for (number, _), result in zip(with_files, results)
+        ]
+        failure = next((f for f in failures if f), None)
+        if failure:
+            raise failure
+
+    async def _stage_ingested_file(
+        self, stage_file: Callable[[str], Awaitable[files.StagedFile]], name: str
+    ) -> tuple[files.StagedFile, Optional[files.StagedFile]]:
+        staged_file = await stage_file(name)
+        try:
+            return staged_file, await self.blob_store.encode(staged_file)
+        except BaseException:
+            await files.discard(staged_file)
+            raise
+
+    @staticmethod
+    def _add_staged_file(
+        number: int,
+        result: tuple[files.StagedFile, Optional[files.StagedFile]] | BaseException,
+        staged: IngestFiles,
+        response: DocumentIngestResponse,
+    ) -> Optional[BaseException]:
+        """
+        Record the outcome of staging the file of a line: the staged file, or an
+        error of the line when the file cannot be read.
+
+        :return: other exceptions, failing the batch
+        """
+        if isinstance(result, (HTTPException, OSError)):
+            response.errors.append(
+                DocumentIngestError(line=number, detail=_staging_error_detail(result))
             )
-            await self.uow.commit()
-            return created_document
+            return None
+        if isinstance(result, BaseException):
+            return result
+        staged[number] = result
+        return None
+
+    async def _check_ingested_references(
+        self, batch: IngestBatch, response: DocumentIngestResponse
+    ) -> IngestBatch:
+        """
+        Report the lines of a batch referring to missing categories, sub
+        categories or users, and return the others.
+        """
+        existing = await self._get_existing_references(batch)
+        checked = [
+            (number, row, self._missing_reference(row, *existing))
+            for number, row in batch
+        ]
+        response.errors.extend(
+            DocumentIngestError(line=number, detail=detail)
+            for number, _, detail in checked
+            if detail
+        )
+        return [(number, row) for number, row, detail in checked if not detail]
+
+    async def _get_existing_references(
+        self, batch: IngestBatch
+    ) -> tuple[set[int], set[int], set[int]]:
+        """
+        Ids of the categories, sub categories and users a batch refers to that
+        exist.
+        """
+        rows = [row for _, row in batch]
+        repository = self.uow.repository
+        categories = await repository.get_existing_ids(
+            Category, {row.category_id for row in rows}
+        )
+        sub_categories = await repository.get_existing_ids(
+            SubCategory, _present({row.sub_category_id for row in rows})
+        )
+        users = await repository.get_existing_ids(
+            User, _present({row.user_id for row in rows})
+        )
+        return categories, sub_categories, users
+
+    @staticmethod
+    def _missing_reference(
+        row: DocumentIngestRow,
+        categories: set[int],
+        sub_categories: set[int],
+        users: set[int],
+    ) -> Optional[str]:
+        if row.category_id not in categories:
+            return f"Category {row.category_id} not found"
+        if _is_missing(row.sub_category_id, sub_categories):
+            return f"Sub category {row.sub_category_id} not found"
+        if _is_missing(row.user_id, users):
+            return f"User {row.user_id} not found"
+        return None
+
+    async def _insert_ingested_batch(
+        self, current_user: TokenUserPayload, batch: IngestBatch, staged: IngestFiles
+    ) -> tuple[list[int], list[VersionHistory]]:
+        """
+        Insert the documents of a batch, with their tags, first version and
+        history, a few statements for the whole batch.
+
+        :return: ids of the documents, in the order of the batch, and versions
+        """
+        if not batch:
+            return [], []
+        titles = [self._tag_titles(row.tags) for _, row in batch]
+        document_ids = await self.uow.repository.create_documents(
+            [
+                self._ingested_document(current_user, row, row_titles)
+                for (_, row), row_titles in zip(batch, titles)
+            ]
+        )
+        await self.uow.repository.add_documents_tags(dict(zip(document_ids, titles)))
+        versions = await self._insert_ingested_versions(
+            current_user,
+            [
+                (document_id, number, row)
+                for document_id, (number, row) in zip(document_ids, batch)
+                if row.file
+            ],
+            staged,
+        )
+        await self.uow.add_document_histories(
+            [
+                self._creation_history(current_user, document_id, row.name)
+                for document_id, (_, row) in zip(document_ids, batch)
+            ]
+        )
+        return document_ids, versions
+
+    @classmethod
+    def _ingested_document(
+        cls, current_user: TokenUserPayload, row: DocumentIngestRow, titles: list[str]
+    ) -> dict:
+        return {
+            "name": row.name,
+            "user_id": row.user_id or current_user.id,
+            "category_id": row.category_id,
+            "sub_category_id": row.sub_category_id,
+            "description": row.description,
+            "tags": cls._tags_column(titles),
+            "version_count": 1 if row.file else 0,
+        }
+
+    async def _insert_ingested_versions(
+        self,
+        current_user: TokenUserPayload,
+        with_files: list[tuple[int, int, DocumentIngestRow]],
+        staged: IngestFiles,
+    ) -> list[VersionHistory]:
+        """
+        Insert the first versions of documents, by document id and line number.
+        """
+        if not with_files:
+            return []
+        await self.uow.blob_repository.add_blob_references(
+            self._ingested_blobs(staged[number] for _, number, _ in with_files)
+        )
+        versions = await self.uow.version_history_repository.create_versions(
+            [
+                {
+                    "document_id": document_id,
+                    "document_name": row.name,
+                    "version_number": 1,
+                    "current_version": True,
+                    "created_by": current_user.id,
+                    "blob_key": staged[number][0].checksum,
+                    "size": staged[number][0].size,
+                    "checksum": staged[number][0].checksum,
+                }
+                for document_id, number, row in with_files
+            ]
+        )
+        await self.uow.repository.set_current_versions(
+            {
+                document_id: version.id
+                for (document_id, _, _), version in zip(with_files, versions)
+            }
+        )
+        return versions
+
+    @classmethod
+    def _ingested_blobs(
+        cls, staged: Iterable[tuple[files.StagedFile, Optional[files.StagedFile]]]
+    ) -> list[dict]:
+        """
+        Blobs of staged files, referenced as many times as they were ingested.
+        """
+        blobs: dict[str, dict] = {}
+        for staged_file, encoded in staged:
+            blob = blobs.setdefault(
+                staged_file.checksum,
+                {**cls._blob_data(encoded or staged_file), "ref_count": 0},
+            )
+            blob["ref_count"] += 1
+        return list(blobs.values())
+
+    @staticmethod
+    def _creation_history(
+        current_user: TokenUserPayload, document_id: int, name: Optional[str]
+    ) -> dict:
+        return DocumentHistoryCreate(
+            document_id=document_id,
+            action="Document Create",
+            description=f"New document {name} created by {current_user.email}",
+            action_by=current_user.id,
+        ).model_dump()
 
     async def update_document(
         self,
@@ -79,71 +870,303 @@ class DocumentService:
             data = {
                 k: v for k, v in document_update.model_dump().items() if v is not None
             }
+            tags = None
             if data.get("tags", None):
-                data["tags"] = ",".join(data["tags"])
+                tags = self._tag_titles(data["tags"])
+                data["tags"] = self._tags_column(tags)
 
             document_name = await self.uow.repository.get_document_name(document_id)
             updated_document = await self.uow.repository.update_document(
                 document_id, data
             )
+            if tags is not None:
+                await self.uow.repository.set_document_tags(document_id, tags)
             document_history_create = DocumentHistoryCreate(
                 document_id=document_id,
                 action="Document Update",
                 description=f"Document {document_name} updated by {current_user.email}",
                 action_by=current_user.id,
             )
-            await self.uow.document_history_repository.create_document_history(
-                document_history_create.model_dump()
+            await self.uow.add_document_histories(
+                [document_history_create.model_dump()]
             )
             await self.uow.commit()
             return updated_document
 
+    @read_only
     async def get_document_versions(self, document_id):
         async with self.uow:
             return await self.uow.version_history_repository.get_versions_by_document(
                 document_id
             )
 
+    async def get_document_version(
+        self, document_id: int, version_id: int
+    ) -> VersionHistory:
+        """
+        Version of a document along with its blob, 404 if it has no file.
+        """
+        async with self.uow:
+            version = await self.uow.version_history_repository.get_version(
+                document_id, version_id
+            )
+        if not version or not version.blob_key:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Version not found"
+            )
+        return version
+
+    async def get_document_version_by_number(
+        self, document_id: int, version_number: int
+    ) -> Optional[VersionHistory]:
+        async with self.uow:
+            return await self.uow.version_history_repository.get_version_by_number(
+                document_id, version_number
+            )
+
+    def get_version_file_path(self, version: VersionHistory) -> Optional[str]:
+        """
+        Local path of the file of a version, when the storage backend has one
+        and the version is stored in full.
+        """
+        if version.delta_base_id:
+            return None
+        return self.blob_store.local_path(version.blob)
+
+    async def read_version_content(
+        self, version: VersionHistory, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        async with self.uow:
+            blobs = await self.uow.version_history_repository.get_content_blobs(version)
+        end = version.size if end is None else end
+        async for chunk in self.blob_store.read(blobs[0], start, end, blobs[1:]):
+            yield chunk
+
+    def get_version_encoding(self, version: VersionHistory) -> Optional[str]:
+        """
+        Encoding of the stored file of a version, if it can be sent as is to
+        clients accepting it.
+        """
+        if version.delta_base_id:
+            return None
+        return version.blob.encoding
+
+    def read_version_encoded_content(
+        self, version: VersionHistory
+    ) -> AsyncIterator[bytes]:
+        return self.blob_store.read_encoded(version.blob)
+
     async def create_document_version(
         self, version_create: VersionHistoryCreate, file: UploadFile
     ):
+        staged = await files.stage_upload(file)
+        return await self.create_document_version_from_staged_file(
+            version_create, staged
+        )
+
+    async def create_document_version_from_staged_file(
+        self, version_create: VersionHistoryCreate, staged: files.StagedFile
+    ):
+        base_version, delta, encoded = None, None, None
+        try:
+            if settings.DELTA_STORAGE:
+                base_version, delta = await self._stage_delta(
+                    version_create.document_id, staged
+                )
+            encoded = await self.blob_store.encode(delta or staged)
+            blob = encoded or delta or staged
+            data = self._version_data(version_create, staged, blob, base_version)
+            version = await self._bump_version(blob, data)
+            await self.blob_store.store(blob)
+            self._process_version(version)
+            return version
+        finally:
+            await files.discard_all(staged, delta, encoded)
+
+    @staticmethod
+    def _version_data(
+        version_create: VersionHistoryCreate,
+        staged: files.StagedFile,
+        blob: files.StagedFile,
+        base_version: Optional[VersionHistory],
+    ) -> dict:
+        """
+        Row of a new version of `staged`, stored as `blob`: the file itself or
+        its delta against `base_version`.
+        """
+        data = version_create.model_dump()
+        data["blob_key"] = blob.checksum
+        data["size"] = staged.size
+        data["checksum"] = staged.checksum
+        if base_version:
+            data["delta_base_id"] = base_version.id
+            data["delta_depth"] = base_version.delta_depth + 1
+        return data
+
+    async def _bump_version(self, blob: files.StagedFile, data: dict) -> VersionHistory:
+        """
+        Register the blob of a new version and make the version current,
+        retrying when a concurrent upload to the same document got there first.
+        """
+        for _ in range(settings.VERSION_BUMP_ATTEMPTS):
+            version = await self._try_bump_version(blob, data)
+            if version is not None:
+                return version
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Concurrent version upload, please retry",
+        )
+
+    async def _try_bump_version(
+        self, blob: files.StagedFile, data: dict
+    ) -> Optional[VersionHistory]:
+        """
+        :return: the new version, or None on a concurrent upload to the same
+            document
+        """
         async with self.uow:
-            last_version = await self.uow.version_history_repository.get_current_version_by_document(
-                version_create.document_id
+            await self.uow.blob_repository.add_blob_reference(self._blob_data(blob))
+            version = self._bumped_version(
+                await self.uow.version_history_repository.bump_version(data)
             )
-            if last_version:
-                last_version.current_version = False
-
-            filename = file.filename
-            file_extension = pathlib.Path(filename).suffix
-            document_file_name = f"{int(time.time())}{file_extension}"
+            if version is None:
+                await self.uow.rollback()
+                return None
+            await self.uow.commit()
+        return version
 
-            upload_dir = os.path.join("upload", "documents")
-            os.makedirs(upload_dir, exist_ok=True)
+    @staticmethod
+    def _bumped_version(result: VersionHistory | ErrorType) -> Optional[VersionHistory]:
+        if result == ErrorType.ENTITY_NOT_FOUND:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document not found",
+            )
+        # ErrorType.UNIQUE_VIOLATION otherwise
+        return result if isinstance(result, VersionHistory) else None
 
-            file_path = os.path.join(upload_dir, document_file_name)
+    def _process_version(self, version: VersionHistory):
+        """
+        Schedule the background processing of a new current version.
+        """
+        # Set on the versions just created
+        assert version.document_id is not None and version.checksum is not None
+        self.preview_service.enqueue(version.document_id, version.id, version.checksum)
+        self.content_extraction_service.enqueue(
+            version.document_id, version.id, version.checksum
+        )
 
-            with open(file_path, "wb") as f:
-                content = await file.read()
-                f.write(content)
-            document_name = await self.uow.repository.get_document_name(
-                version_create.document_id
+    async def _stage_delta(
+        self, document_id: int, staged: files.StagedFile
+    ) -> tuple[Optional[VersionHistory], Optional[files.StagedFile]]:
+        """
+        Stage the delta between the current version of a document and a new
+        file. No delta is made when the file is already stored (deduplication
+        is cheaper), or when the chain of deltas reached DELTA_MAX_CHAIN, in
+        which case the new version becomes a keyframe.
+        """
+        async with self.uow:
+            base_version = await self._get_delta_base(document_id, staged.checksum)
+            if not base_version:
+                return None, None
+            base_blobs = (
+                await self.uow.version_history_repository.get_delta_chain_blobs(
+                    base_version.id
+                )
             )
-            data = version_create.model_dump()
-            data["document_name"] = document_name
-            version = await self.uow.version_history_repository.create_version_history(
-                data
+        delta = await self.blob_store.stage_delta(
+            base_blobs, base_version.size or 0, staged
+        )
+        return (base_version, delta) if delta else (None, None)
+
+    async def _get_delta_base(
+        self, document_id: int, checksum: str
+    ) -> Optional[VersionHistory]:
+        """
+        Current version of a document to store a new file as a delta against.
+        """
+        if await self.uow.blob_repository.blob_exists(checksum):
+            return None
+        versions = self.uow.version_history_repository
+        base_version = await versions.get_current_version_by_document(document_id)
+        return base_version if self._is_delta_base(base_version) else None
+
+    @staticmethod
+    def _is_delta_base(version: Optional[VersionHistory]) -> bool:
+        if not version or not version.blob_key:
+            return False
+        return version.delta_depth < settings.DELTA_MAX_CHAIN
+
+    @staticmethod
+    def _tag_titles(tags: Optional[list[str]]) -> list[str]:
+        """
+        Clean up tag titles: strip them, drop empty and duplicated ones.
+        """
+        titles = (tag.strip() for tag in tags or [])
+        return list(dict.fromkeys(title for title in titles if title))
+
+    @staticmethod
+    def _tags_column(titles: list[str]) -> str:
+        """
+        Denormalized tags of a document, as many whole tags as fit the column.
+        """
+        # Tags joined one by one, as long as they fit
+        prefixes = itertools.accumulate(
+            titles, lambda column, title: f"{column},{title}"
+        )
+        fitting = [
+            prefix for prefix in prefixes if len(prefix) <= Document.tags.type.length
+        ]
+        return fitting[-1] if fitting else ""
+
+    @staticmethod
+    def _blob_data(staged: files.StagedFile) -> dict:
+        return {
+            "key": staged.checksum,
+            "size": staged.size,
+            "encoding": staged.encoding,
+            "block_size": staged.block_size,
+            "blocks": staged.blocks,
+        }
+
+    @read_only
+    async def search_documents(
+        self,
+        query: str,
+        size: int,
+        cursor: Optional[str] = None,
+        user_id: Optional[int] = None,
+        tag: Optional[str] = None,
+    ) -> DocumentSearchResponse:
+        after = tuple(pagination.decode_cursor(cursor, 2)) if cursor else None
+        async with self.uow:
+            rows = await self.uow.repository.search_documents(
+                query, size, user_id, tag, after
             )
-            await self.uow.commit()
-            return version
+        rows, next_cursor = pagination.page(rows, size, "rank", "id")
+        return DocumentSearchResponse(
+            size=size,
+            next_cursor=next_cursor,
+            data=[DocumentSearchResult.model_validate(row) for row in rows],
+        )
 
-    async def get_document_history_by_user(self, user_id: int):
+    @read_only
+    async def get_document_history_by_user(
+        self, user_id: int, size: int, cursor: Optional[str] = None
+    ) -> DocumentHistoryPaginationResponse:
+        after = pagination.decode_timestamp_cursor(cursor) if cursor else None
         async with self.uow:
-            return (
+            rows = (
                 await self.uow.document_history_repository.get_document_history_by_user(
-                    user_id
+                    user_id, size, after
                 )
             )
+        rows, next_cursor = pagination.page(rows, size, "created_at", "id")
+        return DocumentHistoryPaginationResponse(
+            size=size,
+            next_cursor=next_cursor,
+            data=[DocumentHistoryResponse.model_validate(row) for row in rows],
+        )
 
     async def delete_document(self, current_user: TokenUserPayload, document_id: int):
         async with self.uow:
@@ -154,25 +1177,53 @@ class DocumentService:
                 description=f"Document {document_name} deleted by {current_user.email}",
                 action_by=current_user.id,
             )
-            await self.uow.document_history_repository.create_document_history(
-                document_history_create.model_dump()
+            await self.uow.add_document_histories(
+                [document_history_create.model_dump()]
             )
-            await self.uow.repository.delete_document(document_id)
+            blob_keys = await self.uow.repository.delete_document(document_id)
+            await self.uow.blob_repository.release_blob_references(blob_keys)
             await self.uow.commit()
 
-    async def get_documents_by_user(self, user_id: int):
+    @read_only
+    async def get_documents_by_user(
+        self,
+        user_id: int,
+        size: int,
+        cursor: Optional[str] = None,
+        tag: Optional[str] = None,
+        expand: Collection[DocumentExpand] = (),
+    ) -> DocumentPaginationResponse:
+        after = pagination.decode_timestamp_cursor(cursor) if cursor else None
         async with self.uow:
-            return await self.uow.repository.get_documents_by_user(user_id)
+            rows = await self.uow.repository.get_documents_by_user(
+                user_id, size, after, tag, expand
+            )
+        rows, next_cursor = pagination.page(rows, size, "created_at", "id")
+        return DocumentPaginationResponse(
+            size=size,
+            next_cursor=next_cursor,
+            data=[DocumentResponse.model_validate(row) for row in rows],
+        )
 
     async def get_first_document_by_subcategory(self, sc_id: int) -> Optional[Document]:
         async with self.uow:
             return await self.uow.repository.get_first_document_by_subcategory(sc_id)
 
-    async def get_document_comments(self, document_id: int) -> list[DocumentComment]:
+    @read_only
+    async def get_document_comments(
+        self, document_id: int, size: int, cursor: Optional[str] = None
+    ) -> CommentPaginationResponse:
+        after = pagination.decode_timestamp_cursor(cursor) if cursor else None
         async with self.uow:
-            return await self.uow.document_comment_repository.get_document_comments(
-                document_id
+            rows = await self.uow.document_comment_repository.get_document_comments(
+                document_id, size, after
             )
+        rows, next_cursor = pagination.page(rows, size, "created_at", "id")
+        return CommentPaginationResponse(
+            size=size,
+            next_cursor=next_cursor,
+            data=[CommentResponse.model_validate(row) for row in rows],
+        )
 
     async def create_document_comment(self, comment_create: CommentCreate):
         async with self.uow:
@@ -183,3 +1234,304 @@ class DocumentService:
             )
             await self.uow.commit()
             return comment
+
+
+class ExportService:
+    """
+    Streams exports of documents. Exports hold a database connection (and a
+    server-side cursor) for as long as they are streamed.
+    """
+
+    def __init__(
+        self,
+        uow_factory: Callable[[], DocumentUnitOfWork] = Provider["document_uow"],
+        blob_store: BlobStore = Provide["blob_store"],
+    ):
+        self.uow_factory = uow_factory
+        self.blob_store = blob_store
+
+    def export_zip(
+        self, category_id: Optional[int] = None, user_id: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        ZIP archive of the current version of documents, an entry per document.
+        """
+        return archives.stream_zip(self._archive_entries(category_id, user_id))
+
+    async def _archive_entries(
+        self, category_id: Optional[int], user_id: Optional[int]
+    ) -> AsyncIterator[archives.ArchiveEntry]:
+        uow = self.uow_factory()
+        async with uow:
+            async for (
+                document_id,
+                version,
+                blob,
+            ) in uow.repository.stream_current_versions(category_id, user_id):
+                yield archives.ArchiveEntry(
+                    name=self._archive_name(document_id, version.document_name),
+                    size=version.size,
+                    modified=version.created_at,
+                    read=functools.partial(self._read_version, version, blob),
+                )
+
+    async def _read_version(
+        self, version: VersionHistory, blob: Blob
+    ) -> AsyncIterator[bytes]:
+        blobs = [blob]
+        if version.delta_base_id:
+            # The export cursor holds the connection of the export
+            uow = self.uow_factory()
+            async with uow:
+                blobs = await uow.version_history_repository.get_delta_chain_blobs(
+                    version.id
+                )
+        async for chunk in self.blob_store.read(blobs[0], 0, version.size, blobs[1:]):
+            yield chunk
+
+    @staticmethod
+    def _archive_name(document_id: int, name: Optional[str]) -> str:
+        # Prefixed with the document id to be unique, without directories
+        name = (name or "").replace("\\", "/").rpartition("/")[2].strip(". ")
+        return f"{document_id}_{name}" if name else str(document_id)
+
+    def export_history(
+        self, params: DocumentHistoryExportParams
+    ) -> AsyncIterator[bytes]:
+        """
+        Document history entries matching filters, oldest first, as NDJSON or
+        CSV. Every entry carries the cursor to resume the export after it.
+        """
+        after = (
+            pagination.decode_timestamp_cursor(params.cursor) if params.cursor else None
+        )
+        return self._history_chunks(params, after)
+
+    async def _history_chunks(
+        self, params: DocumentHistoryExportParams, after: Optional[tuple]
+    ) -> AsyncIterator[bytes]:
+        if params.format == "csv":
+            yield self._history_csv([HISTORY_EXPORT_FIELDS + ("cursor",)])
+        uow = self.uow_factory()
+        async with uow:
+            async for rows in uow.document_history_repository.stream_document_histories(
+                params, after
+            ):
+                entries = (
+                    (
+                        row.id,
+                        row.created_at.isoformat(),
+                        *row[2:],
+                        pagination.encode_cursor([row.created_at, row.id]),
+                    )
+                    for row in rows
+                )
+                if params.format == "csv":
+                    yield self._history_csv(entries)
+                else:
+                    yield self._history_ndjson(entries)
+
+    @staticmethod
+    def _history_csv(entries: Iterable[tuple]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(entries)
+        return buffer.getvalue().encode()
+
+    @staticmethod
+    def _history_ndjson(entries: Iterable[tuple]) -> bytes:
+        return "".join(
+            json.dumps(dict(zip(HISTORY_EXPORT_FIELDS + ("cursor",), entry))) + "\n"
+            for entry in entries
+        ).encode()
+
+
+class BlobCollectionService:
+    """
+    Deletes the blobs no version references anymore, from the database and from
+    storage.
+    """
+
+    def __init__(
+        self,
+        uow_factory: Callable[[], DocumentUnitOfWork] = Provider["document_uow"],
+        blob_store: BlobStore = Provide["blob_store"],
+    ):
+        self.uow_factory = uow_factory
+        self.blob_store = blob_store
+
+    async def run_collector(self):
+        while True:
+            try:
+                await self.collect_blobs()
+            except Exception:
+                logger.exception("Failed to collect unreferenced blobs")
+            await asyncio.sleep(settings.BLOB_GC_INTERVAL)
+
+    async def collect_blobs(self) -> int:
+        """
+        Delete unreferenced blobs, BLOB_GC_BATCH_SIZE at a time. Returns the
+        number of deleted blobs.
+        """
+        collected = 0
+        while True:
+            deleted = await self._collect_batch()
+            collected += deleted
+            if deleted < settings.BLOB_GC_BATCH_SIZE:
+                return collected
+
+    async def _collect_batch(self) -> int:
+        # Objects are deleted while their rows are locked, so that an upload of
+        # the same content waits and then stores the object again. A failure
+        # rolls back the batch, to be collected next time.
+        uow = self.uow_factory()
+        async with uow:
+            keys = await uow.blob_repository.delete_unreferenced_blobs(
+                settings.BLOB_GC_BATCH_SIZE
+            )
+            for key in keys:
+                await self.blob_store.delete(key)
+            await uow.commit()
+        if keys:
+            logger.info("Collected %s unreferenced blobs", len(keys))
+        return len(keys)
+
+
+class HistoryPartitionService:
+    """
+    Maintains the monthly partitions of document history: creates partitions
+    ahead of time, and applies the retention policy to old ones.
+    """
+
+    def __init__(
+        self,
+        uow_factory: Callable[[], DocumentUnitOfWork] = Provider["document_uow"],
+    ):
+        self.uow_factory = uow_factory
+
+    async def run_maintenance(self):
+        while True:
+            try:
+                await self._maintain_and_log()
+            except Exception:
+                logger.exception("Failed to maintain document history partitions")
+            await asyncio.sleep(settings.HISTORY_MAINTENANCE_INTERVAL)
+
+    async def _maintain_and_log(self):
+        created, expired = await self.maintain_partitions()
+        if created or expired:
+            logger.info("Created history partitions %s, expired %s", created, expired)
+
+    async def maintain_partitions(
+        self, today: Optional[datetime.date] = None
+    ) -> tuple[list[str], list[str]]:
+        """
+        Create missing partitions up to HISTORY_PARTITIONS_AHEAD months ahead,
+        and expire the ones past the retention period. Returns the names of the
+        created and expired partitions.
+
+        Partitions are created and expired in the transaction holding the lock
+        that keeps other processes from maintaining partitions at the same time.
+        Expired partitions are archived before any DDL, so that the table is not
+        locked while they are read.
+        """
+        month = (today or datetime.date.today()).replace(day=1)
+        uow = self.uow_factory()
+        async with uow:
+            repository = uow.document_history_repository
+            if not await repository.lock_partitions():
+                return [], []
+            partitions = self._partitions_by_month(await repository.get_partitions())
+            expired = self._expired_partitions(partitions, month)
+            await self._archive_partitions(expired)
+            await self._expire_partitions(repository, expired)
+            created = await self._create_partitions(repository, partitions, month)
+            await uow.commit()
+        return created, expired
+
+    @staticmethod
+    def _partitions_by_month(names: list[str]) -> dict[datetime.date, str]:
+        matches = (HISTORY_PARTITION_NAME.fullmatch(name) for name in names)
+        return {
+            datetime.date(int(match[1]), int(match[2]), 1): match[0]
+            for match in matches
+            if match
+        }
+
+    @staticmethod
+    def _expired_partitions(
+        partitions: dict[datetime.date, str], month: datetime.date
+    ) -> list[str]:
+        if settings.HISTORY_RETENTION_MONTHS is None:
+            return []
+        cutoff = add_months(month, -settings.HISTORY_RETENTION_MONTHS)
+        return [
+            name
+            for start, name in sorted(partitions.items())
+            if add_months(start, 1) <= cutoff
+        ]
+
+    async def _archive_partitions(self, names: list[str]):
+        if settings.HISTORY_RETENTION_ACTION == "archive":
+            for name in names:
+                await self._archive_partition(name)
+
+    @staticmethod
+    async def _expire_partitions(
+        repository: DocumentHistoryRepository, names: list[str]
+    ):
+        expire = (
+            repository.detach_partition
+            if settings.HISTORY_RETENTION_ACTION == "detach"
+            else repository.drop_partition
+        )
+        for name in names:
+            await expire(name)
+
+    @staticmethod
+    async def _create_partitions(
+        repository: DocumentHistoryRepository,
+        partitions: dict[datetime.date, str],
+        month: datetime.date,
+    ) -> list[str]:
+        starts = (
+            add_months(month, months)
+            for months in range(settings.HISTORY_PARTITIONS_AHEAD + 1)
+        )
+        missing = [start for start in starts if start not in partitions]
+        for start in missing:
+            await repository.create_partition(
+                f"document_histories_p{start:%Y%m}", start, add_months(start, 1)
+            )
+        return [f"document_histories_p{start:%Y%m}" for start in missing]
+
+    async def _archive_partition(self, name: str):
+        """
+        Write the entries of a partition to a gzipped CSV file, in the format
+        of history exports.
+        """
+        path = os.path.join(settings.HISTORY_ARCHIVE_DIR, f"{name}.csv.gz")
+        tmp_path = f"{path}.tmp"
+        await io_bound_task(
+            functools.partial(os.makedirs, exist_ok=True), settings.HISTORY_ARCHIVE_DIR
+        )
+        f = await io_bound_task(
+            functools.partial(gzip.open, mode="wt", newline=""), tmp_path
+        )
+        try:
+            writer = csv.writer(f)
+            await io_bound_task(writer.writerow, HISTORY_EXPORT_FIELDS)
+            uow = self.uow_factory()
+            async with uow:
+                async for rows in uow.document_history_repository.stream_partition(
+                    name
+                ):
+                    await io_bound_task(
+                        writer.writerows,
+                        [
+                            (row.id, row.created_at.isoformat(), *row[2:])
+                            for row in rows
+                        ],
+                    )
+        finally:
+            await io_bound_task(f.close)
+        await io_bound_task(os.replace, tmp_path, path)
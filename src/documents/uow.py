@@ -1,5 +1,12 @@
+from typing import Any, Callable, Optional
+
+from dependency_injector.wiring import Provide, inject
+
+from documents.audit import AuditWriter
 from documents.repositories import (
+    BlobRepository,
     DocumentCommentRepository,
+    DocumentContentRepository,
     DocumentHistoryRepository,
     DocumentRepository,
     VersionHistoryRepository,
@@ -9,13 +16,52 @@ from uow import BaseUnitOfWork
 
 class DocumentUnitOfWork(BaseUnitOfWork):
 
+    @inject
+    def __init__(
+        self,
+        session_factory: Callable[[], Any] = Provide["DEFAULT_SESSION_FACTORY"],
+        audit_writer: Optional[AuditWriter] = None,
+    ):
+        super().__init__(session_factory)
+        self.audit_writer = audit_writer
+        self.history_entries: list[dict] = []
+
     async def __aenter__(self):
         await super().__aenter__()
         self.repository = DocumentRepository(self.session)
         self.version_history_repository = VersionHistoryRepository(self.session)
         self.document_history_repository = DocumentHistoryRepository(self.session)
         self.document_comment_repository = DocumentCommentRepository(self.session)
+        self.blob_repository = BlobRepository(self.session)
+        self.document_content_repository = DocumentContentRepository(self.session)
+        self.history_entries = []
         return self
 
     async def flush(self):
         await self.session.flush()
+
+    async def add_document_histories(self, rows: list[dict]):
+        """
+        Record document history entries in the transaction or, with an audit
+        writer, hand them to the writer once the transaction is committed.
+        Nested units of work record them in the enclosing transaction, which they
+        cannot tell the outcome of.
+        """
+        if self.audit_writer is None or self.nested:
+            await self.document_history_repository.create_document_histories(rows)
+            return
+        # Entries keep the time of the change, not the time they are written, as
+        # the database would have stamped them
+        created_at = await self.document_history_repository.get_transaction_time()
+        self.history_entries.extend({**row, "created_at": created_at} for row in rows)
+
+    async def commit(self):
+        await super().commit()
+        # Only the outermost commit is final, see BaseUnitOfWork.commit
+        if self.audit_writer and self.history_entries and not self.nested:
+            self.audit_writer.enqueue(self.history_entries)
+            self.history_entries = []
+
+    async def rollback(self):
+        await super().rollback()
+        self.history_entries = []
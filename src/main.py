@@ -1,20 +1,57 @@
+import asyncio
 import os
 import sys
+from contextlib import asynccontextmanager
+from typing import Coroutine
 
 from fastapi import APIRouter, FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
 sys.path.append(f"{os.getcwd()}/src")
+import replicas
+from admin.api import admin_router
 from auth.api import auth_router
 from categories.api import categories_router
-from containers import Container
-from documents.api import documents_router
+from containers import Container, engine
+from documents.api import documents_router, documents_upload_router
 from tags.api import tags_router
+from uow import RequestScopeMiddleware
+from uploads.api import uploads_router
 from users.api import users_router
 
-Container()
+container = Container()
 
-app = FastAPI()
+
+def _background_jobs() -> list[Coroutine]:
+    jobs = [
+        container.upload_session_service().run_reaper(),
+        container.history_partition_service().run_maintenance(),
+        container.blob_collection_service().run_collector(),
+    ]
+    if replicas.router:
+        jobs.append(replicas.router.run_health_checks())
+    return jobs
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    tasks = [asyncio.create_task(job) for job in _background_jobs()]
+    audit_writer = container.audit_writer()
+    if audit_writer:
+        audit_writer.start()
+    yield
+    for task in tasks:
+        task.cancel()
+    if audit_writer:
+        await audit_writer.close()
+    container.preview_service().shutdown()
+    container.content_extraction_service().shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestScopeMiddleware, engine=engine)
+if replicas.router:
+    app.add_middleware(replicas.ReadYourWritesMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -30,4 +67,7 @@ api_router.include_router(users_router)
 api_router.include_router(categories_router)
 api_router.include_router(tags_router)
 api_router.include_router(documents_router)
+api_router.include_router(documents_upload_router)
+api_router.include_router(uploads_router)
+api_router.include_router(admin_router)
 app.include_router(api_router)
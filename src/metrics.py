@@ -0,0 +1,156 @@
+"""
+In-process metrics of background pipelines, exposed by the admin API. Values
+are kept per application process, since the last start.
+"""
+
+import bisect
+import dataclasses
+import threading
+import time
+from typing import Callable
+
+
+@dataclasses.dataclass
+class ThroughputMeter:
+    documents: int = 0
+    bytes: int = 0
+    # CPU time spent by the workers, and wall time of the jobs
+    cpu_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    started_at: float = dataclasses.field(default_factory=time.monotonic)
+    lock: threading.Lock = dataclasses.field(default_factory=threading.Lock, repr=False)
+
+    def record(
+        self, size: int, cpu_seconds: float, wall_seconds: float, documents: int = 1
+    ):
+        with self.lock:
+            self.documents += documents
+            self.bytes += size
+            self.cpu_seconds += cpu_seconds
+            self.wall_seconds += wall_seconds
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            uptime = time.monotonic() - self.started_at
+            return {
+                "documents": self.documents,
+                "bytes": self.bytes,
+                "cpu_seconds": self.cpu_seconds,
+                "wall_seconds": self.wall_seconds,
+                # Throughput of a single core busy with the pipeline
+                "documents_per_second_per_core": (
+                    self.documents / self.cpu_seconds if self.cpu_seconds else 0.0
+                ),
+                "documents_per_second": self.documents / uptime if uptime else 0.0,
+            }
+
+
+@dataclasses.dataclass
+class CheckoutMeter:
+    """
+    Connections checked out of the pool per HTTP request.
+    """
+
+    requests: int = 0
+    checkouts: int = 0
+    max_checkouts: int = 0
+    lock: threading.Lock = dataclasses.field(default_factory=threading.Lock, repr=False)
+
+    def record(self, checkouts: int):
+        with self.lock:
+            self.requests += 1
+            self.checkouts += checkouts
+            self.max_checkouts = max(self.max_checkouts, checkouts)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "checkouts": self.checkouts,
+                "checkouts_per_request": (
+                    self.checkouts / self.requests if self.requests else 0.0
+                ),
+                "max_checkouts_per_request": self.max_checkouts,
+            }
+
+
+@dataclasses.dataclass
+class Histogram:
+    """
+    Counts of values per bucket, each bucket holding the values up to its
+    bound and above the previous one. The last bucket holds values above all
+    bounds.
+    """
+
+    bounds: tuple[float, ...]
+    counts: list[int] = dataclasses.field(init=False)
+    count: int = 0
+    total: float = 0.0
+    maximum: float = 0.0
+    lock: threading.Lock = dataclasses.field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+
+    def record(self, value: float):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.total += value
+            self.maximum = max(self.maximum, value)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            buckets = {str(bound): n for bound, n in zip(self.bounds, self.counts)}
+            return {
+                "count": self.count,
+                "mean": self.total / self.count if self.count else 0.0,
+                "max": self.maximum,
+                "buckets": {**buckets, "+inf": self.counts[-1]},
+            }
+
+
+@dataclasses.dataclass
+class PoolMeter:
+    """
+    Time checkouts of a connection pool wait for a connection, in seconds, and
+    checkouts that timed out.
+    """
+
+    waits: Histogram = dataclasses.field(
+        default_factory=lambda: Histogram(
+            (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+        )
+    )
+    timeouts: int = 0
+    lock: threading.Lock = dataclasses.field(default_factory=threading.Lock, repr=False)
+
+    def record(self, wait: float, timed_out: bool = False):
+        self.waits.record(wait)
+        if timed_out:
+            with self.lock:
+                self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            timeouts = self.timeouts
+        return {"wait_seconds": self.waits.snapshot(), "timeouts": timeouts}
+
+
+_meters: dict[str, ThroughputMeter] = {}
+# Components reporting their own values, such as queue depths
+_sources: dict[str, Callable[[], dict]] = {}
+
+
+def meter(name: str) -> ThroughputMeter:
+    return _meters.setdefault(name, ThroughputMeter())
+
+
+def register(name: str, source: Callable[[], dict]):
+    _sources[name] = source
+
+
+def snapshot() -> dict[str, dict]:
+    values = {name: m.snapshot() for name, m in _meters.items()}
+    values.update((name, source()) for name, source in _sources.items())
+    return values
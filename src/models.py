@@ -1,39 +1,68 @@
+import datetime
+from typing import Optional
+
 from sqlalchemy import (
+    DDL,
+    JSON,
+    BigInteger,
     Boolean,
     Column,
+    Computed,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     Table,
     Text,
+    UniqueConstraint,
+    event,
     func,
+    text,
 )
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import Mapped, declarative_base, mapped_column, relationship
 
 Base = declarative_base()
 
+# Text search configuration of Document.search_vector, changing it requires a
+# migration of the column.
+DOCUMENT_SEARCH_CONFIG = "english"
+
+
+def _weighted_tsvector(column: str, weight: str) -> str:
+    return (
+        f"setweight(to_tsvector('{DOCUMENT_SEARCH_CONFIG}', "
+        f"coalesce({column}, '')), '{weight}')"
+    )
+
 
 class BaseEntity(Base):
     __abstract__ = True
 
-    id = Column(Integer, primary_key=True, index=True)
-    created_at = Column(DateTime, server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime, onupdate=func.now(), nullable=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, server_default=func.now(), nullable=False
+    )
+    updated_at: Mapped[Optional[datetime.datetime]] = mapped_column(
+        DateTime, onupdate=func.now(), nullable=True
+    )
 
 
 class User(BaseEntity):
     __tablename__ = "users"
-    role_id = Column(Integer, ForeignKey("roles.id"), nullable=True)
-    first_name = Column(String, nullable=True)
-    last_name = Column(String, nullable=True)
-    email = Column(String, unique=True, nullable=False)
-    password = Column(String, nullable=False)
-    phone_number = Column(String, nullable=True)
-    is_active = Column(Boolean, default=True, nullable=False)
-    is_superuser = Column(Boolean, default=False, nullable=False)
-    is_admin = Column(Boolean, default=False, nullable=False)
-    avatar = Column(String, nullable=True)
+    role_id: Mapped[Optional[int]] = mapped_column(
+        Integer, ForeignKey("roles.id"), nullable=True
+    )
+    first_name: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    last_name: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    email: Mapped[str] = mapped_column(String, unique=True, nullable=False)
+    password: Mapped[str] = mapped_column(String, nullable=False)
+    phone_number: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    is_superuser: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    is_admin: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    avatar: Mapped[Optional[str]] = mapped_column(String, nullable=True)
 
     role = relationship("Role", back_populates="users")
     documents = relationship("Document", back_populates="user")
@@ -53,7 +82,7 @@ role_permission = Table(
 class Role(BaseEntity):
     __tablename__ = "roles"
 
-    name = Column(String, unique=True, nullable=False)
+    name: Mapped[str] = mapped_column(String, unique=True, nullable=False)
     users = relationship("User", back_populates="role")
     permissions = relationship(
         "Permission", secondary=role_permission, back_populates="roles"
@@ -63,8 +92,8 @@ class Role(BaseEntity):
 class Permission(BaseEntity):
     __tablename__ = "permissions"
 
-    name = Column(String, unique=True, nullable=False)
-    label = Column(String, unique=True, nullable=False)
+    name: Mapped[str] = mapped_column(String, unique=True, nullable=False)
+    label: Mapped[str] = mapped_column(String, unique=True, nullable=False)
     roles = relationship(
         "Role", secondary=role_permission, back_populates="permissions"
     )
@@ -73,7 +102,9 @@ class Permission(BaseEntity):
 class Category(BaseEntity):
     __tablename__ = "categories"
 
-    title = Column(String(255), nullable=True, unique=True)
+    title: Mapped[Optional[str]] = mapped_column(
+        String(255), nullable=True, unique=True
+    )
     sub_categories = relationship("SubCategory", back_populates="category")
     documents = relationship("Document", back_populates="category")
 
@@ -81,8 +112,12 @@ class Category(BaseEntity):
 class SubCategory(BaseEntity):
     __tablename__ = "sub_categories"
 
-    title = Column(String(255), nullable=True, unique=True)
-    category_id = Column(Integer, ForeignKey("categories.id"))
+    title: Mapped[Optional[str]] = mapped_column(
+        String(255), nullable=True, unique=True
+    )
+    category_id: Mapped[Optional[int]] = mapped_column(
+        Integer, ForeignKey("categories.id")
+    )
     category = relationship("Category", back_populates="sub_categories")
     documents = relationship("Document", back_populates="sub_category")
 
@@ -90,63 +125,277 @@ class SubCategory(BaseEntity):
 class Tag(BaseEntity):
     __tablename__ = "tags"
 
-    title = Column(String(255), nullable=True)
+    title: Mapped[Optional[str]] = mapped_column(
+        String(255), unique=True, index=True, nullable=True
+    )
+
+
+document_tag = Table(
+    "document_tags",
+    Base.metadata,
+    Column(
+        "document_id",
+        Integer,
+        ForeignKey("documents.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Column(
+        "tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True
+    ),
+    # The primary key serves lookups by document, this index lookups by tag
+    Index("ix_document_tags_tag_id_document_id", "tag_id", "document_id"),
+)
 
 
 class Document(BaseEntity):
     __tablename__ = "documents"
 
-    name = Column(String(255))
-    user_id = Column(Integer, ForeignKey("users.id"))
-    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
-    sub_category_id = Column(Integer, ForeignKey("sub_categories.id"), nullable=True)
-    description = Column(Text, nullable=True)
-    tags = Column(String(255), nullable=True)
+    name: Mapped[Optional[str]] = mapped_column(String(255))
+    user_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("users.id"))
+    category_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("categories.id"), nullable=False
+    )
+    sub_category_id: Mapped[Optional[int]] = mapped_column(
+        Integer, ForeignKey("sub_categories.id"), nullable=True
+    )
+    description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Denormalized copy of the tags of the document (see document_tags), kept
+    # for display and search weighting. Truncated to whole tags.
+    tags: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    # Weighted search document: name (A), tags (B), description (C), maintained
+    # by the documents_search_vector_update trigger
+    search_vector: Mapped[Optional[str]] = mapped_column(TSVECTOR, nullable=True)
+    # Number of versions created so far and current version, both maintained
+    # by VersionHistoryRepository.bump_version
+    version_count: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+    current_version_id: Mapped[Optional[int]] = mapped_column(
+        Integer,
+        ForeignKey("version_histories.id", use_alter=True, ondelete="SET NULL"),
+        nullable=True,
+    )
 
     category = relationship("Category", back_populates="documents")
     sub_category = relationship("SubCategory", back_populates="documents")
     user = relationship("User", back_populates="documents")
-    version_histories = relationship("VersionHistory", back_populates="document")
+    version_histories = relationship(
+        "VersionHistory",
+        back_populates="document",
+        foreign_keys="VersionHistory.document_id",
+    )
+    current_version = relationship(
+        "VersionHistory", foreign_keys=[current_version_id], viewonly=True
+    )
     document_histories = relationship("DocumentHistory", back_populates="document")
     document_comments = relationship("DocumentComment", back_populates="document")
 
+    __table_args__ = (
+        Index("ix_documents_search_vector", search_vector, postgresql_using="gin"),
+        Index("ix_documents_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_documents_sub_category_id", "sub_category_id"),
+    )
+
+
+# A trigger rather than a generated column, which could not be added to the
+# documents table without rewriting it (see migration f2a6c3d81e40)
+_DOCUMENT_SEARCH_VECTOR = " || ".join(
+    _weighted_tsvector(f"NEW.{column}", weight)
+    for column, weight in (("name", "A"), ("tags", "B"), ("description", "C"))
+)
+event.listen(
+    Document.__table__,
+    "after_create",
+    DDL(f"""
+        CREATE FUNCTION documents_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {_DOCUMENT_SEARCH_VECTOR};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """),
+)
+event.listen(
+    Document.__table__,
+    "after_create",
+    DDL("""
+        CREATE TRIGGER documents_search_vector_update
+        BEFORE INSERT OR UPDATE OF name, tags, description ON documents
+        FOR EACH ROW EXECUTE FUNCTION documents_search_vector_update()
+        """),
+)
+
+
+class DocumentContent(BaseEntity):
+    """
+    Text extracted from the file of the current version of a document.
+    """
+
+    __tablename__ = "document_contents"
+
+    document_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("documents.id", ondelete="CASCADE"),
+        unique=True,
+        nullable=False,
+    )
+    version_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("version_histories.id"), nullable=False
+    )
+    checksum: Mapped[str] = mapped_column(String(64), index=True, nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    search_vector: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR, Computed(_weighted_tsvector("text", "D"), persisted=True)
+    )
+
+    __table_args__ = (
+        Index(
+            "ix_document_contents_search_vector",
+            search_vector,
+            postgresql_using="gin",
+        ),
+    )
+
 
 class VersionHistory(BaseEntity):
     __tablename__ = "version_histories"
 
-    document_id = Column(
+    document_id: Mapped[Optional[int]] = mapped_column(
         Integer, ForeignKey("documents.id", ondelete="SET NULL"), nullable=True
     )
-    document_name = Column(String, nullable=True)
-    current_version = Column(Boolean, default=True, nullable=False)
-    created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    document_name: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    version_number: Mapped[int] = mapped_column(Integer, nullable=False)
+    current_version: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    created_by: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id"), nullable=False
+    )
+    blob_key: Mapped[Optional[str]] = mapped_column(
+        String(64), ForeignKey("blobs.key"), nullable=True
+    )
+    size: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    checksum: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    delta_base_id: Mapped[Optional[int]] = mapped_column(
+        Integer, ForeignKey("version_histories.id"), nullable=True
+    )
+    delta_depth: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
 
     user = relationship("User", back_populates="version_histories")
-    document = relationship("Document", back_populates="version_histories")
+    document = relationship(
+        "Document", back_populates="version_histories", foreign_keys=[document_id]
+    )
+    blob = relationship("Blob", back_populates="version_histories")
+
+    __table_args__ = (
+        UniqueConstraint(
+            "document_id",
+            "version_number",
+            name="uq_version_histories_document_id_version_number",
+        ),
+        # A document has at most one current version
+        Index(
+            "ix_version_histories_document_id_current",
+            "document_id",
+            unique=True,
+            postgresql_where=text("current_version"),
+        ),
+        # Collecting a blob checks that no version references it
+        Index("ix_version_histories_blob_key", "blob_key"),
+    )
+
+
+class Blob(BaseEntity):
+    __tablename__ = "blobs"
+
+    key: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    ref_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # Compression codec, size of the uncompressed blocks and end offset of each
+    # compressed block, see documents.compression
+    encoding: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    block_size: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    blocks: Mapped[Optional[list[int]]] = mapped_column(JSON, nullable=True)
+
+    version_histories = relationship("VersionHistory", back_populates="blob")
 
 
 class DocumentHistory(BaseEntity):
     __tablename__ = "document_histories"
 
-    document_id = Column(
+    # Serial although the primary key is composite, see created_at
+    id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, index=True, autoincrement=True
+    )
+    document_id: Mapped[Optional[int]] = mapped_column(
         Integer, ForeignKey("documents.id", ondelete="SET NULL"), nullable=True
     )
-    action = Column(String, nullable=True)
-    action_by = Column(Integer, ForeignKey("users.id"), nullable=False)
-    description = Column(String, nullable=True)
+    action: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    action_by: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id"), nullable=False
+    )
+    description: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # The table is partitioned by month of created_at, which is then part of
+    # the primary key. See HistoryPartitionService.
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, server_default=func.now(), nullable=False, primary_key=True
+    )
 
     user = relationship("User", back_populates="document_histories")
     document = relationship("Document", back_populates="document_histories")
 
+    __table_args__ = (
+        Index(
+            "ix_document_histories_action_by_created_at_id",
+            "action_by",
+            "created_at",
+            "id",
+        ),
+        # Deleting a document sets its history entries' document_id to NULL
+        Index("ix_document_histories_document_id", "document_id"),
+        # Exports, by time range
+        Index("ix_document_histories_created_at_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
 
 class DocumentComment(BaseEntity):
     __tablename__ = "document_comments"
 
-    document_id = Column(
+    document_id: Mapped[Optional[int]] = mapped_column(
         Integer, ForeignKey("documents.id", ondelete="SET NULL"), nullable=True
     )
-    comment = Column(String, nullable=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    comment: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id"), nullable=False
+    )
 
     user = relationship("User", back_populates="document_comments")
     document = relationship("Document", back_populates="document_comments")
+
+    __table_args__ = (
+        Index(
+            "ix_document_comments_document_id_created_at_id",
+            "document_id",
+            "created_at",
+            "id",
+        ),
+    )
+
+
+class UploadSession(BaseEntity):
+    __tablename__ = "upload_sessions"
+
+    token: Mapped[str] = mapped_column(String(32), unique=True, nullable=False)
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id"), nullable=False
+    )
+    document_id: Mapped[Optional[int]] = mapped_column(
+        Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=True
+    )
+    filename: Mapped[str] = mapped_column(String, nullable=False)
+    total_size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    chunk_size: Mapped[int] = mapped_column(Integer, nullable=False)
+    checksum: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    document_data: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    expires_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, nullable=False, index=True
+    )
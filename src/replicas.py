@@ -0,0 +1,200 @@
+"""
+Routing of read-only work to replicas of the database.
+
+Units of work of service methods marked `read_only` run on a replica, picked
+round-robin among the replicas that passed their last health check: reachable,
+and replaying less than REPLICA_MAX_LAG seconds behind the primary. They run on
+the primary instead when no replica is healthy, when nested in a unit of work
+in progress, and for READ_YOUR_WRITES_WINDOW seconds after a write of the same
+user, who would otherwise not see their own changes.
+"""
+
+import asyncio
+import contextvars
+import functools
+import itertools
+import logging
+import math
+import time
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import Headers
+
+import database
+import settings
+from auth.schemas import TokenUserPayload
+from auth.security import extract_user_from_token
+
+logger = logging.getLogger(__name__)
+
+_read_only: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "read_only", default=False
+)
+_user_id: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+    "user_id", default=None
+)
+
+# Seconds a replica is behind, 0 when it replayed all the WAL it received
+_REPLICATION_LAG = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(
+            extract(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+        )
+    END
+    """)
+
+
+def read_only(method):
+    """
+    Mark a service method as only reading: its units of work may run on a
+    replica.
+    """
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+
+    return wrapper
+
+
+class ReplicaRouter:
+
+    def __init__(
+        self,
+        urls: list[str],
+        max_lag: float,
+        health_check_interval: float,
+        health_check_timeout: float,
+        read_your_writes_window: float,
+    ):
+        self.engines = [
+            database.create_engine(url, name=f"replica_pool_{number}")
+            for number, url in enumerate(urls)
+        ]
+        self.max_lag = max_lag
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.read_your_writes_window = read_your_writes_window
+        # Replicas are only used once checked
+        self.healthy: list[AsyncEngine] = []
+        self.turns = itertools.count()
+        # Time of the last write of users
+        self.writes: dict[int, float] = {}
+
+    def replica(self) -> Optional[AsyncEngine]:
+        """
+        Replica to run a unit of work on, None to run it on the primary.
+        """
+        if not _read_only.get() or not self.healthy or self._wrote_recently():
+            return None
+        return self.healthy[next(self.turns) % len(self.healthy)]
+
+    def _wrote_recently(self) -> bool:
+        """
+        Whether the user of the request wrote within the read-your-writes window.
+        """
+        user_id = _user_id.get()
+        if user_id is None:
+            return False
+        written = self.writes.get(user_id, -math.inf)
+        return time.monotonic() - written < self.read_your_writes_window
+
+    def record_write(self):
+        user_id = _user_id.get()
+        if user_id is None:
+            return
+        now = time.monotonic()
+        self.writes[user_id] = now
+        if len(self.writes) > 10_000:
+            expired = now - self.read_your_writes_window
+            self.writes = {u: t for u, t in self.writes.items() if t >= expired}
+
+    async def run_health_checks(self):
+        while True:
+            try:
+                await self.check_replicas()
+            except Exception:
+                logger.exception("Failed to check replicas")
+            await asyncio.sleep(self.health_check_interval)
+
+    async def check_replicas(self):
+        self.healthy = [
+            engine
+            for number, engine in enumerate(self.engines)
+            if await self._is_healthy(number, engine)
+        ]
+
+    async def _is_healthy(self, number: int, engine: AsyncEngine) -> bool:
+        try:
+            lag = await asyncio.wait_for(
+                self._replication_lag(engine), self.health_check_timeout
+            )
+        except Exception as e:
+            logger.warning("Replica %s is unavailable: %r", number, e)
+            return False
+        if lag > self.max_lag:
+            logger.warning("Replica %s is %.1fs behind", number, lag)
+            return False
+        return True
+
+    @staticmethod
+    async def _replication_lag(engine: AsyncEngine) -> float:
+        async with engine.connect() as connection:
+            return float(await connection.scalar(_REPLICATION_LAG))
+
+
+class ReadYourWritesMiddleware:
+    """
+    Identifies the user of each request from its access token, for
+    read-your-writes routing. The decoded token is kept in the request state
+    (token_user), for authentication not to decode it again.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        user = self._token_user(scope)
+        if user is not None:
+            scope.setdefault("state", {})["token_user"] = user
+        token = _user_id.set(user.id if user else None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _user_id.reset(token)
+
+    @staticmethod
+    def _token_user(scope) -> Optional[TokenUserPayload]:
+        authorization = (
+            Headers(scope=scope).get("authorization")
+            if scope["type"] == "http"
+            else None
+        )
+        if not authorization:
+            return None
+        try:
+            return extract_user_from_token(authorization.replace("Bearer ", ""))
+        except Exception:
+            # Rejected by authentication later on
+            return None
+
+
+router: Optional[ReplicaRouter] = (
+    ReplicaRouter(
+        settings.DATABASE_REPLICA_URLS,
+        max_lag=settings.REPLICA_MAX_LAG,
+        health_check_interval=settings.REPLICA_HEALTH_CHECK_INTERVAL,
+        health_check_timeout=settings.REPLICA_HEALTH_CHECK_TIMEOUT,
+        read_your_writes_window=settings.READ_YOUR_WRITES_WINDOW,
+    )
+    if settings.DATABASE_REPLICA_URLS
+    else None
+)
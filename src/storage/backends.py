@@ -0,0 +1,233 @@
+import abc
+import asyncio
+import collections
+import functools
+import itertools
+import os
+import sys
+from typing import AsyncIterator, BinaryIO, Iterable, Optional
+
+from utils.utils import io_bound_task
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class StorageBackend(abc.ABC, metaclass=abc.ABCMeta):
+    """
+    Object storage for document blobs. Keys are opaque strings, the backend
+    decides how they are laid out.
+    """
+
+    @abc.abstractmethod
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError  # pragma: no cover
+
+    @abc.abstractmethod
+    async def put_file(self, key: str, path: str):
+        """
+        Store the local file at `path` under `key`. The local file may be
+        consumed (moved) by the backend. Storing an existing key is a no-op.
+        """
+        raise NotImplementedError  # pragma: no cover
+
+    @abc.abstractmethod
+    def read(
+        self, key: str, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Stream the bytes of an object, from `start` (inclusive) to `end`
+        (exclusive, defaults to the end of the object).
+        """
+        raise NotImplementedError  # pragma: no cover
+
+    @abc.abstractmethod
+    async def delete(self, key: str):
+        """
+        Delete an object. Deleting a missing key is a no-op.
+        """
+        raise NotImplementedError  # pragma: no cover
+
+    def local_path(self, key: str) -> Optional[str]:
+        """
+        Path of the object on the local filesystem, if any. Used to serve files
+        with zero-copy transfers.
+        """
+        return None
+
+
+class LocalStorageBackend(StorageBackend):
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        # Shard in two directory levels (ab/cd/abcd...) to keep directories small
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    async def exists(self, key: str) -> bool:
+        return await io_bound_task(os.path.exists, self._path(key))
+
+    async def put_file(self, key: str, path: str):
+        target = self._path(key)
+        if await io_bound_task(os.path.exists, target):
+            return
+        await io_bound_task(
+            functools.partial(os.makedirs, exist_ok=True), os.path.dirname(target)
+        )
+        await io_bound_task(os.replace, path, target)
+
+    async def read(
+        self, key: str, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        f = await io_bound_task(open, self._path(key), "rb")
+        try:
+            await io_bound_task(f.seek, start)
+            length = sys.maxsize if end is None else end - start
+            async for chunk in self._read_file(f, length):
+                yield chunk
+        finally:
+            await io_bound_task(f.close)
+
+    @staticmethod
+    async def _read_file(f: BinaryIO, length: int) -> AsyncIterator[bytes]:
+        """
+        Read up to `length` bytes of a file, from its current position.
+        """
+        while length > 0:
+            chunk = await io_bound_task(f.read, min(READ_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+    async def delete(self, key: str):
+        try:
+            await io_bound_task(os.remove, self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Backend for S3 compatible object stores (AWS S3, MinIO, ...). Uploads use
+    parallel multipart transfers and reads are split in ranged GETs fetched
+    concurrently. Requires the optional `boto3` dependency.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        region_name: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+        part_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 8,
+    ):
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region_name,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            config=Config(max_pool_connections=max_concurrency * 2),
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=part_size,
+            multipart_chunksize=part_size,
+            max_concurrency=max_concurrency,
+        )
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _head(self, key: str) -> Optional[dict]:
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def _get_range(self, key: str, start: int, end: int) -> bytes:
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=self._key(key), Range=f"bytes={start}-{end - 1}"
+        )
+        return response["Body"].read()
+
+    async def exists(self, key: str) -> bool:
+        return await io_bound_task(self._head, key) is not None
+
+    async def put_file(self, key: str, path: str):
+        if await self.exists(key):
+            return
+        upload = functools.partial(
+            self.client.upload_file,
+            path,
+            self.bucket,
+            self._key(key),
+            Config=self.transfer_config,
+        )
+        await io_bound_task(upload)
+
+    async def delete(self, key: str):
+        await io_bound_task(
+            functools.partial(
+                self.client.delete_object, Bucket=self.bucket, Key=self._key(key)
+            )
+        )
+
+    async def read(
+        self, key: str, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        if end is None:
+            end = await self._size(key)
+        parts = (
+            asyncio.ensure_future(
+                io_bound_task(
+                    self._get_range, key, offset, min(offset + self.part_size, end)
+                )
+            )
+            for offset in range(start, end, self.part_size)
+        )
+        async for part in self._gather_in_order(parts):
+            yield part
+
+    async def _size(self, key: str) -> int:
+        head = await io_bound_task(self._head, key)
+        if head is None:
+            raise FileNotFoundError(key)
+        return head["ContentLength"]
+
+    async def _gather_in_order(
+        self, parts: Iterable[asyncio.Future]
+    ) -> AsyncIterator[bytes]:
+        """
+        Yield parts in order as soon as they are available, keeping at most
+        `max_concurrency` of them in flight. `parts` is consumed lazily, each
+        part is started when taken from it.
+        """
+        parts = iter(parts)
+        pending = collections.deque(itertools.islice(parts, self.max_concurrency))
+        try:
+            while pending:
+                part = await pending.popleft()
+                pending.extend(itertools.islice(parts, 1))
+                yield part
+        finally:
+            for future in pending:
+                future.cancel()
@@ -15,6 +15,7 @@ from users.permissions import (
     CAN_EDIT_TAG,
     CAN_MANAGE_TAG,
 )
+from utils import projections
 from utils.schemas import PaginationParams
 
 tags_router = APIRouter(prefix="/tags", tags=["tags"])
@@ -28,15 +29,18 @@ async def get_tags(
     current_user: TokenUserPayload = Depends(get_user),
 ):
     if helpers.is_authorized(current_user, CAN_MANAGE_TAG):
-        tags = await tag_service.get_tags(
+        page = await tag_service.get_tags(
             pagination_params.page, pagination_params.size
         )
-        total = await tag_service.count_tags()
-        return TagPaginationResponse(
-            total=total,
-            current=pagination_params.page,
-            size=pagination_params.size,
-            data=tags,
+        return projections.json_response(
+            TagPaginationResponse,
+            {
+                "total": page.total,
+                "total_exact": page.exact,
+                "current": pagination_params.page,
+                "size": pagination_params.size,
+                "data": page.rows,
+            },
         )
 
 
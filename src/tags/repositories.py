@@ -3,7 +3,8 @@ from typing import Optional
 from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from models import Tag
+from models import Document, Tag, document_tag
+from utils import pagination
 
 
 class TagRepository:
@@ -11,11 +12,29 @@ class TagRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def get_tags(self, page: int, size: int) -> list[Tag]:
-        result = await self.session.scalars(
-            select(Tag).offset((page - 1) * size).limit(size).order_by(Tag.title)
+    async def get_tags(self, page: int, size: int) -> pagination.OffsetPage:
+        """
+        Page of tags, with the number of documents of each tag.
+        """
+        # Counted per tag of the page only, on the (tag_id, document_id) index
+        document_count = (
+            select(func.count())
+            .where(document_tag.c.tag_id == Tag.id)
+            .scalar_subquery()
+        )
+        return await pagination.offset_page(
+            self.session,
+            select(
+                Tag.id,
+                Tag.title,
+                Tag.created_at,
+                Tag.updated_at,
+                document_count.label("document_count"),
+            ).order_by(Tag.title),
+            Tag.__tablename__,
+            page,
+            size,
         )
-        return list(result.all())
 
     async def create_tag(self, data: dict) -> Optional[Tag]:
         stmt = insert(Tag).values(**data).returning(Tag)
@@ -25,11 +44,35 @@ class TagRepository:
     async def update_tag(self, tag_id: int, data: dict) -> Optional[Tag]:
         stmt = update(Tag).where(Tag.id == tag_id).values(**data).returning(Tag)
         result = await self.session.execute(stmt)
-        return result.scalar_one_or_none()
+        tag = result.scalar_one_or_none()
+        await self._refresh_document_tags(
+            select(document_tag.c.document_id).where(document_tag.c.tag_id == tag_id)
+        )
+        return tag
 
     async def delete_tag(self, tag_id: int):
+        result = await self.session.execute(
+            delete(document_tag)
+            .where(document_tag.c.tag_id == tag_id)
+            .returning(document_tag.c.document_id)
+        )
+        document_ids = list(result.scalars().all())
         await self.session.execute(delete(Tag).where(Tag.id == tag_id))
+        if document_ids:
+            await self._refresh_document_tags(document_ids)
 
-    async def count_tags(self) -> int:
-        result = await self.session.execute(select(func.count()).select_from(Tag))
-        return result.scalar_one()
+    async def _refresh_document_tags(self, document_ids):
+        """
+        Rebuild the denormalized tags of documents from document_tags.
+        """
+        titles = (
+            select(func.left(func.string_agg(Tag.title, ","), 255))
+            .join(document_tag, document_tag.c.tag_id == Tag.id)
+            .where(document_tag.c.document_id == Document.id)
+            .scalar_subquery()
+        )
+        await self.session.execute(
+            update(Document)
+            .where(Document.id.in_(document_ids))
+            .values(tags=func.coalesce(titles, ""))
+        )
@@ -19,6 +19,7 @@ class TagResponse(BaseModel):
     title: str
     created_at: datetime
     updated_at: Optional[datetime]
+    document_count: int = 0
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -2,8 +2,10 @@ from dependency_injector.wiring import Provide
 
 from auth.schemas import TokenUserPayload
 from models import Tag
+from replicas import read_only
 from tags.schemas import TagCreate, TagUpdate
 from tags.uow import TagUnitOfWork
+from utils import pagination
 
 
 class TagService:
@@ -11,11 +13,8 @@ class TagService:
     def __init__(self, uow: TagUnitOfWork = Provide["tag_uow"]):
         self.uow = uow
 
-    async def count_tags(self) -> int:
-        async with self.uow:
-            return await self.uow.repository.count_tags()
-
-    async def get_tags(self, page: int, size: int) -> list[Tag]:
+    @read_only
+    async def get_tags(self, page: int, size: int) -> pagination.OffsetPage:
         async with self.uow:
             return await self.uow.repository.get_tags(page, size)
 
@@ -1,8 +1,107 @@
 import abc
-from typing import Any, Callable
+import asyncio
+import contextvars
+from typing import Any, Callable, Optional
 
 from dependency_injector.wiring import Provide, inject
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+import metrics
+import replicas
+
+checkout_meter = metrics.CheckoutMeter()
+metrics.register("connection_checkouts", checkout_meter.snapshot)
+
+
+class RequestScope:
+    """
+    Database connection shared by the units of work of a request, checked out
+    on first use. Only units of work of the task handling the request use it:
+    tasks it spawns (gathered coroutines, background jobs) could otherwise run
+    statements on the connection concurrently.
+    """
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.task = asyncio.current_task()
+        self.connection: Optional[AsyncConnection] = None
+        # Units of work using the connection. They all run in the request's
+        # task, so each one is nested in those before it: this is the depth of
+        # the innermost one.
+        self.depth = 0
+        self.closing = False
+        self.checkouts = 0
+
+    async def acquire(self) -> Optional[AsyncConnection]:
+        if self.closing or asyncio.current_task() is not self.task:
+            return None
+        if self.connection is None:
+            self.connection = await self.engine.connect()
+        self.depth += 1
+        return self.connection
+
+    async def release(self):
+        self.depth -= 1
+        if self.closing and not self.depth:
+            await self._close()
+
+    async def close(self):
+        """
+        Return the connection to the pool once units of work in progress are
+        done. Later units of work use connections of their own.
+        """
+        self.closing = True
+        if not self.depth:
+            await self._close()
+
+    async def _close(self):
+        if self.connection is not None:
+            connection, self.connection = self.connection, None
+            await connection.close()
+
+
+_request_scope: contextvars.ContextVar[Optional[RequestScope]] = contextvars.ContextVar(
+    "request_scope", default=None
+)
+
+
+class RequestScopeMiddleware:
+    """
+    Runs each HTTP request in a RequestScope, until the response starts: bodies
+    streamed afterwards use connections of their own rather than holding the
+    request's one. Pool checkouts per request are reported by the metrics.
+    """
+
+    def __init__(self, app, engine: AsyncEngine):
+        self.app = app
+        self.engine = engine
+        event.listen(engine.sync_engine, "checkout", self._count_checkout)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_scope = RequestScope(self.engine)
+
+        async def send_in_scope(message):
+            if message["type"] == "http.response.start":
+                await request_scope.close()
+            await send(message)
+
+        token = _request_scope.set(request_scope)
+        try:
+            await self.app(scope, receive, send_in_scope)
+        finally:
+            _request_scope.reset(token)
+            await request_scope.close()
+            checkout_meter.record(request_scope.checkouts)
+
+    @staticmethod
+    def _count_checkout(*_):
+        request_scope = _request_scope.get()
+        if request_scope is not None:
+            request_scope.checkouts += 1
 
 
 class UnitOfWork(abc.ABC, metaclass=abc.ABCMeta):
@@ -31,17 +130,61 @@ class BaseUnitOfWork(UnitOfWork):
         session_factory: Callable[[], Any] = Provide["DEFAULT_SESSION_FACTORY"],
     ):
         self.session_factory = session_factory()
+        self.scope: Optional[RequestScope] = None
+        # Whether the unit of work runs within the transaction of an enclosing
+        # one, in a savepoint
+        self.nested = False
 
     async def __aenter__(self):
-        self.session: AsyncSession = self.session_factory
+        self.session: AsyncSession = await self._open_session(_request_scope.get())
         return await super().__aenter__()
 
+    async def _open_session(
+        self, request_scope: Optional[RequestScope]
+    ) -> AsyncSession:
+        replica = self._replica(request_scope)
+        if replica is not None:
+            return AsyncSession(bind=replica, expire_on_commit=False)
+        if request_scope is None:
+            return self.session_factory
+        connection = await request_scope.acquire()
+        if connection is None:
+            return self.session_factory
+        # Within the transaction of an enclosing unit of work, commit and
+        # rollback apply to a savepoint
+        self.scope = request_scope
+        self.nested = request_scope.depth > 1
+        return AsyncSession(
+            bind=connection,
+            expire_on_commit=False,
+            join_transaction_mode="create_savepoint",
+        )
+
+    @staticmethod
+    def _replica(request_scope: Optional[RequestScope]) -> Optional[AsyncEngine]:
+        # Units of work nested in one on the request's connection share it
+        if replicas.router and not (request_scope and request_scope.depth):
+            return replicas.router.replica()
+        return None
+
     async def __aexit__(self, *args):
         await super().__aexit__(*args)
         await self.session.aclose()
+        self.nested = False
+        if self.scope is not None:
+            scope, self.scope = self.scope, None
+            await scope.release()
 
     async def commit(self):
+        """
+        Commit the transaction or, when nested, release the savepoint: changes
+        are then durable, and visible to other connections, only once the
+        outermost unit of work commits. Writes are recorded for read-your-writes
+        routing by the outermost commit only.
+        """
         await self.session.commit()
+        if replicas.router and not self.nested:
+            replicas.router.record_write()
 
     async def rollback(self):
         await self.session.rollback()
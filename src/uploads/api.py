@@ -0,0 +1,92 @@
+from dependency_injector.wiring import Provide, inject
+from fastapi import APIRouter, Depends
+from starlette import status
+from starlette.requests import Request
+from starlette.responses import Response
+
+from auth import helpers
+from auth.schemas import TokenUserPayload
+from auth.security import get_user
+from uploads.schemas import UploadSessionCreate, UploadSessionResponse
+from uploads.services import UploadSessionService
+from users.permissions import (
+    CAN_CREATE_DOCUMENT,
+    CAN_CREATE_MY_DOCUMENT,
+    CAN_CREATE_VERSION,
+)
+
+uploads_router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+
+@uploads_router.post("", response_model=UploadSessionResponse)
+@inject
+async def create_upload_session(
+    session_create: UploadSessionCreate,
+    current_user: TokenUserPayload = Depends(get_user),
+    upload_session_service: UploadSessionService = Depends(
+        Provide["upload_session_service"]
+    ),
+):
+    permissions = (
+        (CAN_CREATE_VERSION,)
+        if session_create.document_id
+        else (CAN_CREATE_DOCUMENT, CAN_CREATE_MY_DOCUMENT)
+    )
+    if helpers.is_authorized(current_user, *permissions):
+        return await upload_session_service.create_upload_session(
+            current_user, session_create
+        )
+
+
+@uploads_router.get("/{token}", response_model=UploadSessionResponse)
+@inject
+async def get_upload_session(
+    token: str,
+    current_user: TokenUserPayload = Depends(get_user),
+    upload_session_service: UploadSessionService = Depends(
+        Provide["upload_session_service"]
+    ),
+):
+    return await upload_session_service.get_upload_session(current_user, token)
+
+
+@uploads_router.put("/{token}/chunks/{index}")
+@inject
+async def upload_chunk(
+    token: str,
+    index: int,
+    request: Request,
+    current_user: TokenUserPayload = Depends(get_user),
+    upload_session_service: UploadSessionService = Depends(
+        Provide["upload_session_service"]
+    ),
+):
+    await upload_session_service.upload_chunk(
+        current_user, token, index, request.stream()
+    )
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@uploads_router.post("/{token}/finalize")
+@inject
+async def finalize_upload_session(
+    token: str,
+    current_user: TokenUserPayload = Depends(get_user),
+    upload_session_service: UploadSessionService = Depends(
+        Provide["upload_session_service"]
+    ),
+):
+    return await upload_session_service.finalize_upload_session(current_user, token)
+
+
+@uploads_router.delete("/{token}")
+@inject
+async def abort_upload_session(
+    token: str,
+    current_user: TokenUserPayload = Depends(get_user),
+    upload_session_service: UploadSessionService = Depends(
+        Provide["upload_session_service"]
+    ),
+):
+    await upload_session_service.abort_upload_session(current_user, token)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,78 @@
+import functools
+import os
+import shutil
+import uuid
+from typing import AsyncIterator, BinaryIO
+
+from fastapi import HTTPException
+from starlette import status
+
+import settings
+from utils.utils import io_bound_task
+
+
+def session_dir(token: str) -> str:
+    return os.path.join(settings.UPLOAD_SESSION_DIR, token)
+
+
+def chunk_path(token: str, index: int) -> str:
+    return os.path.join(session_dir(token), str(index))
+
+
+async def write_chunk(
+    token: str, index: int, stream: AsyncIterator[bytes], expected_size: int
+):
+    """
+    Write one chunk of an upload session. The chunk is streamed into a private
+    part file which is only renamed to its final name once exactly
+    `expected_size` bytes were received, so a dropped connection never leaves a
+    partial chunk behind.
+    """
+    await io_bound_task(
+        functools.partial(os.makedirs, exist_ok=True), session_dir(token)
+    )
+    part_path = f"{chunk_path(token, index)}.{uuid.uuid4().hex}.part"
+    f = await io_bound_task(open, part_path, "wb")
+    try:
+        size = await _write_stream(f, stream, index, expected_size)
+        if size != expected_size:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Chunk {index} must be {expected_size} bytes, got {size}",
+            )
+    except BaseException:
+        await io_bound_task(f.close)
+        await io_bound_task(os.remove, part_path)
+        raise
+    await io_bound_task(f.close)
+    await io_bound_task(os.replace, part_path, chunk_path(token, index))
+
+
+async def _write_stream(
+    f: BinaryIO, stream: AsyncIterator[bytes], index: int, expected_size: int
+) -> int:
+    size = 0
+    async for data in stream:
+        size += len(data)
+        if size > expected_size:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Chunk {index} must be {expected_size} bytes",
+            )
+        await io_bound_task(f.write, data)
+    return size
+
+
+async def received_chunks(token: str) -> list[int]:
+    """
+    Indexes of the chunks fully received for a session, in ascending order.
+    """
+    try:
+        names = await io_bound_task(os.listdir, session_dir(token))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name) for name in names if name.isdigit())
+
+
+async def remove_session(token: str):
+    await io_bound_task(shutil.rmtree, session_dir(token), True)
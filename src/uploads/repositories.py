@@ -0,0 +1,60 @@
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import UploadSession
+
+
+class UploadSessionRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create_upload_session(self, data: dict) -> UploadSession:
+        stmt = insert(UploadSession).values(**data).returning(UploadSession)
+        result = await self.session.execute(stmt)
+        return result.scalar_one()
+
+    async def get_upload_session(self, token: str) -> Optional[UploadSession]:
+        """
+        Upload session of a token, unless it expired.
+        """
+        result = await self.session.scalars(
+            select(UploadSession).where(
+                UploadSession.token == token, UploadSession.expires_at > func.now()
+            )
+        )
+        return result.first()
+
+    async def claim_upload_session(
+        self, token: str, user_id: int
+    ) -> Optional[UploadSession]:
+        """
+        Delete an unexpired upload session of a user and return it. Only one of
+        concurrent claims of a session gets it.
+        """
+        result = await self.session.scalars(
+            delete(UploadSession)
+            .where(
+                UploadSession.token == token,
+                UploadSession.user_id == user_id,
+                UploadSession.expires_at > func.now(),
+            )
+            .returning(UploadSession)
+        )
+        return result.first()
+
+    async def delete_upload_session(self, token: str):
+        await self.session.execute(
+            delete(UploadSession).where(UploadSession.token == token)
+        )
+
+    async def delete_expired_upload_sessions(self) -> list[str]:
+        stmt = (
+            delete(UploadSession)
+            .where(UploadSession.expires_at < func.now())
+            .returning(UploadSession.token)
+        )
+        result = await self.session.scalars(stmt)
+        return list(result.all())
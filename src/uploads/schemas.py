@@ -0,0 +1,39 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field, model_validator
+
+
+class UploadDocumentData(BaseModel):
+    name: str
+    category_id: int
+    sub_category_id: Optional[int] = None
+    description: Optional[str] = None
+    tags: Optional[list[str]] = None
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    total_size: int = Field(gt=0)
+    chunk_size: Optional[int] = Field(default=None, gt=0)
+    checksum: Optional[str] = Field(default=None, min_length=64, max_length=64)
+    document_id: Optional[int] = None
+    document: Optional[UploadDocumentData] = None
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if (self.document_id is None) == (self.document is None):
+            raise ValueError("Exactly one of document_id or document must be set")
+        return self
+
+
+class UploadSessionResponse(BaseModel):
+    token: str
+    filename: str
+    document_id: Optional[int]
+    total_size: int
+    chunk_size: int
+    chunk_count: int
+    received_chunks: list[int]
+    received_bytes: int
+    expires_at: datetime
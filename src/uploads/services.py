@@ -0,0 +1,222 @@
+import asyncio
+import datetime
+import logging
+import math
+import uuid
+from typing import AsyncIterator
+
+from dependency_injector.wiring import Provide
+from fastapi import HTTPException
+from sqlalchemy import func
+from starlette import status
+
+import settings
+from auth.schemas import TokenUserPayload
+from documents import files
+from documents.schemas import DocumentCreate, VersionHistoryCreate
+from documents.services import DocumentService
+from models import UploadSession
+from uploads import chunks
+from uploads.schemas import UploadSessionCreate, UploadSessionResponse
+from uploads.uow import UploadSessionUnitOfWork
+
+logger = logging.getLogger(__name__)
+
+
+class UploadSessionService:
+
+    def __init__(
+        self,
+        uow: UploadSessionUnitOfWork = Provide["upload_session_uow"],
+        document_service: DocumentService = Provide["document_service"],
+    ):
+        self.uow = uow
+        self.document_service = document_service
+
+    async def create_upload_session(
+        self, current_user: TokenUserPayload, session_create: UploadSessionCreate
+    ) -> UploadSessionResponse:
+        if session_create.total_size > settings.UPLOAD_MAX_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=(
+                    "File exceeds the maximum upload size of "
+                    f"{settings.UPLOAD_MAX_SIZE} bytes"
+                ),
+            )
+        chunk_size = min(
+            session_create.chunk_size or settings.UPLOAD_SESSION_CHUNK_SIZE,
+            settings.UPLOAD_SESSION_MAX_CHUNK_SIZE,
+        )
+        document = session_create.document
+        ttl = datetime.timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+        data = {
+            "token": uuid.uuid4().hex,
+            "user_id": current_user.id,
+            "document_id": session_create.document_id,
+            "filename": session_create.filename,
+            "total_size": session_create.total_size,
+            "chunk_size": chunk_size,
+            "checksum": session_create.checksum,
+            "document_data": document.model_dump() if document else None,
+            "expires_at": func.now() + ttl,
+        }
+        async with self.uow:
+            upload_session = await self.uow.repository.create_upload_session(data)
+            await self.uow.commit()
+        return await self._to_response(upload_session)
+
+    async def get_upload_session(
+        self, current_user: TokenUserPayload, token: str
+    ) -> UploadSessionResponse:
+        upload_session = await self._get_owned_session(current_user, token)
+        return await self._to_response(upload_session)
+
+    async def upload_chunk(
+        self,
+        current_user: TokenUserPayload,
+        token: str,
+        index: int,
+        stream: AsyncIterator[bytes],
+    ):
+        upload_session = await self._get_owned_session(current_user, token)
+        chunk_count = self._chunk_count(upload_session)
+        if not 0 <= index < chunk_count:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Chunk index must be between 0 and {chunk_count - 1}",
+            )
+        await chunks.write_chunk(
+            token, index, stream, self._chunk_length(upload_session, index)
+        )
+
+    async def finalize_upload_session(self, current_user: TokenUserPayload, token: str):
+        """
+        Assemble the received chunks into a new document or version. The
+        session is claimed (deleted) before, so that concurrent calls do not
+        create it twice: it cannot be finalized again, even if this fails.
+        """
+        upload_session = await self._get_owned_session(current_user, token)
+        await self._check_received(upload_session)
+        async with self.uow:
+            claimed = await self.uow.repository.claim_upload_session(
+                token, current_user.id
+            )
+            await self.uow.commit()
+        if not claimed:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        try:
+            staged = await self._stage_session(claimed)
+            return await self._create_from_staged_file(current_user, claimed, staged)
+        finally:
+            await chunks.remove_session(token)
+
+    async def abort_upload_session(self, current_user: TokenUserPayload, token: str):
+        await self._get_owned_session(current_user, token)
+        await self._delete_session(token)
+
+    async def reap_expired_upload_sessions(self) -> int:
+        async with self.uow:
+            tokens = await self.uow.repository.delete_expired_upload_sessions()
+            await self.uow.commit()
+        for token in tokens:
+            await chunks.remove_session(token)
+        if tokens:
+            logger.info("Reaped %s expired upload sessions", len(tokens))
+        return len(tokens)
+
+    async def run_reaper(self):
+        """
+        Periodically remove abandoned upload sessions and their chunks.
+        """
+        while True:
+            try:
+                await self.reap_expired_upload_sessions()
+            except Exception:
+                logger.exception("Failed to reap expired upload sessions")
+            await asyncio.sleep(settings.UPLOAD_SESSION_REAPER_INTERVAL)
+
+    async def _get_owned_session(
+        self, current_user: TokenUserPayload, token: str
+    ) -> UploadSession:
+        async with self.uow:
+            upload_session = await self.uow.repository.get_upload_session(token)
+        if not upload_session or upload_session.user_id != current_user.id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        return upload_session
+
+    async def _check_received(self, upload_session: UploadSession):
+        received = await chunks.received_chunks(upload_session.token)
+        missing = set(range(self._chunk_count(upload_session))) - set(received)
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Missing chunks: {sorted(missing)}",
+            )
+
+    async def _stage_session(self, upload_session: UploadSession) -> files.StagedFile:
+        received = await chunks.received_chunks(upload_session.token)
+        staged = await files.stage_parts(
+            [chunks.chunk_path(upload_session.token, index) for index in received],
+            upload_session.filename,
+        )
+        if upload_session.checksum and upload_session.checksum != staged.checksum:
+            await files.discard(staged)
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Checksum of the uploaded file does not match",
+            )
+        return staged
+
+    async def _create_from_staged_file(
+        self,
+        current_user: TokenUserPayload,
+        upload_session: UploadSession,
+        staged: files.StagedFile,
+    ):
+        if upload_session.document_id is None:
+            document_create = DocumentCreate(
+                user_id=current_user.id, **(upload_session.document_data or {})
+            )
+            return await self.document_service.create_document_from_staged_file(
+                current_user, document_create, staged
+            )
+        version_create = VersionHistoryCreate(
+            document_id=upload_session.document_id, created_by=current_user.id
+        )
+        return await self.document_service.create_document_version_from_staged_file(
+            version_create, staged
+        )
+
+    async def _delete_session(self, token: str):
+        async with self.uow:
+            await self.uow.repository.delete_upload_session(token)
+            await self.uow.commit()
+        await chunks.remove_session(token)
+
+    async def _to_response(
+        self, upload_session: UploadSession
+    ) -> UploadSessionResponse:
+        received = await chunks.received_chunks(upload_session.token)
+        return UploadSessionResponse(
+            token=upload_session.token,
+            filename=upload_session.filename,
+            document_id=upload_session.document_id,
+            total_size=upload_session.total_size,
+            chunk_size=upload_session.chunk_size,
+            chunk_count=self._chunk_count(upload_session),
+            received_chunks=received,
+            received_bytes=sum(
+                self._chunk_length(upload_session, index) for index in received
+            ),
+            expires_at=upload_session.expires_at,
+        )
+
+    @staticmethod
+    def _chunk_count(upload_session: UploadSession) -> int:
+        return math.ceil(upload_session.total_size / upload_session.chunk_size)
+
+    @staticmethod
+    def _chunk_length(upload_session: UploadSession, index: int) -> int:
+        start = index * upload_session.chunk_size
+        return min(upload_session.chunk_size, upload_session.total_size - start)
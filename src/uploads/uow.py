@@ -0,0 +1,10 @@
+from uow import BaseUnitOfWork
+from uploads.repositories import UploadSessionRepository
+
+
+class UploadSessionUnitOfWork(BaseUnitOfWork):
+
+    async def __aenter__(self):
+        await super().__aenter__()
+        self.repository = UploadSessionRepository(self.session)
+        return self
@@ -15,9 +15,11 @@ from users.schemas import (
     RolePaginationResponse,
     RoleUpdate,
     UserCreate,
-    UserResponse, UserUpdate,
+    UserResponse,
+    UserUpdate,
 )
 from users.services import PermissionService, RoleService, UserService
+from utils import projections
 from utils.schemas import PaginationParams
 
 users_router = APIRouter(prefix="/users", tags=["users"])
@@ -64,7 +66,7 @@ async def get_permissions(
     return await permission_service.get_permissions()
 
 
-@users_router.get("/roles")
+@users_router.get("/roles", response_model=RolePaginationResponse)
 @inject
 async def get_roles(
     pagination_params: Annotated[PaginationParams, Query()],
@@ -72,15 +74,18 @@ async def get_roles(
     role_service: RoleService = Depends(Provide["role_service"]),
 ):
     if helpers.is_authorized(current_user, None):
-        roles = await role_service.get_roles(
+        page = await role_service.get_roles(
             pagination_params.page, pagination_params.size
         )
-        total = await role_service.count_roles()
-        return RolePaginationResponse(
-            total=total,
-            current=pagination_params.page,
-            size=pagination_params.size,
-            data=roles,
+        return projections.json_response(
+            RolePaginationResponse,
+            {
+                "total": page.total,
+                "total_exact": page.exact,
+                "current": pagination_params.page,
+                "size": pagination_params.size,
+                "data": page.rows,
+            },
         )
     return None
 
@@ -1,6 +1,6 @@
 from typing import Optional
 
-from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.exc import IntegrityError, NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
@@ -11,7 +11,15 @@ from errors import (
     ErrorType,
 )
 from models import Permission, Role, User
-from users.schemas import RoleCreate, UserUpdate
+from users.schemas import RoleCreate, RoleResponse, UserUpdate
+from utils import pagination, projections
+
+
+def _email_error(error: IntegrityError) -> ErrorType:
+    message = str(error.orig)
+    if ASYNCPG_EXCEPTIONS_UNIQUE_VIOLATION in message and "users_email_key" in message:
+        return ErrorType.UNIQUE_VIOLATION
+    return ErrorType.UNKNOWN_ERROR
 
 
 class UserRepository:
@@ -24,13 +32,11 @@ class UserRepository:
             result = await self.session.execute(stmt)
             return result.scalar_one()
         except IntegrityError as e:
-            if ASYNCPG_EXCEPTIONS_UNIQUE_VIOLATION in str(
-                e.orig
-            ) and "users_email_key" in str(e.orig):
-                return ErrorType.UNIQUE_VIOLATION
-        return ErrorType.UNKNOWN_ERROR
+            return _email_error(e)
 
-    async def update_user(self, user_id: int, user_update: UserUpdate) -> User | ErrorType:
+    async def update_user(
+        self, user_id: int, user_update: UserUpdate
+    ) -> User | ErrorType:
         stmt = (
             update(User)
             .where(User.id == user_id)
@@ -44,11 +50,7 @@ class UserRepository:
         except NoResultFound:
             return ErrorType.ENTITY_NOT_FOUND
         except IntegrityError as e:
-            if ASYNCPG_EXCEPTIONS_UNIQUE_VIOLATION in str(
-                e.orig
-            ) and "users_email_key" in str(e.orig):
-                return ErrorType.UNIQUE_VIOLATION
-        return ErrorType.UNKNOWN_ERROR
+            return _email_error(e)
 
     async def get_user_by_email(self, email: str) -> Optional[User]:
         stmt = (
@@ -64,11 +66,14 @@ class RoleRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def get_roles(self, page: int, size: int) -> list[Role]:
-        result = await self.session.scalars(
-            select(Role).offset((page - 1) * size).limit(size).order_by(Role.name)
+    async def get_roles(self, page: int, size: int) -> pagination.OffsetPage:
+        return await pagination.offset_page(
+            self.session,
+            select(*projections.columns(RoleResponse, Role)).order_by(Role.name),
+            Role.__tablename__,
+            page,
+            size,
         )
-        return list(result.all())
 
     async def create_role(self, role_create: RoleCreate) -> Role | ErrorType:
         stmt = (
@@ -138,10 +143,6 @@ class RoleRepository:
                 return ErrorType.UNIQUE_VIOLATION
         return ErrorType.UNKNOWN_ERROR
 
-    async def count_roles(self) -> int:
-        result = await self.session.execute(select(func.count()).select_from(Role))
-        return result.scalar_one()
-
 
 class PermissionRepository:
     def __init__(self, session: AsyncSession):
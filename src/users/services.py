@@ -5,8 +5,10 @@ from dependency_injector.wiring import Provide, inject
 
 from errors import Error, ErrorType
 from models import Role, User
+from replicas import read_only
 from users.schemas import RoleCreate, RoleUpdate, UserCreate
 from users.uow import PermissionUnitOfWork, RoleUnitOfWork, UserUnitOfWork
+from utils import pagination
 from utils.utils import cpu_bound_task
 
 
@@ -76,14 +78,15 @@ class RoleService:
 
     @inject
     def __init__(
-            self,
-            uow: RoleUnitOfWork = Provide["role_uow"],
-            permission_service: PermissionService = Provide["permission_service"],
+        self,
+        uow: RoleUnitOfWork = Provide["role_uow"],
+        permission_service: PermissionService = Provide["permission_service"],
     ):
         self.uow = uow
         self.permission_service = permission_service
 
-    async def get_roles(self, page: int, size: int) -> list[Role]:
+    @read_only
+    async def get_roles(self, page: int, size: int) -> pagination.OffsetPage:
         async with self.uow:
             return await self.uow.repository.get_roles(page, size)
 
@@ -149,7 +152,3 @@ class RoleService:
                 return Error(status_code=404, message="Role not found")
             else:
                 return Error(status_code=500, message=str(result))
-
-    async def count_roles(self) -> int:
-        async with self.uow:
-            return await self.uow.repository.count_roles()
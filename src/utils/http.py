@@ -0,0 +1,114 @@
+import re
+from typing import Optional
+from urllib.parse import quote
+
+# Characters replaced in the plain `filename` parameter of Content-Disposition
+_UNSAFE_FILENAME_CHARS = re.compile(r'[^\x20-\x7e]|["\\]')
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header against an ETag.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in tags
+
+
+def parse_single_range(
+    http_range: Optional[str], size: int
+) -> Optional[tuple[int, int]]:
+    """
+    Parse a Range header holding a single byte range.
+
+    :param http_range: value of the Range header
+    :param size: size of the representation
+    :return: (start, end) with `end` exclusive, or None when the header is
+        missing, malformed or holds several ranges (the full representation
+        should then be served)
+    :raise ValueError: when the range is not satisfiable
+    """
+    byte_range = _byte_range(http_range, size) if http_range else None
+    if byte_range is None:
+        return None
+    start, end = byte_range
+    if start >= min(end, size):
+        raise ValueError(http_range)
+    return byte_range
+
+
+def _byte_range(http_range: str, size: int) -> Optional[tuple[int, int]]:
+    units, _, range_ = http_range.partition("=")
+    if "," in range_ or "-" not in range_ or units.strip().lower() != "bytes":
+        return None
+    first, _, last = range_.strip().partition("-")
+    try:
+        return _range_bounds(first, last, size)
+    except ValueError:
+        return None
+
+
+def _range_bounds(first: str, last: str, size: int) -> tuple[int, int]:
+    if not first:
+        # Suffix range: the last bytes of the representation
+        return max(size - int(last), 0), size
+    end = min(int(last) + 1, size) if last else size
+    return int(first), end
+
+
+def accepts_encoding(accept_encoding: Optional[str], encoding: str) -> bool:
+    """
+    Whether an Accept-Encoding header allows a given content coding.
+    """
+    if not accept_encoding:
+        return False
+    codings = _content_codings(accept_encoding)
+    return codings.get(encoding, codings.get("*", 0.0)) > 0
+
+
+def _content_codings(accept_encoding: str) -> dict[str, float]:
+    """
+    Content codings of an Accept-Encoding header, with their quality value.
+    """
+    codings: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, *params = item.split(";")
+        codings.setdefault(coding.strip().lower(), _quality(params))
+    return codings
+
+
+def _quality(params: list[str]) -> float:
+    """
+    Quality value among the parameters of a header item, 1 when missing and 0
+    when malformed.
+    """
+    for param in params:
+        name, _, value = param.strip().partition("=")
+        if name.lower() == "q":
+            return _float(value)
+    return 1.0
+
+
+def _float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def content_disposition(filename: Optional[str]) -> str:
+    """
+    Content-Disposition header of an attachment. The file name is given as is
+    in an RFC 5987 `filename*` parameter, and with its non-ASCII characters
+    replaced in `filename` for clients not supporting it.
+    """
+    if not filename:
+        return "attachment"
+    fallback = _UNSAFE_FILENAME_CHARS.sub("_", filename)
+    return (
+        f'attachment; filename="{fallback}"; '
+        f"filename*=UTF-8''{quote(filename, safe='')}"
+    )
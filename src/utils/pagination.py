@@ -0,0 +1,199 @@
+import base64
+import datetime
+import json
+from typing import Any, NamedTuple, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import (
+    Row,
+    Select,
+    and_,
+    column,
+    desc,
+    func,
+    literal,
+    select,
+    table,
+    tuple_,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.sql import ColumnElement
+from sqlalchemy.sql.selectable import ScalarSelect
+from starlette import status
+
+import settings
+
+_pg_class = table("pg_class", column("oid"), column("reltuples"))
+
+# Estimated number of rows of tables (pg_class.reltuples), by table name,
+# refreshed by every offset_page query
+_row_estimates: dict[str, float] = {}
+
+
+class OffsetPage(NamedTuple):
+    rows: list[Row]
+    total: int
+    # False when the total is an estimate
+    exact: bool
+
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+    )
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    Opaque cursor holding the sort key of the last row of a page.
+    """
+    data = json.dumps(list(values), separators=(",", ":"), default=_json_default)
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, length: int) -> list[Any]:
+    """
+    Decode a cursor made by `encode_cursor`, holding `length` values.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != length:
+        raise _invalid_cursor()
+    return values
+
+
+def decode_timestamp_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    """
+    Decode a cursor on (created_at, id).
+    """
+    created_at, id_ = decode_cursor(cursor, 2)
+    try:
+        return datetime.datetime.fromisoformat(created_at), int(id_)
+    except (TypeError, ValueError):
+        raise _invalid_cursor()
+
+
+def keyset(
+    stmt: Select,
+    columns: Sequence[ColumnElement | InstrumentedAttribute],
+    after: Optional[Sequence[Any]],
+    size: int,
+    descending: bool = True,
+) -> Select:
+    """
+    Restrict a query to the page following the sort key `after`. One more row
+    than the page size is fetched, to tell whether there is a next page.
+
+    :param columns: sort key, unique (e.g. ending with the primary key)
+    """
+    if after is not None:
+        stmt = stmt.where(_following(columns, after, descending))
+    order = [desc(column) for column in columns] if descending else list(columns)
+    return stmt.order_by(*order).limit(size + 1)
+
+
+def _following(
+    columns: Sequence[ColumnElement | InstrumentedAttribute],
+    after: Sequence[Any],
+    descending: bool,
+) -> ColumnElement[bool]:
+    key, after_key = tuple_(*columns), tuple_(*after)
+    # Row comparisons do not prune partitions, bound the leading column too
+    if descending:
+        return and_(key < after_key, columns[0] <= after[0])
+    return and_(key > after_key, columns[0] >= after[0])
+
+
+def page(rows: list, size: int, *key: str) -> tuple[list, Optional[str]]:
+    """
+    Split the rows fetched by a `keyset` query into the page and the cursor of
+    the next page.
+
+    :param key: attributes of the rows making the sort key
+    """
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, encode_cursor([getattr(rows[-1], attribute) for attribute in key])
+
+
+async def offset_page(
+    session: AsyncSession, stmt: Select, table_name: str, page: int, size: int
+) -> OffsetPage:
+    """
+    Page of a query over a whole table, with the total number of rows. The
+    total is counted by an uncorrelated subquery of the page statement, run
+    once, while the table holds at most PAGINATION_EXACT_COUNT_MAX rows
+    according to the planner's estimate (pg_class.reltuples). Beyond, counting
+    would scan the whole table: the estimate is returned instead.
+
+    The estimate is read by a query of its own the first time a table is paged,
+    then refreshed by the page statements.
+    """
+    estimate = await _row_estimate(session, table_name)
+    exact = estimate <= settings.PAGINATION_EXACT_COUNT_MAX
+    count = _count(stmt)
+    page_stmt = stmt.add_columns(_reltuples(table_name).label("row_estimate"))
+    if exact:
+        page_stmt = page_stmt.add_columns(count.label("total"))
+    offset = (page - 1) * size
+    result = await session.execute(page_stmt.offset(offset).limit(size))
+    rows = list(result.all())
+
+    if not rows:
+        # Past the last page, the total was not read
+        return await _empty_page(session, count, estimate, exact)
+    _row_estimates[table_name] = rows[0].row_estimate
+    if exact:
+        return OffsetPage(rows, rows[0].total, True)
+    return OffsetPage(rows, max(int(rows[0].row_estimate), offset + len(rows)), False)
+
+
+async def _row_estimate(session: AsyncSession, table_name: str) -> float:
+    """
+    Estimated number of rows of a table, -1 if it was never analyzed.
+    """
+    if table_name not in _row_estimates:
+        result = await session.execute(
+            select(func.coalesce(_reltuples(table_name), -1))
+        )
+        _row_estimates[table_name] = result.scalar_one()
+    return _row_estimates[table_name]
+
+
+def _reltuples(table_name: str) -> ScalarSelect:
+    return (
+        select(_pg_class.c.reltuples)
+        .where(_pg_class.c.oid == func.to_regclass(table_name))
+        .scalar_subquery()
+    )
+
+
+def _count(stmt: Select) -> ScalarSelect:
+    # Counts the rows only, without computing the selected columns
+    return (
+        select(func.count())
+        .select_from(
+            stmt.with_only_columns(literal(1), maintain_column_froms=True)
+            .order_by(None)
+            .subquery()
+        )
+        .scalar_subquery()
+    )
+
+
+async def _empty_page(
+    session: AsyncSession, count: ScalarSelect, estimate: float, exact: bool
+) -> OffsetPage:
+    if exact:
+        return OffsetPage([], (await session.execute(select(count))).scalar_one(), True)
+    return OffsetPage([], max(int(estimate), 0), False)
@@ -0,0 +1,43 @@
+"""
+Read path of list endpoints that skips the ORM.
+
+Repositories select only the columns of the response model (`columns`) and
+return SQLAlchemy rows, slotted tuples without identity map or relationship
+state. Routes then validate and serialize pages in a single pass of
+pydantic-core (`json_response`), instead of FastAPI validating the returned
+model again and converting it with jsonable_encoder.
+"""
+
+import functools
+from typing import Any
+
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import inspect
+from sqlalchemy.orm import InstrumentedAttribute
+from starlette.responses import Response
+
+
+def columns(schema: type[BaseModel], entity: type) -> list[InstrumentedAttribute]:
+    """
+    Columns of `entity` that are fields of `schema`, in the order of the
+    fields. Other fields (relations, computed values) are left out.
+    """
+    column_names: list[str] = inspect(entity).columns.keys()
+    return [
+        getattr(entity, name) for name in schema.model_fields if name in column_names
+    ]
+
+
+@functools.cache
+def _adapter(schema: type) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+def json_response(schema: type, content: Any) -> Response:
+    """
+    Response of `content` (models, dicts, rows) validated as `schema` and
+    serialized to JSON, both in pydantic-core.
+    """
+    adapter = _adapter(schema)
+    value = adapter.validate_python(content, from_attributes=True)
+    return Response(adapter.dump_json(value), media_type="application/json")
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
 
@@ -10,4 +12,17 @@ class PaginationResponse(BaseModel):
     current: int = Field(ge=1)
     size: int = Field(ge=1)
     total: int = Field(ge=0)
+    # False when the total is an estimate
+    total_exact: bool = True
+    data: list
+
+
+class CursorPaginationParams(BaseModel):
+    size: int = Field(default=10, ge=1, le=100)
+    cursor: Optional[str] = None
+
+
+class CursorPaginationResponse(BaseModel):
+    size: int = Field(ge=1)
+    next_cursor: Optional[str]
     data: list
@@ -1,4 +1,5 @@
 import asyncio
+import datetime
 from concurrent.futures import ThreadPoolExecutor
 from typing import Callable
 
@@ -11,3 +12,15 @@ async def cpu_bound_task(func: Callable, *args):
     loop.
     """
     return await asyncio.get_event_loop().run_in_executor(_executor, func, *args)
+
+
+# Blocking I/O (file writes, renames, ...) runs in the same threads
+io_bound_task = cpu_bound_task
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    """
+    First day of the month `months` months after that of `month`.
+    """
+    month_index = month.year * 12 + month.month - 1 + months
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
@@ -0,0 +1,38 @@
+"""
+Number of statements run by listings on the seeded database (see conftest):
+embedded relations are loaded with the rows, not with a query per row.
+"""
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from documents.repositories import DocumentRepository
+from documents.schemas import DocumentResponse
+
+pytestmark = pytest.mark.anyio
+
+USER_ID = 42
+PAGE_SIZE = 20
+
+EXPANSIONS = [
+    pytest.param((), id="bare"),
+    pytest.param(("category",), id="category"),
+    pytest.param(
+        ("category", "sub_category", "user", "current_version"), id="everything"
+    ),
+]
+
+
+@pytest.mark.parametrize("expand", EXPANSIONS)
+async def test_documents_by_user_statements(
+    database_engine, assert_query_count, expand
+):
+    async with AsyncSession(database_engine) as session:
+        with assert_query_count(1):
+            rows = await DocumentRepository(session).get_documents_by_user(
+                USER_ID, PAGE_SIZE, expand=expand
+            )
+            documents = [DocumentResponse.model_validate(row) for row in rows]
+    assert len(documents) == PAGE_SIZE
+    for name in expand:
+        assert all(getattr(document, name) for document in documents)
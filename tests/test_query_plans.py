@@ -0,0 +1,162 @@
+"""
+Query plans of the repository queries on a seeded database (see conftest): hot
+queries must use indexes rather than scanning the large tables.
+
+Statements run by each repository call are recorded, then explained with the
+same parameters in the same transaction.
+"""
+
+import datetime
+import json
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from documents.repositories import (
+    DocumentCommentRepository,
+    DocumentContentRepository,
+    DocumentHistoryRepository,
+    DocumentRepository,
+    VersionHistoryRepository,
+)
+
+pytestmark = pytest.mark.anyio
+
+USER_ID = 42
+DOCUMENT_ID = 4242
+
+# Tables (and partitions of tables) seeded at scale
+LARGE_TABLES = (
+    "documents",
+    "document_tags",
+    "document_contents",
+    "version_histories",
+    "document_histories",
+    "document_comments",
+)
+
+# Repository, method and arguments of each query
+QUERIES = [
+    pytest.param(
+        DocumentRepository,
+        "get_documents_by_user",
+        (USER_ID, 10),
+        id="documents_by_user",
+    ),
+    pytest.param(
+        DocumentRepository,
+        "get_documents_by_user",
+        (USER_ID, 10, (datetime.datetime.now(), 0)),
+        id="documents_by_user_after",
+    ),
+    pytest.param(
+        DocumentRepository,
+        "get_documents_by_user",
+        (USER_ID, 10, None, "tag42"),
+        id="documents_by_user_and_tag",
+    ),
+    pytest.param(
+        DocumentRepository,
+        "get_documents_by_user",
+        (USER_ID, 10, None, None, ("category", "current_version")),
+        id="documents_by_user_expanded",
+    ),
+    pytest.param(
+        DocumentRepository,
+        "get_first_document_by_subcategory",
+        (7,),
+        id="first_document_by_subcategory",
+    ),
+    pytest.param(
+        DocumentRepository, "search_documents", ("4242", 10), id="search_documents"
+    ),
+    pytest.param(
+        VersionHistoryRepository,
+        "get_current_version_by_document",
+        (DOCUMENT_ID,),
+        id="current_version_by_document",
+    ),
+    pytest.param(
+        VersionHistoryRepository,
+        "get_versions_by_document",
+        (DOCUMENT_ID,),
+        id="versions_by_document",
+    ),
+    pytest.param(
+        VersionHistoryRepository,
+        "get_version_by_number",
+        (DOCUMENT_ID, 1),
+        id="version_by_number",
+    ),
+    pytest.param(
+        DocumentContentRepository,
+        "get_content_by_checksum",
+        ("0" * 32,),
+        id="content_by_checksum",
+    ),
+    pytest.param(
+        DocumentHistoryRepository,
+        "get_document_history_by_user",
+        (USER_ID, 10),
+        id="document_history_by_user",
+    ),
+    pytest.param(
+        DocumentCommentRepository,
+        "get_document_comments",
+        (DOCUMENT_ID, 10),
+        id="document_comments",
+    ),
+]
+
+
+def _plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from _plan_nodes(child)
+
+
+def _sequential_scans(plan: dict) -> list[str]:
+    """
+    Large tables scanned sequentially by a plan.
+    """
+    return [
+        node["Relation Name"]
+        for node in _plan_nodes(plan)
+        if node["Node Type"] == "Seq Scan"
+        and node["Relation Name"].startswith(LARGE_TABLES)
+    ]
+
+
+async def _explain(engine, repository, method: str, args: tuple) -> list[dict]:
+    """
+    Plans of the statements run by a repository call.
+    """
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    async with AsyncSession(engine) as session:
+        event.listen(engine.sync_engine, "before_cursor_execute", record)
+        try:
+            await getattr(repository(session), method)(*args)
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", record)
+        connection = await session.connection()
+        plans = []
+        for statement, parameters in statements:
+            result = await connection.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {statement}", parameters
+            )
+            plan = result.scalar_one()
+            plans.append((json.loads(plan) if isinstance(plan, str) else plan)[0])
+        return plans
+
+
+@pytest.mark.parametrize("repository, method, args", QUERIES)
+async def test_query_uses_indexes(database_engine, repository, method, args):
+    plans = await _explain(database_engine, repository, method, args)
+    assert plans
+    for plan in plans:
+        assert not _sequential_scans(plan["Plan"]), json.dumps(plan, indent=2)
@@ -0,0 +1,101 @@
+"""
+Routing of read-only work to a streaming replica (TEST_REPLICA_URL, see
+conftest), with requests identified by ReadYourWritesMiddleware.
+"""
+
+from typing import Optional
+
+import jwt
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import settings
+from replicas import ReadYourWritesMiddleware, ReplicaRouter, read_only
+
+pytestmark = pytest.mark.anyio
+
+WRITER_ID = 1
+READER_ID = 2
+
+
+@pytest.fixture
+async def replica_router(replica_url):
+    router = ReplicaRouter(
+        [replica_url],
+        max_lag=settings.REPLICA_MAX_LAG,
+        health_check_interval=settings.REPLICA_HEALTH_CHECK_INTERVAL,
+        health_check_timeout=settings.REPLICA_HEALTH_CHECK_TIMEOUT,
+        read_your_writes_window=60,
+    )
+    try:
+        yield router
+    finally:
+        for engine in router.engines:
+            await engine.dispose()
+
+
+def _access_token(user_id: int) -> str:
+    user = {
+        "id": user_id,
+        "email": f"user{user_id}@example.com",
+        "is_active": True,
+        "is_superuser": False,
+        "is_admin": False,
+        "role": None,
+        "permissions": [],
+    }
+    return jwt.encode(
+        {"user": user}, key=settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM
+    )
+
+
+@read_only
+async def _route(router: ReplicaRouter) -> Optional[AsyncEngine]:
+    return router.replica()
+
+
+async def _request(router: ReplicaRouter, user_id: int, write: bool = False):
+    """
+    Engine a read-only unit of work of a request of the user runs on, None for
+    the primary. With `write`, the request commits a write first.
+    """
+    routed = []
+
+    async def app(scope, receive, send):
+        if write:
+            router.record_write()
+        routed.append(await _route(router))
+
+    headers = [(b"authorization", f"Bearer {_access_token(user_id)}".encode())]
+    await ReadYourWritesMiddleware(app)(
+        {"type": "http", "headers": headers}, None, None
+    )
+    return routed[0]
+
+
+async def _in_recovery(engine: AsyncEngine) -> bool:
+    async with engine.connect() as connection:
+        return await connection.scalar(text("SELECT pg_is_in_recovery()"))
+
+
+async def test_reads_run_on_replica(replica_router):
+    assert await _request(replica_router, READER_ID) is None
+    await replica_router.check_replicas()
+    engine = await _request(replica_router, READER_ID)
+    assert engine is not None
+    assert await _in_recovery(engine)
+
+
+async def test_reads_after_own_write_run_on_primary(replica_router):
+    await replica_router.check_replicas()
+    assert await _request(replica_router, WRITER_ID, write=True) is None
+    assert await _request(replica_router, WRITER_ID) is None
+    assert await _request(replica_router, READER_ID) is not None
+
+
+async def test_lagging_replica_is_not_used(replica_router):
+    replica_router.max_lag = -1
+    await replica_router.check_replicas()
+    assert not replica_router.healthy
+    assert await _request(replica_router, READER_ID) is None
@@ -0,0 +1,112 @@
+"""
+Conformance suite of the storage backends: every backend must pass the same
+tests. The S3 backend runs against an in-memory S3 (moto).
+"""
+
+import os
+
+import pytest
+
+from storage.backends import LocalStorageBackend, S3StorageBackend, StorageBackend
+
+# Large enough for multipart uploads and several ranged GETs on S3
+PART_SIZE = 5 * 1024 * 1024
+DATA = os.urandom(2 * PART_SIZE + 1234)
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def local_backend(tmp_path):
+    return LocalStorageBackend(str(tmp_path / "blobs"))
+
+
+@pytest.fixture
+def s3_backend():
+    pytest.importorskip("boto3")
+    moto = pytest.importorskip("moto")
+    with moto.mock_aws():
+        backend = S3StorageBackend(
+            "documents",
+            prefix="blobs/",
+            region_name="us-east-1",
+            part_size=PART_SIZE,
+            max_concurrency=2,
+        )
+        backend.client.create_bucket(Bucket="documents")
+        yield backend
+
+
+@pytest.fixture(params=["local_backend", "s3_backend"])
+def backend(request) -> StorageBackend:
+    return request.getfixturevalue(request.param)
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    def write(data: bytes = DATA) -> str:
+        path = tmp_path / f"file-{len(os.listdir(tmp_path))}"
+        path.write_bytes(data)
+        return str(path)
+
+    return write
+
+
+async def read_all(backend: StorageBackend, key: str, *args) -> bytes:
+    return b"".join([chunk async for chunk in backend.read(key, *args)])
+
+
+async def test_put_file(backend, data_file):
+    assert not await backend.exists("key")
+    await backend.put_file("key", data_file())
+    assert await backend.exists("key")
+    assert await read_all(backend, "key") == DATA
+
+
+async def test_put_existing_key_is_noop(backend, data_file):
+    await backend.put_file("key", data_file())
+    await backend.put_file("key", data_file(b"other content"))
+    assert await read_all(backend, "key") == DATA
+
+
+@pytest.mark.parametrize(
+    "start, end",
+    [
+        (0, 1),
+        (10, PART_SIZE + 10),
+        (PART_SIZE - 1, PART_SIZE + 1),
+        (len(DATA) - 10, len(DATA)),
+        (len(DATA) - 10, None),
+        (5, 5),
+    ],
+)
+async def test_read_range(backend, data_file, start, end):
+    await backend.put_file("key", data_file())
+    assert await read_all(backend, "key", start, end) == DATA[start:end]
+
+
+async def test_read_empty_object(backend, data_file):
+    await backend.put_file("key", data_file(b""))
+    assert await read_all(backend, "key") == b""
+
+
+async def test_read_missing_key(backend):
+    with pytest.raises(FileNotFoundError):
+        await read_all(backend, "missing")
+
+
+async def test_delete(backend, data_file):
+    await backend.put_file("key", data_file())
+    await backend.delete("key")
+    assert not await backend.exists("key")
+    await backend.delete("key")
+
+
+async def test_local_path(local_backend, data_file):
+    await local_backend.put_file("key", data_file())
+    with open(local_backend.local_path("key"), "rb") as f:
+        assert f.read() == DATA
+
+
+def test_s3_has_no_local_path(s3_backend):
+    assert s3_backend.local_path("key") is None